@@ -3,11 +3,47 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+from collections import OrderedDict, deque
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import difflib
+import functools
+import hashlib
 import io
-import base64
+import json
+import logging
+import math
+import os
+import pickle
+import re
+import shutil
+import sys
+from statistics import NormalDist
+import threading
+import time
+import tracemalloc
+import unicodedata
+import weakref
+import zipfile
+import xlsxwriter
+from streamlit.runtime import Runtime
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 from streamlit_option_menu import option_menu
 
+# Medição do pico de memória residente (indisponível no Windows)
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Parquet depende do pyarrow (instalado junto com o Streamlit na maioria dos ambientes)
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_DISPONIVEL = True
+except ImportError:
+    PARQUET_DISPONIVEL = False
+
 # ----- CONFIGURAÇÃO DA PÁGINA -----
 st.set_page_config(
     page_title="Análise de Eficiência de Máquinas",
@@ -91,6 +127,23 @@ def aplicar_estilos():
             color: #457b9d;
         }
 
+        .metric-delta {
+            font-size: 0.8rem;
+            margin-top: 4px;
+        }
+
+        .delta-melhor {
+            color: #2a9d8f;
+        }
+
+        .delta-pior {
+            color: #e63946;
+        }
+
+        .delta-neutro {
+            color: #6c757d;
+        }
+
         /* Gráficos */
         .chart-container {
             background-color: #f7f9fb;
@@ -128,8 +181,906 @@ def aplicar_estilos():
 # Aplica os estilos CSS
 aplicar_estilos()
 
+# ----- INSTRUMENTAÇÃO DE DESEMPENHO -----
+# Ativada pela barra lateral ("Modo diagnóstico") ou pela variável de ambiente ATD_INSTRUMENTACAO=1.
+# O estado é local à thread do script, então threads de exportação nunca registram medições;
+# os gráficos construídos no pool recebem o estado da execução que os pediu (construir_graficos).
+_instrumentacao = threading.local()
+_trava_registros = threading.Lock()
+HISTORICO_EXECUCOES = 10
+
+def configurar_logger(nome):
+    """Retorna um logger que emite uma linha por medição (JSON) no console do servidor."""
+    logger = logging.getLogger(nome)
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(name)s %(message)s"))
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+    return logger
+
+logger_desempenho = configurar_logger("atd.desempenho")
+logger_memoria = configurar_logger("atd.memoria")
+
+def instrumentacao_ativa():
+    """Indica se a execução atual do script está coletando medições."""
+    return getattr(_instrumentacao, 'registros', None) is not None
+
+def iniciar_instrumentacao(gatilho):
+    """Inicia a coleta de medições para a execução atual do script."""
+    _instrumentacao.registros = []
+    _instrumentacao.pilha = []
+    _instrumentacao.gatilho = gatilho
+
+def finalizar_instrumentacao():
+    """Encerra a coleta e retorna as medições da execução atual."""
+    registros = getattr(_instrumentacao, 'registros', None)
+    _instrumentacao.registros = None
+    _instrumentacao.pilha = []
+    return registros or []
+
+def contar_linhas(valor):
+    """Retorna o número de linhas de um DataFrame ou Series, ou None para outros tipos."""
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return len(valor)
+    if isinstance(valor, dict) and 'total_paradas' in valor:
+        return valor['total_paradas']
+    return None
+
+@contextmanager
+def cronometrar(etapa, familia=None, linhas=None):
+    """Mede o tempo de parede de um trecho e registra a medição, se a instrumentação estiver ativa."""
+    if not instrumentacao_ativa():
+        yield None
+        return
+
+    registro = {
+        'etapa': etapa,
+        'familia': familia,
+        'nivel': len(_instrumentacao.pilha),
+        'linhas_entrada': linhas,
+        'linhas_saida': None,
+        'cache': None,
+        'gatilho': _instrumentacao.gatilho,
+        'paralelo': getattr(_instrumentacao, 'paralelo', False)
+    }
+    _instrumentacao.pilha.append(registro)
+    inicio = time.perf_counter()
+    try:
+        yield registro
+    finally:
+        registro['tempo_ms'] = (time.perf_counter() - inicio) * 1000
+        _instrumentacao.pilha.pop()
+        _instrumentacao.registros.append(registro)
+        logger_desempenho.info(json.dumps(registro, ensure_ascii=False, default=str))
+
+def _linhas_argumentos(args):
+    """Retorna o número de linhas do primeiro argumento tabular."""
+    for arg in args:
+        linhas = contar_linhas(arg)
+        if linhas is not None:
+            return linhas
+    return None
+
+def instrumentar(familia):
+    """Decorador que registra tempo e linhas de entrada/saída de uma função não cacheada."""
+    def decorador(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not instrumentacao_ativa():
+                return func(*args, **kwargs)
+
+            with cronometrar(func.__name__, familia, _linhas_argumentos(args)) as registro:
+                resultado = func(*args, **kwargs)
+                registro['linhas_saida'] = contar_linhas(resultado)
+            return resultado
+        return wrapper
+    return decorador
+
+def cache_monitorado(familia):
+    """Decorador equivalente ao st.cache_data, limitado pela política de cache da família,
+    que também registra acertos e falhas de cache."""
+    def decorador(func):
+        nome = func.__qualname__
+        falhas = threading.local()
+
+        @functools.wraps(func)
+        def executar(*args, **kwargs):
+            # Só é executada em falha de cache: marca a medição em andamento
+            if instrumentacao_ativa() and _instrumentacao.pilha:
+                _instrumentacao.pilha[-1]['cache'] = 'miss'
+            falhas.ocorreu = True
+            return func(*args, **kwargs)
+
+        politica = politica_cache(familia)
+        em_cache = st.cache_data(executar, ttl=politica['ttl'], max_entries=politica['max_entradas'])
+        registrar_funcao_cache(familia, nome, em_cache.clear)
+
+        def chamar(*args, **kwargs):
+            falhas.ocorreu = False
+            resultado = em_cache(*args, **kwargs)
+            registrar_chamada_cache(familia, nome, em_cache.clear, resultado, falha=falhas.ocorreu)
+            if falhas.ocorreu:
+                aplicar_orcamento_cache(familia)
+            return resultado
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not instrumentacao_ativa():
+                return chamar(*args, **kwargs)
+
+            with cronometrar(func.__name__, familia, _linhas_argumentos(args)) as registro:
+                registro['cache'] = 'hit'
+                resultado = chamar(*args, **kwargs)
+                registro['linhas_saida'] = contar_linhas(resultado)
+            return resultado
+
+        wrapper.clear = em_cache.clear
+        wrapper.sem_cache = instrumentar(familia)(func)
+        return wrapper
+    return decorador
+
+def detectar_gatilho():
+    """Identifica os widgets (com chave) cujo valor mudou desde a execução anterior."""
+    anteriores = st.session_state.get('_valores_widgets', {})
+    atuais = {
+        chave: valor for chave, valor in st.session_state.items()
+        if not str(chave).startswith('_') and isinstance(valor, (bool, int, float, str, tuple))
+    }
+    st.session_state['_valores_widgets'] = atuais
+
+    if not anteriores:
+        return "carga inicial"
+    # Widgets que acabaram de surgir só contam se foram acionados (ex.: botão clicado)
+    alterados = [
+        str(chave) for chave, valor in atuais.items()
+        if (chave in anteriores and anteriores[chave] != valor) or (chave not in anteriores and valor is True)
+    ]
+    return ", ".join(sorted(alterados)) or "interação sem chave"
+
+def exibir_painel_diagnostico(registros):
+    """Exibe o painel de diagnóstico com as medições da execução atual e o histórico recente."""
+    historico = st.session_state.setdefault('_historico_desempenho', [])
+    if registros:
+        historico.append(registros)
+        del historico[:-HISTORICO_EXECUCOES]
+
+    with st.expander("🛠️ Diagnóstico de Desempenho"):
+        if not registros:
+            st.info("Nenhuma medição registrada nesta execução.")
+            return
+
+        medicoes = pd.DataFrame(registros)
+        # Medições feitas no pool de gráficos se sobrepõem ao script e ficam fora do tempo total
+        total_ms = medicoes.loc[(medicoes['nivel'] == 0) & ~medicoes['paralelo'].astype(bool), 'tempo_ms'].sum()
+        acertos = (medicoes['cache'] == 'hit').sum()
+        com_cache = medicoes['cache'].notna().sum()
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Tempo medido", f"{total_ms:.0f} ms")
+        col2.metric("Acertos de cache", f"{acertos}/{com_cache}")
+        col3.metric("Gatilho", registros[0]['gatilho'])
+
+        # Pontos quentes: tempo total por etapa na execução atual
+        resumo = medicoes.groupby(['etapa', 'familia'], dropna=False).agg(
+            chamadas=('tempo_ms', 'size'),
+            tempo_total_ms=('tempo_ms', 'sum'),
+            tempo_max_ms=('tempo_ms', 'max'),
+            falhas_cache=('cache', lambda c: (c == 'miss').sum()),
+            linhas_entrada=('linhas_entrada', 'max')
+        ).sort_values('tempo_total_ms', ascending=False).reset_index()
+
+        st.dataframe(resumo, use_container_width=True, hide_index=True)
+
+        st.markdown("**Execuções recentes**")
+        st.dataframe(
+            pd.DataFrame([
+                {
+                    'execução': i + 1,
+                    'gatilho': execucao[0]['gatilho'],
+                    'etapas': len(execucao),
+                    'tempo_ms': sum(r['tempo_ms'] for r in execucao if r['nivel'] == 0 and not r.get('paralelo'))
+                }
+                for i, execucao in enumerate(historico)
+            ]),
+            use_container_width=True,
+            hide_index=True
+        )
+
+        st.markdown("**Caches por família**")
+        st.dataframe(
+            pd.DataFrame(estatisticas_cache()),
+            column_config={
+                "tamanho_mb": st.column_config.NumberColumn("tamanho_mb", format="%.2f")
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+
+# ----- POLÍTICA DE CACHE -----
+# Limites por família de funções memorizadas: número máximo de entradas, TTL (segundos) e orçamento
+# aproximado de memória (MB). Podem ser ajustados com a variável de ambiente ATD_POLITICA_CACHE, ex.:
+# ATD_POLITICA_CACHE='{"graficos": {"max_entradas": 50, "ttl": 600, "orcamento_mb": 64}}'
+POLITICA_CACHE_PADRAO = {
+    'auxiliares': {'max_entradas': 1000, 'ttl': None, 'orcamento_mb': 8},
+    'processamento': {'max_entradas': 4, 'ttl': 6 * 3600, 'orcamento_mb': 1024},
+    'indicadores': {'max_entradas': 256, 'ttl': 3600, 'orcamento_mb': 256},
+    'graficos': {'max_entradas': 128, 'ttl': 3600, 'orcamento_mb': 128}
+}
+
+def politica_cache(familia):
+    """Retorna a política de cache da família, com os ajustes da variável de ambiente."""
+    politica = dict(POLITICA_CACHE_PADRAO.get(familia, POLITICA_CACHE_PADRAO['indicadores']))
+    try:
+        politica.update(json.loads(os.environ.get('ATD_POLITICA_CACHE', '{}')).get(familia, {}))
+    except ValueError:
+        logger_desempenho.warning("ATD_POLITICA_CACHE inválida; usando a política padrão.")
+    return politica
+
+@st.cache_resource
+def registro_politica_cache():
+    """Retorna o registro, compartilhado pelo processo, do tamanho estimado de cada cache."""
+    return {'trava': threading.Lock(), 'familias': {}}
+
+def tamanho_resultado(valor):
+    """Estima o tamanho (bytes) de um resultado memorizado."""
+    if isinstance(valor, (pd.DataFrame, pd.Series, np.ndarray, bytes, bytearray, dict, list, tuple, go.Figure)):
+        return memoria_objeto(valor)
+    try:
+        # Outros objetos: tamanho serializado, como o st.cache_data armazena
+        return len(pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return sys.getsizeof(valor)
+
+def _familia_cache(registro, familia):
+    """Retorna (criando se necessário) o estado de uma família no registro."""
+    return registro['familias'].setdefault(familia, {
+        'politica': politica_cache(familia),
+        'funcoes': {},
+        'chamadas': 0,
+        'falhas': 0,
+        'descartes': 0
+    })
+
+def _funcao_cache(estado, nome, limpar):
+    """Retorna (criando se necessário) o registro de uma função da família, com seu `limpar`."""
+    funcao = estado['funcoes'].setdefault(nome, {'entradas': deque(maxlen=estado['politica']['max_entradas'])})
+    funcao['limpar'] = limpar
+    return funcao
+
+def registrar_funcao_cache(familia, nome, limpar):
+    """Registra uma função memorizada da família, para que possa ser descartada por orçamento."""
+    registro = registro_politica_cache()
+    with registro['trava']:
+        _funcao_cache(_familia_cache(registro, familia), nome, limpar)
+
+def registrar_chamada_cache(familia, nome, limpar, resultado=None, falha=False):
+    """Contabiliza uma chamada; em falha de cache, registra o tamanho da nova entrada.
+
+    A função é registrada de novo se preciso: um st.cache_resource.clear() (menu "Clear cache",
+    benchmark.py) recria o registro vazio depois da importação.
+    """
+    tamanho = tamanho_resultado(resultado) if falha else 0
+    registro = registro_politica_cache()
+    with registro['trava']:
+        estado = _familia_cache(registro, familia)
+        funcao = _funcao_cache(estado, nome, limpar)
+        estado['chamadas'] += 1
+        if falha:
+            estado['falhas'] += 1
+            funcao['entradas'].append((time.time(), tamanho))
+
+def _podar_entradas(estado, agora):
+    """Remove do registro as entradas que o TTL já expirou."""
+    ttl = estado['politica']['ttl']
+    if ttl is None:
+        return
+    for funcao in estado['funcoes'].values():
+        entradas = funcao['entradas']
+        while entradas and agora - entradas[0][0] > ttl:
+            entradas.popleft()
+
+def limpar_cache_familia(familia):
+    """Descarta todos os caches de uma família (ex.: após mudar o dicionário de causas)."""
+    registro = registro_politica_cache()
+    with registro['trava']:
+        estado = _familia_cache(registro, familia)
+        for funcao in estado['funcoes'].values():
+            funcao['limpar']()
+            estado['descartes'] += len(funcao['entradas'])
+            funcao['entradas'].clear()
+
+def aplicar_orcamento_cache(familia):
+    """Descarta os caches mais pesados da família até o total estimado caber no orçamento.
+
+    O descarte é por função (o st.cache_data só permite limpar o cache inteiro de uma função), não
+    por entrada: a função com mais bytes estimados perde todas as suas entradas.
+    """
+    registro = registro_politica_cache()
+    descartadas = []
+
+    with registro['trava']:
+        estado = _familia_cache(registro, familia)
+        _podar_entradas(estado, time.time())
+        orcamento = estado['politica']['orcamento_mb'] * 1024 ** 2
+        tamanhos = {nome: sum(t for _, t in f['entradas']) for nome, f in estado['funcoes'].items()}
+        total = sum(tamanhos.values())
+
+        for nome in sorted(tamanhos, key=tamanhos.get, reverse=True):
+            if total <= orcamento:
+                break
+            funcao = estado['funcoes'][nome]
+            funcao['limpar']()
+            estado['descartes'] += len(funcao['entradas'])
+            funcao['entradas'].clear()
+            total -= tamanhos[nome]
+            descartadas.append(nome)
+
+    if descartadas:
+        logger_desempenho.info(json.dumps(
+            {'evento': 'cache_descartado', 'familia': familia, 'funcoes': descartadas}, ensure_ascii=False
+        ))
+    return descartadas
+
+def estatisticas_cache():
+    """Retorna, por família, a política, o número e tamanho estimado das entradas e os descartes."""
+    registro = registro_politica_cache()
+    estatisticas = []
+    with registro['trava']:
+        for familia, estado in registro['familias'].items():
+            _podar_entradas(estado, time.time())
+            politica = estado['politica']
+            estatisticas.append({
+                'familia': familia,
+                'entradas': sum(len(f['entradas']) for f in estado['funcoes'].values()),
+                'tamanho_mb': sum(t for f in estado['funcoes'].values() for _, t in f['entradas']) / 1024 ** 2,
+                'orcamento_mb': politica['orcamento_mb'],
+                'max_entradas_por_funcao': politica['max_entradas'],
+                'ttl_s': politica['ttl'],
+                'chamadas': estado['chamadas'],
+                'falhas': estado['falhas'],
+                'descartes': estado['descartes']
+            })
+    return estatisticas
+
+# ----- CONTABILIDADE DE MEMÓRIA -----
+# Registro do processo (compartilhado entre sessões) com o uso de memória de cada sessão ativa.
+AMOSTRA_MEMORIA_TEXTO = 1000
+
+@st.cache_resource
+def registro_memoria_sessoes():
+    """Retorna o registro, compartilhado pelo processo, da memória contabilizada por sessão."""
+    return {'trava': threading.Lock(), 'sessoes': {}, 'trava_medicao': threading.Lock()}
+
+def id_sessao_atual():
+    """Retorna o identificador da sessão do Streamlit em execução."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "local"
+
+def memoria_dataframe(df, exato=False):
+    """Estima a memória profunda (bytes) de um DataFrame ou Series.
+
+    No modo rápido, colunas de texto são estimadas por amostragem, evitando percorrer milhões de strings.
+    """
+    if exato:
+        uso = df.memory_usage(index=True, deep=True)
+        return int(uso.sum() if isinstance(df, pd.DataFrame) else uso)
+
+    colunas = df.items() if isinstance(df, pd.DataFrame) else [(df.name, df)]
+    total = int(df.index.memory_usage(deep=False))
+
+    for _, serie in colunas:
+        if serie.dtype == object and len(serie) > AMOSTRA_MEMORIA_TEXTO:
+            amostra = serie.sample(AMOSTRA_MEMORIA_TEXTO, random_state=0)
+            tamanho_medio = np.mean([sys.getsizeof(v) for v in amostra])
+            total += int(len(serie) * (tamanho_medio + 8))  # objeto + ponteiro
+        else:
+            total += int(serie.memory_usage(index=False, deep=True))
+
+    return total
+
+def memoria_objeto(valor, exato=False, profundidade=0):
+    """Estima a memória (bytes) de DataFrames, arrays, bytes, figuras e coleções guardados na sessão."""
+    if isinstance(valor, (pd.DataFrame, pd.Series)):
+        return memoria_dataframe(valor, exato)
+    if isinstance(valor, go.Figure):
+        # Figuras do Plotly: arrays e listas guardados nos traços, sem serializar a figura
+        return memoria_objeto(valor._data, exato)
+    if isinstance(valor, np.ndarray):
+        return int(valor.nbytes)
+    if isinstance(valor, (bytes, bytearray)):
+        return len(valor)
+    if profundidade < 3:
+        if isinstance(valor, dict):
+            return sum(memoria_objeto(v, exato, profundidade + 1) for v in valor.values())
+        if isinstance(valor, (list, tuple)):
+            return sum(memoria_objeto(v, exato, profundidade + 1) for v in valor)
+    return sys.getsizeof(valor)
+
+def memoria_sessao(exato=False):
+    """Retorna a memória (bytes) de cada item da sessão atual com pelo menos 1 KB.
+
+    DataFrames que pertencem ao armazém compartilhado não são contados na sessão.
+    """
+    armazem = armazem_datasets()
+    with armazem['trava']:
+        compartilhados = {id(entrada['df']) for entrada in armazem['entradas'].values()}
+    
+    itens = {}
+    for chave, valor in st.session_state.items():
+        if id(valor) in compartilhados:
+            continue
+        tamanho = memoria_objeto(valor, exato)
+        if tamanho >= 1024:
+            itens[str(chave)] = tamanho
+    return dict(sorted(itens.items(), key=lambda item: item[1], reverse=True))
+
+@contextmanager
+def medir_pico_memoria(ativo=True):
+    """Mede com tracemalloc o pico de alocação (bytes) de um trecho, como na ingestão de um arquivo.
+
+    O tracemalloc é global ao processo: as medições são serializadas (uma sessão espera a outra) e
+    o pico ainda inclui alocações simultâneas de outras threads. Se o tracemalloc já estiver ativo
+    por outro motivo (ex.: benchmark.py), o trecho roda sem medição para não alterar o pico alheio.
+    """
+    if not ativo:
+        yield None
+        return
+
+    with registro_memoria_sessoes()['trava_medicao']:
+        if tracemalloc.is_tracing():
+            yield None
+            return
+
+        tracemalloc.start()
+        medicao = {}
+        inicio = time.perf_counter()
+        try:
+            yield medicao
+        finally:
+            pico = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            medicao['pico_bytes'] = pico
+            medicao['tempo_s'] = time.perf_counter() - inicio
+
+def atualizar_memoria_sessao(ingestao=None):
+    """Atualiza no registro do processo a memória contabilizada da sessão atual."""
+    registro = registro_memoria_sessoes()
+    sessao = id_sessao_atual()
+    itens = memoria_sessao()
+
+    with registro['trava']:
+        entrada = registro['sessoes'].setdefault(sessao, {})
+        entrada['itens'] = itens
+        entrada['total_bytes'] = sum(itens.values())
+        entrada['atualizado_em'] = datetime.now().isoformat(timespec='seconds')
+        if ingestao is not None:
+            entrada['ingestao'] = ingestao
+            logger_memoria.info(json.dumps({'sessao': sessao, **ingestao}, ensure_ascii=False, default=str))
+
+        # Descarta sessões que o Streamlit já encerrou
+        if Runtime.exists():
+            runtime = Runtime.instance()
+            for outra in list(registro['sessoes']):
+                if outra != sessao and not runtime.is_active_session(outra):
+                    del registro['sessoes'][outra]
+
+def relatorio_memoria():
+    """Retorna o uso de memória por sessão e o total do processo (gancho programático).
+
+    Pode ser chamado por outros módulos ou ferramentas de monitoramento no mesmo processo.
+    """
+    registro = registro_memoria_sessoes()
+    with registro['trava']:
+        sessoes = {sessao: dict(dados) for sessao, dados in registro['sessoes'].items()}
+
+    datasets = resumo_armazem()
+    relatorio = {
+        'sessoes_ativas': len(sessoes),
+        'total_sessoes_bytes': sum(dados.get('total_bytes', 0) for dados in sessoes.values()),
+        'sessoes': sessoes,
+        'datasets_compartilhados': datasets,
+        'total_datasets_bytes': sum(dataset['bytes'] for dataset in datasets)
+    }
+
+    # Pico de memória residente do processo (disponível apenas em sistemas POSIX)
+    if resource is not None:
+        fator = 1 if sys.platform == 'darwin' else 1024
+        relatorio['pico_rss_processo_bytes'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * fator
+
+    return relatorio
+
+def exibir_painel_memoria():
+    """Exibe o uso de memória da sessão atual, da última ingestão e de todas as sessões ativas."""
+    with st.expander("🧠 Uso de Memória"):
+        itens = memoria_sessao(exato=True)
+        relatorio = relatorio_memoria()
+        ingestao = relatorio['sessoes'].get(id_sessao_atual(), {}).get('ingestao')
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Esta sessão", f"{sum(itens.values()) / 1024 ** 2:.1f} MB")
+        col2.metric(
+            "Todas as sessões",
+            f"{relatorio['total_sessoes_bytes'] / 1024 ** 2:.1f} MB",
+            help=f"{relatorio['sessoes_ativas']} sessão(ões) ativa(s)"
+        )
+        if 'pico_rss_processo_bytes' in relatorio:
+            col3.metric("Pico RSS do processo", f"{relatorio['pico_rss_processo_bytes'] / 1024 ** 2:.0f} MB")
+
+        if ingestao:
+            st.markdown(
+                f"**Última ingestão:** {ingestao['arquivo']} — {ingestao['linhas']} linhas, "
+                f"pico de {ingestao['pico_bytes'] / 1024 ** 2:.1f} MB em {ingestao['tempo_s']:.2f}s "
+                f"({ingestao['pico_bytes'] / max(1, ingestao['linhas']) * 1000 / 1024 ** 2:.2f} MB por mil linhas)"
+            )
+
+        st.dataframe(
+            pd.DataFrame({
+                'Item da sessão': list(itens.keys()),
+                'Memória (MB)': [tamanho / 1024 ** 2 for tamanho in itens.values()]
+            }),
+            column_config={
+                "Memória (MB)": st.column_config.NumberColumn("Memória (MB)", format="%.2f")
+            },
+            use_container_width=True,
+            hide_index=True
+        )
+
+        if relatorio['datasets_compartilhados']:
+            st.markdown(
+                f"**Datasets compartilhados:** {relatorio['total_datasets_bytes'] / 1024 ** 2:.1f} MB "
+                f"de {ORCAMENTO_ARMAZEM_BYTES / 1024 ** 2:.0f} MB"
+            )
+            st.dataframe(pd.DataFrame(relatorio['datasets_compartilhados']), use_container_width=True, hide_index=True)
+
+# ----- ARMAZÉM COMPARTILHADO DE DATASETS -----
+# Um único DataFrame processado (somente leitura) por arquivo distinto, compartilhado entre sessões.
+# As sessões guardam apenas a referência; entradas sem referências são descartadas por LRU
+# quando o total ultrapassa o orçamento (ATD_ORCAMENTO_DATASETS_MB).
+ORCAMENTO_ARMAZEM_BYTES = int(os.environ.get('ATD_ORCAMENTO_DATASETS_MB', '2048')) * 1024 ** 2
+
+@st.cache_resource
+def armazem_datasets():
+    """Retorna o armazém de datasets compartilhado pelo processo."""
+    return {'trava': threading.Lock(), 'entradas': OrderedDict()}
+
+def hash_conteudo(conteudo):
+    """Calcula o hash SHA-256 do conteúdo de um arquivo enviado."""
+    return hashlib.sha256(conteudo).hexdigest()
+
+def _sessoes_ativas(referencias):
+    """Filtra as referências de sessões que o Streamlit já encerrou."""
+    if not Runtime.exists():
+        return referencias
+    runtime = Runtime.instance()
+    return {sessao for sessao in referencias if runtime.is_active_session(sessao)}
+
+def aplicar_orcamento_armazem(orcamento_bytes=ORCAMENTO_ARMAZEM_BYTES):
+    """Descarta, do menos para o mais recentemente usado, datasets sem sessões até caber no orçamento."""
+    armazem = armazem_datasets()
+    descartados = []
+
+    with armazem['trava']:
+        entradas = armazem['entradas']
+        for entrada in entradas.values():
+            entrada['referencias'] = _sessoes_ativas(entrada['referencias'])
+
+        total = sum(entrada['bytes'] for entrada in entradas.values())
+        for chave in list(entradas):
+            if total <= orcamento_bytes:
+                break
+            if not entradas[chave]['referencias']:
+                total -= entradas[chave]['bytes']
+                descartados.append(entradas.pop(chave)['nome'])
+
+    for nome in descartados:
+        logger_memoria.info(json.dumps({'evento': 'dataset_descartado', 'arquivo': nome}, ensure_ascii=False))
+    return descartados
+
+def vincular_sessao(chave):
+    """Registra a sessão atual como usuária do dataset, liberando a referência anterior."""
+    sessao = id_sessao_atual()
+    armazem = armazem_datasets()
+    with armazem['trava']:
+        for outra_chave, entrada in armazem['entradas'].items():
+            if outra_chave == chave:
+                entrada['referencias'].add(sessao)
+                entrada['ultimo_acesso'] = time.time()
+                armazem['entradas'].move_to_end(chave)
+            else:
+                entrada['referencias'].discard(sessao)
+
+def desvincular_sessao():
+    """Libera a referência da sessão atual a qualquer dataset do armazém."""
+    vincular_sessao(None)
+    aplicar_orcamento_armazem()
+
+def obter_dataset(conteudo, nome, carregar):
+    """Retorna (chave, df) do arquivo; o processamento só ocorre se o conteúdo ainda não estiver no armazém.
+
+    `carregar` é chamada sem argumentos e deve retornar o DataFrame já processado e o
+    relatório de qualidade (ou None), guardado na entrada para as demais sessões. A chave inclui a
+    versão do dicionário de causas: após unificações aceitas, o arquivo é processado de novo.
+    """
+    chave = hash_conteudo(conteudo)
+    if versao_dicionario_causas():
+        chave = f"{chave}:c{versao_dicionario_causas()}"
+    armazem = armazem_datasets()
+
+    with armazem['trava']:
+        entrada = armazem['entradas'].get(chave)
+
+    if entrada is None:
+        # O processamento ocorre fora da trava para não bloquear as outras sessões
+        df, qualidade = carregar()
+        with armazem['trava']:
+            entrada = armazem['entradas'].get(chave)
+            if entrada is None:
+                entrada = {
+                    'df': df,
+                    'indice': None,
+                    'indice_temporal': None,
+                    'controle': None,
+                    'kpis_mensais': None,
+                    'qualidade': qualidade,
+                    'nome': nome,
+                    'bytes': memoria_dataframe(df),
+                    'referencias': set(),
+                    'criado_em': datetime.now().isoformat(timespec='seconds'),
+                    'ultimo_acesso': time.time()
+                }
+                armazem['entradas'][chave] = entrada
+
+    vincular_sessao(chave)
+    aplicar_orcamento_armazem()
+    return chave, entrada['df']
+
+def qualidade_dataset(chave):
+    """Relatório de qualidade guardado com o dataset no armazém (None se não houver)."""
+    armazem = armazem_datasets()
+    with armazem['trava']:
+        entrada = armazem['entradas'].get(chave)
+    return entrada.get('qualidade') if entrada is not None else None
+
+def publicar_dataset(chave, nome, df, linhas_anteriores=None, controle=None):
+    """Publica (ou substitui) um dataset no armazém sob uma chave fixa, como o da pasta monitorada.
+
+    Se `linhas_anteriores` for informado, o DataFrame anterior é um prefixo do novo e o índice
+    da grade é estendido com as linhas novas em vez de recalculado. `controle` é o estado das
+    cartas de controle já atualizado incrementalmente para o novo DataFrame.
+    """
+    armazem = armazem_datasets()
+    with armazem['trava']:
+        entrada = armazem['entradas'].get(chave)
+        indice_anterior = entrada['indice'] if entrada is not None else None
+
+    indice = None
+    if indice_anterior is not None and linhas_anteriores is not None:
+        indice = estender_indice_grade(indice_anterior, df, linhas_anteriores)
+
+    bytes_dataset = memoria_dataframe(df)
+    with armazem['trava']:
+        entrada = armazem['entradas'].setdefault(chave, {
+            'referencias': set(),
+            'criado_em': datetime.now().isoformat(timespec='seconds')
+        })
+        entrada.update({
+            'df': df,
+            'indice': indice,
+            'indice_temporal': None,
+            'controle': controle,
+            'kpis_mensais': None,
+            'qualidade': None,
+            'nome': nome,
+            'bytes': bytes_dataset,
+            'ultimo_acesso': time.time()
+        })
+        armazem['entradas'].move_to_end(chave)
+
+    aplicar_orcamento_armazem()
+
+def dataset_publicado(chave):
+    """Retorna o DataFrame publicado no armazém sob a chave, ou None."""
+    armazem = armazem_datasets()
+    with armazem['trava']:
+        entrada = armazem['entradas'].get(chave)
+        return entrada['df'] if entrada is not None else None
+
+def indice_dataset(chave, df):
+    """Retorna o índice de filtros/ordenação do dataset, calculado uma única vez por arquivo."""
+    armazem = armazem_datasets()
+    with armazem['trava']:
+        entrada = armazem['entradas'].get(chave)
+
+    # Dataset fora do armazém (ex.: carregado por outro meio): usa o cache por conteúdo
+    if entrada is None or entrada['df'] is not df:
+        return indice_grade_dados(df)
+
+    if entrada['indice'] is None:
+        indice = calcular_indice_grade(df)
+        with armazem['trava']:
+            if entrada['indice'] is None:
+                entrada['indice'] = indice
+                entrada['bytes'] += sum(ordem.nbytes for ordem in indice['ordens'].values())
+                entrada['bytes'] += sum(codigos.nbytes for codigos, _ in indice['categorias'].values())
+
+    return entrada['indice']
+
+def resumo_armazem():
+    """Retorna um resumo dos datasets compartilhados (arquivo, tamanho e sessões que o usam)."""
+    armazem = armazem_datasets()
+    with armazem['trava']:
+        return [
+            {
+                'arquivo': entrada['nome'],
+                'chave': chave[:12],
+                'linhas': len(entrada['df']),
+                'bytes': entrada['bytes'],
+                'sessoes': len(entrada['referencias']),
+                'criado_em': entrada['criado_em']
+            }
+            for chave, entrada in armazem['entradas'].items()
+        ]
+
+# ----- NORMALIZAÇÃO DE CAUSAS DE PARADA -----
+# A coluna Parada é texto livre digitado pelos operadores. As variantes de uma mesma causa
+# ("Falha Elétrica", "falha eletrica ", "FALHA ELETRICA") são unificadas por um dicionário
+# {variante: causa canônica} persistido em JSON (ATD_MAPEAMENTO_CAUSAS) e reaproveitado entre
+# uploads. Só os valores distintos passam pela normalização, nunca as linhas. A unificação
+# automática exige a mesma chave normalizada; grafias apenas parecidas viram sugestões, que o
+# usuário aceita na tela de normalização (a unificação aceita também é persistida).
+# Em disco ficam só as variantes que mudam de grafia; as demais valem apenas para o processo.
+DIRETORIO_DADOS = os.environ.get('ATD_DIRETORIO_DADOS', os.path.join(os.path.expanduser('~'), '.atd'))
+CAMINHO_MAPEAMENTO_CAUSAS = os.environ.get(
+    'ATD_MAPEAMENTO_CAUSAS', os.path.join(DIRETORIO_DADOS, 'mapeamento_causas.json')
+)
+LIMIAR_SIMILARIDADE_CAUSAS = float(os.environ.get('ATD_LIMIAR_CAUSAS', '0.9'))
+
+@st.cache_resource
+def dicionario_causas():
+    """Carrega o dicionário persistido de causas, compartilhado pelo processo."""
+    mapeamento = {}
+    try:
+        with open(CAMINHO_MAPEAMENTO_CAUSAS, encoding='utf-8') as arquivo:
+            mapeamento = {str(k): str(v) for k, v in json.load(arquivo).items()}
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, AttributeError):
+        logger_desempenho.warning("Dicionário de causas inválido em %s; iniciando vazio.", CAMINHO_MAPEAMENTO_CAUSAS)
+    return {'trava': threading.Lock(), 'mapeamento': mapeamento, 'sugestoes': {}, 'versao': 0}
+
+def unificacoes_causas(mapeamento):
+    """Parte do dicionário que muda a grafia ({variante: causa} com variante ≠ causa)."""
+    return {variante: causa for variante, causa in mapeamento.items() if variante != causa}
+
+def salvar_dicionario_causas(mapeamento):
+    """Grava as unificações do dicionário de forma atômica (arquivo temporário + rename)."""
+    temporario = f"{CAMINHO_MAPEAMENTO_CAUSAS}.tmp"
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(CAMINHO_MAPEAMENTO_CAUSAS)), exist_ok=True)
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump(dict(sorted(unificacoes_causas(mapeamento).items())), arquivo, ensure_ascii=False, indent=1)
+        os.replace(temporario, CAMINHO_MAPEAMENTO_CAUSAS)
+    except OSError:
+        logger_desempenho.warning("Não foi possível gravar o dicionário de causas em %s.", CAMINHO_MAPEAMENTO_CAUSAS)
+
+def chave_causa(texto):
+    """Forma de comparação de uma causa: sem acentos, pontuação e caixa, espaços colapsados."""
+    texto = remover_acentos(str(texto)).casefold()
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', texto).split())
+
+def numeros_causa(chave):
+    """Números de uma chave de causa ("motor 01" e "motor 1" têm os mesmos)."""
+    return tuple(int(numero) for numero in re.findall(r'\d+', chave))
+
+def resolver_causas(variantes, frequencias):
+    """Retorna {variante: causa canônica}, incorporando ao dicionário as variantes novas.
+
+    Uma variante nova é associada à causa de mesma chave normalizada; sem ela, vira uma causa
+    nova. As mais frequentes são resolvidas primeiro, de modo que a grafia mais usada dá nome
+    ao grupo. Uma causa nova parecida com outra (acima de LIMIAR_SIMILARIDADE_CAUSAS e com os
+    mesmos números, para não juntar "Motor 01" e "Motor 02") só é registrada como sugestão.
+    """
+    dicionario = dicionario_causas()
+    with dicionario['trava']:
+        mapeamento = dicionario['mapeamento']
+        novas = [v for v in variantes if v not in mapeamento]
+        if novas:
+            canonicas = {chave_causa(c): c for c in set(mapeamento.values())}
+            por_numeros = {}
+            for chave in canonicas:
+                por_numeros.setdefault(numeros_causa(chave), []).append(chave)
+
+            for variante in sorted(novas, key=lambda v: -frequencias.get(v, 0)):
+                chave = chave_causa(variante)
+                if chave not in canonicas:
+                    candidatas = por_numeros.setdefault(numeros_causa(chave), [])
+                    parecidas = difflib.get_close_matches(chave, candidatas, n=1, cutoff=LIMIAR_SIMILARIDADE_CAUSAS)
+                    canonicas[chave] = ' '.join(variante.split()) or variante
+                    if parecidas:
+                        dicionario['sugestoes'][canonicas[chave]] = (
+                            canonicas[parecidas[0]], difflib.SequenceMatcher(None, chave, parecidas[0]).ratio()
+                        )
+                    candidatas.append(chave)
+                mapeamento[variante] = canonicas[chave]
+            # Só grava quando alguma variante nova foi unificada a uma grafia diferente
+            if any(mapeamento[variante] != variante for variante in novas):
+                salvar_dicionario_causas(mapeamento)
+        return {v: mapeamento[v] for v in variantes}
+
+def normalizar_causas(serie):
+    """Substitui as variantes da coluna Parada pela causa canônica (custo proporcional aos distintos)."""
+    codigos, valores = pd.factorize(serie)
+    if len(valores) == 0:
+        return serie
+    variantes = [str(v) for v in valores]
+    frequencias = np.bincount(codigos[codigos >= 0], minlength=len(valores))
+    mapa = resolver_causas(variantes, dict(zip(variantes, frequencias.tolist())))
+    # O último elemento atende aos códigos -1 (valores ausentes)
+    canonicas = np.array([mapa[v] for v in variantes] + [np.nan], dtype=object)
+    return pd.Series(canonicas[codigos], index=serie.index, name=serie.name)
+
+def aceitar_sugestoes_causas(causas):
+    """Unifica as causas sugeridas à causa parecida, persiste o dicionário e descarta o processamento.
+
+    Retorna quantas causas foram unificadas. Pares com números diferentes nunca são unificados.
+    """
+    dicionario = dicionario_causas()
+    with dicionario['trava']:
+        mapeamento, sugestoes = dicionario['mapeamento'], dicionario['sugestoes']
+        unificadas = 0
+        for causa in causas:
+            if causa not in sugestoes:
+                continue
+            alvo = mapeamento.get(sugestoes.pop(causa)[0], causa)
+            if alvo == causa or numeros_causa(chave_causa(causa)) != numeros_causa(chave_causa(alvo)):
+                continue
+            for variante in [v for v, c in mapeamento.items() if c == causa] + [causa]:
+                mapeamento[variante] = alvo
+            # Sugestões que apontavam para a causa unificada passam a apontar para o alvo
+            for outra, (parecida, similaridade) in list(sugestoes.items()):
+                if parecida == causa:
+                    sugestoes[outra] = (alvo, similaridade)
+            unificadas += 1
+
+        if unificadas:
+            dicionario['versao'] += 1
+            salvar_dicionario_causas(mapeamento)
+
+    if unificadas:
+        limpar_cache_familia("processamento")
+    return unificadas
+
+def versao_dicionario_causas():
+    """Número de unificações aceitas manualmente desde o início do processo."""
+    return dicionario_causas()['versao']
+
+def grupos_causas():
+    """Tabela das causas canônicas que agrupam mais de uma variante no dicionário."""
+    dicionario = dicionario_causas()
+    with dicionario['trava']:
+        pares = list(dicionario['mapeamento'].items())
+    if not pares:
+        return pd.DataFrame(columns=['Causa', 'Variantes', 'Qtd. Variantes'])
+    tabela = pd.DataFrame(pares, columns=['Variante', 'Causa'])
+    agrupado = tabela.groupby('Causa')['Variante']
+    grupos = pd.DataFrame({
+        'Variantes': agrupado.agg(lambda v: ' | '.join(f'"{x}"' for x in sorted(v))),
+        'Qtd. Variantes': agrupado.size()
+    }).reset_index()
+    return grupos[grupos['Qtd. Variantes'] > 1].sort_values('Qtd. Variantes', ascending=False)
+
+def sugestoes_causas():
+    """Causas com grafia parecida com outra, não unificadas automaticamente, para revisão."""
+    dicionario = dicionario_causas()
+    with dicionario['trava']:
+        sugestoes = [(causa, parecida, similaridade) for causa, (parecida, similaridade) in dicionario['sugestoes'].items()]
+    tabela = pd.DataFrame(sugestoes, columns=['Causa', 'Parecida com', 'Similaridade'])
+    return tabela.sort_values('Similaridade', ascending=False, ignore_index=True)
+
 # ----- FUNÇÕES AUXILIARES -----
-@st.cache_data
+@cache_monitorado("auxiliares")
 def formatar_duracao(duracao):
     """Formata uma duração (timedelta) para exibição amigável."""
     if pd.isna(duracao):
@@ -142,7 +1093,7 @@ def formatar_duracao(duracao):
     
     return f"{horas:02d}:{minutos:02d}:{segundos:02d}"
 
-@st.cache_data
+@cache_monitorado("auxiliares")
 def obter_nome_mes(mes_ano):
     """Converte o formato 'YYYY-MM' para um nome de mês legível."""
     if mes_ano == 'Todos':
@@ -159,26 +1110,137 @@ def obter_nome_mes(mes_ano):
     except:
         return mes_ano
 
-@st.cache_data
-def processar_dados(df):
-    """Processa e limpa os dados do DataFrame."""
+# Códigos de máquina dos exports e os nomes usados no app
+MAPEAMENTO_MAQUINAS = {
+    78: "PET",
+    79: "TETRA 1000",
+    80: "TETRA 200",
+    89: "SIG 1000",
+    91: "SIG 200"
+}
+
+# ----- VALIDAÇÃO DOS DADOS DE PARADAS -----
+COLUNAS_OBRIGATORIAS = ['Máquina', 'Inicio', 'Fim', 'Duração']
+TOLERANCIA_DURACAO = pd.Timedelta(minutes=1)  # Diferença aceita entre Duração e Fim − Inicio
+AMOSTRAS_VALIDACAO = 5
+
+def verificar_esquema(df):
+    """Interrompe com uma mensagem clara se faltar alguma coluna obrigatória."""
+    ausentes = [coluna for coluna in COLUNAS_OBRIGATORIAS if coluna not in df.columns]
+    if ausentes:
+        raise ValueError(
+            f"Coluna(s) obrigatória(s) ausente(s): {', '.join(ausentes)}. "
+            f"Colunas encontradas: {', '.join(map(str, df.columns))}."
+        )
+
+def validar_dados(bruto, convertido):
+    """Relatório de qualidade do arquivo: contagem e linhas de exemplo de cada verificação.
+
+    `convertido` é a saída de converter_tipos (mesmas linhas do arquivo, antes do descarte);
+    cada verificação é uma máscara vetorizada sobre as colunas, sem laço por linha.
+    """
+    verificacoes = []
+
+    def registrar(nome, tipo, mascara):
+        verificacoes.append((nome, tipo, np.asarray(mascara, dtype=bool)))
+
+    # Máquina: vazia ou com código fora do mapeamento (avaliado nos valores distintos)
+    codigos, valores = pd.factorize(bruto['Máquina'])
+    conhecidos = np.array([valor in MAPEAMENTO_MAQUINAS for valor in valores] + [True])
+    registrar("Máquina ausente", "Erro", codigos < 0)
+    registrar("Máquina desconhecida", "Aviso", ~conhecidos[codigos])
+
+    # Datas e duração: ausentes no arquivo ou que não puderam ser interpretadas
+    for coluna in ['Inicio', 'Fim', 'Duração']:
+        ausente = bruto[coluna].isna().to_numpy()
+        invalido = convertido[coluna].isna().to_numpy()
+        registrar(f"{coluna} ausente", "Erro", ausente)
+        registrar(f"{coluna} não interpretável", "Erro", invalido & ~ausente)
+
+    inicio = convertido['Inicio'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    fim = convertido['Fim'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    datas_validas = convertido['Inicio'].notna().to_numpy() & convertido['Fim'].notna().to_numpy()
+    registrar("Fim anterior ao Inicio", "Aviso", datas_validas & (fim < inicio))
+
+    duracao = convertido['Duração']
+    if pd.api.types.is_timedelta64_dtype(duracao):
+        duracao_ns = duracao.to_numpy(dtype='timedelta64[ns]').view(np.int64)
+        comparavel = datas_validas & duracao.notna().to_numpy()
+        divergente = np.abs(duracao_ns - (fim - inicio)) > TOLERANCIA_DURACAO.value
+        registrar("Duração diferente de Fim − Inicio", "Aviso", comparavel & divergente)
+
+    # Duplicatas exatas do mesmo evento
+    chaves = [c for c in ['Máquina', 'Inicio', 'Fim', 'Parada'] if c in convertido.columns]
+    registrar("Linha duplicada", "Aviso", convertido.duplicated(subset=chaves).to_numpy())
+
+    # Sobreposição: parada que começa antes do fim de uma anterior da mesma máquina
+    validas = np.flatnonzero(datas_validas & (codigos >= 0))
+    ordem = validas[np.lexsort((inicio[validas], codigos[validas]))]
+    maior_fim = pd.Series(fim[ordem]).groupby(codigos[ordem]).cummax()
+    fim_anterior = maior_fim.groupby(codigos[ordem]).shift(1, fill_value=np.iinfo(np.int64).min).to_numpy()
+    sobreposta = np.zeros(len(bruto), dtype=bool)
+    sobreposta[ordem] = inicio[ordem] < fim_anterior
+    registrar("Sobreposição na mesma máquina", "Aviso", sobreposta)
+
+    descartadas = np.zeros(len(bruto), dtype=bool)
+    amostras = {}
+    for nome, tipo, mascara in verificacoes:
+        if tipo == "Erro":
+            descartadas |= mascara
+        posicoes = np.flatnonzero(mascara)[:AMOSTRAS_VALIDACAO]
+        if len(posicoes):
+            amostra = bruto.iloc[posicoes].copy()
+            amostra.insert(0, 'Linha do Arquivo', posicoes + 2)  # + cabeçalho, numeração a partir de 1
+            amostras[nome] = amostra
+
+    total = len(bruto)
+    resumo = pd.DataFrame({
+        'Verificação': [nome for nome, _, _ in verificacoes],
+        'Tipo': [tipo for _, tipo, _ in verificacoes],
+        'Linhas': [int(mascara.sum()) for _, _, mascara in verificacoes]
+    })
+    resumo['%'] = resumo['Linhas'] / total * 100 if total else 0.0
+
+    return {
+        'linhas': total,
+        'descartadas': int(descartadas.sum()),
+        'verificacoes': resumo,
+        'amostras': amostras
+    }
+
+def exibir_relatorio_qualidade(relatorio):
+    """Mostra o resumo de qualidade do arquivo carregado e as linhas de exemplo de cada problema."""
+    problemas = relatorio['verificacoes'][relatorio['verificacoes']['Linhas'] > 0]
+    if relatorio['descartadas']:
+        st.warning(
+            f"⚠️ {relatorio['descartadas']} de {relatorio['linhas']} linha(s) descartada(s) por dados "
+            "obrigatórios ausentes ou inválidos. Veja o relatório de qualidade."
+        )
+
+    with st.expander(f"🔎 Qualidade dos Dados ({len(problemas)} verificação(ões) com ocorrências)"):
+        if problemas.empty:
+            st.success("Nenhum problema encontrado nas verificações.")
+            return
+        st.dataframe(
+            relatorio['verificacoes'],
+            column_config={'%': st.column_config.NumberColumn('%', format="%.2f")},
+            use_container_width=True, hide_index=True
+        )
+        for nome in problemas['Verificação']:
+            st.markdown(f"**{nome}** (primeiras linhas)")
+            st.dataframe(relatorio['amostras'][nome], use_container_width=True, hide_index=True)
+
+def converter_tipos(df):
+    """Mapeia as máquinas e converte Inicio, Fim e Duração, sem descartar linhas."""
+    verificar_esquema(df)
+    
     # Cria uma cópia para evitar SettingWithCopyWarning
     df_processado = df.copy()
     
-    # Mapeamento de máquinas com tratamento para códigos desconhecidos
-    machine_mapping = {
-        78: "PET",
-        79: "TETRA 1000",
-        80: "TETRA 200",
-        89: "SIG 1000",
-        91: "SIG 200"
-    }
-    
-    if 'Máquina' in df_processado.columns:
-        # Preserva o código original se não estiver no mapeamento
-        df_processado['Máquina'] = df_processado['Máquina'].apply(
-            lambda x: machine_mapping.get(x, f"Máquina {x}")
-        )
+    # Mapeamento de máquinas, uma vez por código distinto; códigos desconhecidos são preservados
+    codigos, valores = pd.factorize(df_processado['Máquina'])
+    nomes = np.array([MAPEAMENTO_MAQUINAS.get(valor, f"Máquina {valor}") for valor in valores] + [None], dtype=object)
+    df_processado['Máquina'] = nomes[codigos]  # código -1 (vazio) continua vazio e é descartado na limpeza
     
     # Converte as colunas de tempo para o formato datetime
     for col in ['Inicio', 'Fim']:
@@ -212,20 +1274,40 @@ def processar_dados(df):
     df_processado['Mês_Nome'] = df_processado['Inicio'].dt.strftime('%B')  # Nome do mês
     df_processado['Ano-Mês'] = df_processado['Inicio'].dt.strftime('%Y-%m')
     
+    return df_processado
+
+def limpar_dados(df_convertido):
+    """Descarta os registros incompletos e unifica as grafias das causas."""
     # Remove registros com valores ausentes nas colunas essenciais
-    df_processado = df_processado.dropna(subset=['Máquina', 'Inicio', 'Fim', 'Duração'])
+    df_processado = df_convertido.dropna(subset=COLUNAS_OBRIGATORIAS)
+    
+    # Unifica as variantes de grafia das causas de parada
+    if 'Parada' in df_processado.columns:
+        df_processado['Parada'] = normalizar_causas(df_processado['Parada'])
     
     return df_processado
 
+@cache_monitorado("processamento")
+def processar_dados(df):
+    """Processa e limpa os dados do DataFrame."""
+    return limpar_dados(converter_tipos(df))
+
+def processar_dados_validados(df):
+    """Processa os dados e gera o relatório de qualidade sobre a mesma conversão de tipos."""
+    convertido = converter_tipos(df)
+    return limpar_dados(convertido), validar_dados(df, convertido)
+
 # ----- FUNÇÕES DE CÁLCULO DE INDICADORES -----
-@st.cache_data
-def calcular_disponibilidade(df, tempo_programado):
-    """Calcula a taxa de disponibilidade."""
-    tempo_total_parado = df['Duração'].sum()
+@cache_monitorado("indicadores")
+def calcular_disponibilidade(df, tempo_programado, tempo_parado=None):
+    """Calcula a taxa de disponibilidade (`tempo_parado` padrão: soma das durações)."""
+    if tempo_programado <= pd.Timedelta(0):
+        return 0
+    tempo_total_parado = df['Duração'].sum() if tempo_parado is None else tempo_parado
     disponibilidade = (tempo_programado - tempo_total_parado) / tempo_programado * 100
     return max(0, min(100, disponibilidade))
 
-@st.cache_data
+@cache_monitorado("indicadores")
 def indice_paradas_por_area(df):
     """Calcula o índice de paradas por área responsável."""
     if 'Área Responsável' in df.columns:
@@ -234,7 +1316,7 @@ def indice_paradas_por_area(df):
     else:
         return pd.Series()
 
-@st.cache_data
+@cache_monitorado("indicadores")
 def pareto_causas_parada(df):
     """Identifica as principais causas de paradas (Pareto) por duração total."""
     if 'Parada' in df.columns:
@@ -243,7 +1325,7 @@ def pareto_causas_parada(df):
     else:
         return pd.Series()
 
-@st.cache_data
+@cache_monitorado("indicadores")
 def paradas_mais_frequentes(df):
     """Identifica as paradas mais frequentes por contagem."""
     if 'Parada' in df.columns:
@@ -252,25 +1334,25 @@ def paradas_mais_frequentes(df):
     else:
         return pd.Series()
 
-@st.cache_data
+@cache_monitorado("indicadores")
 def tempo_medio_paradas(df):
     """Calcula o tempo médio de parada (TMP)."""
     tmp = df['Duração'].mean()
     return tmp
 
-@st.cache_data
+@cache_monitorado("indicadores")
 def taxa_ocorrencia_paradas(df):
     """Calcula a taxa de ocorrência de paradas (número total de paradas por mês)."""
     ocorrencias_mensais = df.groupby('Ano-Mês').size()
     return ocorrencias_mensais
 
-@st.cache_data
+@cache_monitorado("indicadores")
 def duracao_total_por_mes(df):
     """Calcula a duração total de paradas por mês."""
     duracao_mensal = df.groupby('Ano-Mês')['Duração'].sum()
     return duracao_mensal
 
-@st.cache_data
+@cache_monitorado("indicadores")
 def tempo_total_paradas_area(df):
     """Calcula o tempo total de paradas por área."""
     if 'Área Responsável' in df.columns:
@@ -279,7 +1361,7 @@ def tempo_total_paradas_area(df):
     else:
         return pd.Series()
 
-@st.cache_data
+@cache_monitorado("indicadores")
 def frequencia_categorias_paradas(df):
     """Calcula a frequência de paradas por categoria."""
     if 'Parada' in df.columns:
@@ -288,14 +1370,16 @@ def frequencia_categorias_paradas(df):
     else:
         return pd.Series()
 
-@st.cache_data
-def eficiencia_operacional(df, tempo_programado):
-    """Calcula a eficiência operacional."""
-    tempo_operacao = tempo_programado - df['Duração'].sum()
+@cache_monitorado("indicadores")
+def eficiencia_operacional(df, tempo_programado, tempo_parado=None):
+    """Calcula a eficiência operacional (`tempo_parado` padrão: soma das durações)."""
+    if tempo_programado <= pd.Timedelta(0):
+        return 0
+    tempo_operacao = tempo_programado - (df['Duração'].sum() if tempo_parado is None else tempo_parado)
     eficiencia = tempo_operacao / tempo_programado * 100
     return max(0, min(100, eficiencia))
 
-@st.cache_data
+@cache_monitorado("indicadores")
 def indice_paradas_criticas(df, limite_horas=1):
     """Identifica paradas críticas (com duração maior que o limite especificado)."""
     limite = pd.Timedelta(hours=limite_horas)
@@ -303,56 +1387,1333 @@ def indice_paradas_criticas(df, limite_horas=1):
     percentual_criticas = len(paradas_criticas) / len(df) * 100 if len(df) > 0 else 0
     return paradas_criticas, percentual_criticas
 
-# ----- FUNÇÕES DE VISUALIZAÇÃO -----
-@st.cache_data
-def criar_grafico_pareto(pareto):
-    """Cria um gráfico de Pareto com Plotly."""
-    if pareto.empty:
-        return None
-    
-    # Converte durações para horas
-    pareto_horas = pareto.apply(lambda x: x.total_seconds() / 3600)
-    
-    fig = px.bar(
-        x=pareto_horas.index,
-        y=pareto_horas.values,
-        labels={'x': 'Causa de Parada', 'y': 'Duração Total (horas)'},
-        title="Pareto de Causas de Paradas (Top 10 por Duração)",
-        color_discrete_sequence=['#3498db'],
-        text=pareto_horas.values.round(1)
-    )
+@cache_monitorado("indicadores")
+def resumo_por_maquina(df):
+    """Calcula o número de paradas e a duração total e média por máquina."""
+    resumo_maquina = df.groupby('Máquina').agg({
+        'Duração': ['count', 'sum', 'mean']
+    })
+    resumo_maquina.columns = ['Número de Paradas', 'Duração Total', 'Duração Média']
     
-    fig.update_traces(
-        texttemplate='%{text}h', 
-        textposition='outside'
+    # Converte para horas
+    resumo_maquina['Duração Total (horas)'] = resumo_maquina['Duração Total'].apply(lambda x: x.total_seconds() / 3600)
+    resumo_maquina['Duração Média (horas)'] = resumo_maquina['Duração Média'].apply(lambda x: x.total_seconds() / 3600)
+    return resumo_maquina
+
+NOMES_DIAS_SEMANA = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
+
+@cache_monitorado("indicadores")
+def paradas_por_dia_semana(df):
+    """Número de paradas e duração por dia da semana, de segunda a domingo."""
+    tabela = df.groupby(df['Inicio'].dt.dayofweek)['Duração'].agg(['count', 'sum'])
+    tabela.columns = ['Número de Paradas', 'Duração Total']
+    tabela['Duração (horas)'] = tabela['Duração Total'].dt.total_seconds() / 3600
+    if not tabela.empty:
+        tabela = tabela.reindex(range(7))
+    tabela.index = pd.Index([NOMES_DIAS_SEMANA[dia] for dia in tabela.index], name='Dia da Semana PT')
+    return tabela
+
+@cache_monitorado("indicadores")
+def paradas_por_hora_dia(df):
+    """Número de paradas e duração por hora do dia em que a parada começou."""
+    tabela = df.groupby(df['Inicio'].dt.hour.rename('Hora do Dia'))['Duração'].agg(['count', 'sum'])
+    tabela.columns = ['Número de Paradas', 'Duração Total']
+    tabela['Duração (horas)'] = tabela['Duração Total'].dt.total_seconds() / 3600
+    return tabela
+
+# ----- CALENDÁRIO DE TURNOS -----
+# Cada turno é [nome, início, fim]; um fim menor ou igual ao início atravessa a meia-noite.
+# `dias_semana` usa 0 = segunda-feira e se refere ao dia em que o turno começa. As equipes se
+# revezam a cada turno trabalhado, a partir de `referencia_equipes`. Calendários adicionais podem
+# ser definidos em ATD_CALENDARIOS_TURNOS (JSON ou caminho de um arquivo .json).
+CALENDARIOS_TURNOS_PADRAO = {
+    "24h (3 turnos)": {
+        'turnos': [["Turno A", "06:00", "14:00"], ["Turno B", "14:00", "22:00"], ["Turno C", "22:00", "06:00"]],
+        'dias_semana': [0, 1, 2, 3, 4, 5, 6],
+        'equipes': ["Equipe 1", "Equipe 2", "Equipe 3", "Equipe 4"],
+        'referencia_equipes': "2024-01-01",
+        'paradas_programadas': []
+    },
+    "2 turnos (seg-sáb)": {
+        'turnos': [["Turno A", "06:00", "14:00"], ["Turno B", "14:00", "22:00"]],
+        'dias_semana': [0, 1, 2, 3, 4, 5],
+        'equipes': ["Equipe 1", "Equipe 2", "Equipe 3"],
+        'referencia_equipes': "2024-01-01",
+        'paradas_programadas': []
+    }
+}
+CALENDARIO_TURNOS_PADRAO = "24h (3 turnos)"
+
+def calendarios_turnos():
+    """Retorna os calendários de turnos disponíveis, incluindo os da variável de ambiente."""
+    calendarios = dict(CALENDARIOS_TURNOS_PADRAO)
+    configuracao = os.environ.get('ATD_CALENDARIOS_TURNOS', '').strip()
+    if not configuracao:
+        return calendarios
+
+    try:
+        if not configuracao.startswith('{'):
+            with open(configuracao, encoding='utf-8') as arquivo:
+                configuracao = arquivo.read()
+        calendarios.update(json.loads(configuracao))
+    except (OSError, ValueError):
+        logger_desempenho.warning("ATD_CALENDARIOS_TURNOS inválida; usando os calendários padrão.")
+    return calendarios
+
+def _minutos(horario):
+    """Converte 'HH:MM' em minutos desde a meia-noite."""
+    horas, minutos = map(int, horario.split(':'))
+    return horas * 60 + minutos
+
+def unir_intervalos(inicios, fins):
+    """Ordena e funde intervalos sobrepostos; retorna (inícios, fins) disjuntos."""
+    if len(inicios) == 0:
+        return inicios, fins
+
+    ordem = np.argsort(inicios, kind='stable')
+    inicios, fins = inicios[ordem], fins[ordem]
+    fim_acumulado = np.maximum.accumulate(fins)
+    novos = np.r_[True, inicios[1:] > fim_acumulado[:-1]]
+    grupos = np.flatnonzero(novos)
+    return inicios[grupos], np.maximum.reduceat(fins, grupos)
+
+def cobertura_acumulada(inicios, fins, t):
+    """Tempo total coberto pelos intervalos disjuntos e ordenados antes de cada instante t."""
+    if len(inicios) == 0:
+        return np.zeros(len(t), dtype=np.int64)
+
+    acumulado = np.r_[0, np.cumsum(fins - inicios)]
+    i = np.searchsorted(inicios, t, side='right')
+    # Intervalo que contém t conta só até t
+    excesso = np.where(i > 0, np.maximum(0, fins[np.maximum(i - 1, 0)] - t), 0)
+    return acumulado[i] - excesso
+
+@cache_monitorado("indicadores")
+def instancias_turnos(calendario, inicio, fim):
+    """Gera, sem laços por dia, todas as ocorrências de turno no período [inicio, fim).
+
+    Retorna arrays ordenados de início/fim (ns), o turno e a equipe de cada ocorrência e o tempo
+    programado (duração menos as paradas programadas).
+    """
+    turnos = calendario['turnos']
+    deslocamentos = np.array([_minutos(t[1]) for t in turnos], dtype=np.int64) * 60 * 10**9
+    duracoes = np.array([(_minutos(t[2]) - _minutos(t[1])) % (24 * 60) or 24 * 60 for t in turnos], dtype=np.int64) * 60 * 10**9
+
+    # Dias cujo turno pode cair no período (o da véspera pode atravessar a meia-noite)
+    dias = pd.date_range(inicio.normalize() - pd.Timedelta(days=1), fim.normalize(), freq='D')
+    dias = dias[np.isin(dias.dayofweek, calendario['dias_semana'])]
+    dias_ns = dias.values.astype('datetime64[ns]').view(np.int64)
+
+    inicios = (dias_ns[:, None] + deslocamentos[None, :]).ravel()
+    fins = inicios + np.tile(duracoes, len(dias_ns))
+    turno = np.tile(np.arange(len(turnos)), len(dias_ns))
+
+    # Revezamento: cada turno trabalhado desde a referência passa para a próxima equipe
+    equipes = calendario.get('equipes') or []
+    if equipes:
+        referencia = pd.Timestamp(calendario.get('referencia_equipes', "2024-01-01")).normalize()
+        trabalha = np.isin((referencia.dayofweek + np.arange(7)) % 7, calendario['dias_semana'])
+        prefixo = np.r_[0, np.cumsum(trabalha)]
+
+        # Dias trabalhados entre a referência e cada dia: semanas completas mais o resto da semana
+        semanas, resto = np.divmod((dias_ns - referencia.value) // (86400 * 10**9), 7)
+        sequencia = semanas * trabalha.sum() + prefixo[resto]
+        equipe = (np.repeat(sequencia, len(turnos)) * len(turnos) + turno) % len(equipes)
+    else:
+        equipe = np.full(len(inicios), -1)
+
+    # Recorta no período e descarta ocorrências fora dele
+    inicios = np.maximum(inicios, inicio.value)
+    fins = np.minimum(fins, fim.value)
+    validas = fins > inicios
+    inicios, fins, turno, equipe = inicios[validas], fins[validas], turno[validas], equipe[validas]
+
+    ordem = np.argsort(inicios, kind='stable')
+    inicios, fins, turno, equipe = inicios[ordem], fins[ordem], turno[ordem], equipe[ordem]
+
+    programadas = calendario.get('paradas_programadas') or []
+    pp_inicios, pp_fins = unir_intervalos(
+        np.array([pd.Timestamp(p['inicio']).value for p in programadas], dtype=np.int64),
+        np.array([pd.Timestamp(p['fim']).value for p in programadas], dtype=np.int64)
     )
-    
-    fig.update_layout(
-        xaxis_tickangle=-45,
-        autosize=True,
-        margin=dict(l=50, r=50, t=80, b=100),
-        plot_bgcolor='rgba(0,0,0,0)',
-        yaxis_title="Duração Total (horas)",
-        xaxis_title="Causa de Parada",
-        hoverlabel=dict(
-            bgcolor="white",
-            font_size=12,
-            font_family="Arial"
-        ),
-        title={
-            'y':0.95,
-            'x':0.5,
-            'xanchor': 'center',
-            'yanchor': 'top'
-        }
+    planejado = (fins - inicios) - (cobertura_acumulada(pp_inicios, pp_fins, fins) - cobertura_acumulada(pp_inicios, pp_fins, inicios))
+
+    return {
+        'inicio': inicios,
+        'fim': fins,
+        'turno': turno,
+        'equipe': equipe,
+        'programado': planejado,
+        'paradas_programadas': (pp_inicios, pp_fins)
+    }
+
+def localizar_turno(instancias, t):
+    """Retorna, para cada instante t (ns), a ocorrência de turno que o contém e se ela existe."""
+    j = np.searchsorted(instancias['inicio'], t, side='right') - 1
+    if len(instancias['inicio']) == 0:
+        return j, np.zeros(len(t), dtype=bool)
+    return j, (j >= 0) & (t < instancias['fim'][np.maximum(j, 0)])
+
+def dividir_paradas_turnos(instancias, a, b):
+    """Divide as paradas [a, b) entre as ocorrências de turno que atravessam.
+
+    Retorna (parada, ocorrencia, tempo_ns) por trecho; o tempo em paradas programadas é descontado.
+    """
+    pp_inicios, pp_fins = instancias['paradas_programadas']
+
+    primeira = np.searchsorted(instancias['fim'], a, side='right')
+    ultima = np.searchsorted(instancias['inicio'], b, side='left') - 1
+    pedacos = np.maximum(ultima - primeira + 1, 0)
+    parada = np.repeat(np.arange(len(a)), pedacos)
+    k = np.repeat(primeira, pedacos) + np.arange(pedacos.sum()) - np.repeat(np.cumsum(pedacos) - pedacos, pedacos)
+
+    inicio_trecho = np.maximum(a[parada], instancias['inicio'][k])
+    fim_trecho = np.minimum(b[parada], instancias['fim'][k])
+    tempo = (
+        np.maximum(fim_trecho - inicio_trecho, 0)
+        - (cobertura_acumulada(pp_inicios, pp_fins, fim_trecho) - cobertura_acumulada(pp_inicios, pp_fins, inicio_trecho))
     )
-    
-    return fig
+    return parada, k, np.maximum(tempo, 0)
 
-@st.cache_data
-def criar_grafico_pizza_areas(indice_paradas):
-    """Cria um gráfico de pizza para áreas responsáveis com Plotly."""
-    if indice_paradas.empty:
+@cache_monitorado("indicadores")
+def analisar_turnos(df, inicio, fim, calendario):
+    """Divide as paradas entre as ocorrências de turno e calcula a disponibilidade por turno e por equipe."""
+    instancias = instancias_turnos(calendario, inicio, fim)
+    n_instancias = len(instancias['inicio'])
+
+    a = df['Inicio'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    b = np.maximum(df['Fim'].to_numpy(dtype='datetime64[ns]').view(np.int64), a)
+
+    # Ocorrência de turno em que cada parada começa (contagem de paradas)
+    j, no_turno = localizar_turno(instancias, a)
+    paradas_instancia = np.bincount(j[no_turno], minlength=n_instancias).astype(float)
+
+    # Cada parada é dividida entre todas as ocorrências de turno que ela atravessa
+    _, k, tempo = dividir_paradas_turnos(instancias, a, b)
+    parado_instancia = np.bincount(k, weights=tempo, minlength=n_instancias)
+
+    def resumir(codigos, nomes, rotulo):
+        programado = np.bincount(codigos, weights=instancias['programado'], minlength=len(nomes)) / 3.6e12
+        parado = np.bincount(codigos, weights=parado_instancia, minlength=len(nomes)) / 3.6e12
+        paradas = np.bincount(codigos, weights=paradas_instancia, minlength=len(nomes))
+        disponibilidade = np.divide(programado - parado, programado, out=np.zeros(len(nomes)), where=programado > 0) * 100
+        return pd.DataFrame({
+            rotulo: nomes,
+            'Paradas': paradas.astype(int),
+            'Horas Programadas': programado,
+            'Horas Paradas': parado,
+            'Disponibilidade (%)': np.clip(disponibilidade, 0, 100)
+        })
+
+    nomes_turnos = [t[0] for t in calendario['turnos']]
+    equipes = calendario.get('equipes') or []
+
+    return {
+        'tempo_programado': pd.Timedelta(int(instancias['programado'].sum()), unit='ns'),
+        'tempo_parado': pd.Timedelta(int(parado_instancia.sum()), unit='ns'),
+        'por_turno': resumir(instancias['turno'], nomes_turnos, 'Turno'),
+        'por_equipe': resumir(instancias['equipe'], equipes, 'Equipe') if equipes else pd.DataFrame(),
+        'paradas_fora_turno': int((~no_turno).sum())
+    }
+
+# ----- OEE (PRODUÇÃO × PARADAS) -----
+# O arquivo de produção traz, por máquina, apontamentos com data/hora, unidades produzidas no
+# intervalo (total e boas) e a taxa nominal em unidades por hora.
+COLUNAS_PRODUCAO = {
+    'Máquina': ['maquina'],
+    'Data': ['data', 'data/hora', 'data hora', 'timestamp', 'inicio', 'horario'],
+    'Total': ['producao total', 'total', 'unidades totais', 'quantidade total'],
+    'Boas': ['producao boa', 'boas', 'unidades boas', 'quantidade boa'],
+    'Taxa Nominal': ['taxa nominal', 'taxa', 'velocidade nominal', 'cadencia nominal']
+}
+
+@cache_monitorado("processamento")
+def processar_producao(df):
+    """Padroniza o arquivo de produção (Máquina, Data, Total, Boas, Taxa Nominal), ordenado por Data."""
+    normalizadas = {remover_acentos(str(c)).strip().lower(): c for c in df.columns}
+    renomear = {}
+    for coluna, apelidos in COLUNAS_PRODUCAO.items():
+        original = next((normalizadas[a] for a in apelidos if a in normalizadas), None)
+        if original is None:
+            raise ValueError(f"Coluna obrigatória ausente no arquivo de produção: {coluna}")
+        renomear[original] = coluna
+
+    producao = df[list(renomear)].rename(columns=renomear)
+
+    # Códigos de máquina mapeados uma vez por valor distinto, não por apontamento
+    codigos, valores = pd.factorize(producao['Máquina'])
+    nomes = np.array([
+        valor if isinstance(valor, str) else MAPEAMENTO_MAQUINAS.get(valor, f"Máquina {valor}")
+        for valor in valores
+    ] + [None], dtype=object)
+    producao['Máquina'] = nomes[codigos]  # código -1 (vazio) aponta para o None final
+
+    producao['Data'] = pd.to_datetime(producao['Data'], errors='coerce')
+    for coluna in ['Total', 'Boas', 'Taxa Nominal']:
+        producao[coluna] = pd.to_numeric(producao[coluna], errors='coerce')
+
+    producao = producao.dropna()
+    producao = producao[producao['Taxa Nominal'] > 0]
+    return producao.sort_values('Data', kind='stable').reset_index(drop=True)
+
+def filtrar_producao(producao, maquinas_selecionadas, inicio, fim):
+    """Filtra os apontamentos de produção pelas máquinas e pelo período [inicio, fim)."""
+    datas = producao['Data'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    esquerda = np.searchsorted(datas, inicio.value, side='left')
+    direita = np.searchsorted(datas, fim.value, side='left')
+    selecao = producao.iloc[esquerda:direita]
+
+    if maquinas_selecionadas != "Todas":
+        maquinas = [maquinas_selecionadas] if isinstance(maquinas_selecionadas, str) else list(maquinas_selecionadas)
+        selecao = selecao[selecao['Máquina'].isin(maquinas)]
+    return selecao
+
+def resumir_oee(tabela, por=None):
+    """Consolida horas e unidades e calcula disponibilidade, performance, qualidade e OEE (%)."""
+    colunas = ['Horas Programadas', 'Horas Paradas', 'Horas Ideais', 'Produção Total', 'Produção Boa']
+    resumo = tabela.groupby(por, sort=True)[colunas].sum() if por else tabela[colunas].sum().to_frame().T
+
+    programado = resumo['Horas Programadas'].to_numpy(dtype=float)
+    operando = programado - resumo['Horas Paradas'].to_numpy(dtype=float)
+    total = resumo['Produção Total'].to_numpy(dtype=float)
+
+    def razao(numerador, denominador):
+        return np.divide(numerador, denominador, out=np.zeros(len(resumo)), where=denominador > 0)
+
+    resumo['Disponibilidade (%)'] = razao(operando, programado) * 100
+    resumo['Performance (%)'] = razao(resumo['Horas Ideais'].to_numpy(dtype=float), operando) * 100
+    resumo['Qualidade (%)'] = razao(resumo['Produção Boa'].to_numpy(dtype=float), total) * 100
+    resumo['OEE (%)'] = resumo['Disponibilidade (%)'] * resumo['Performance (%)'] * resumo['Qualidade (%)'] / 10000
+    return resumo.reset_index() if por else resumo.reset_index(drop=True)
+
+@cache_monitorado("indicadores")
+def calcular_oee(paradas, producao, inicio, fim, calendario):
+    """Calcula o OEE (disponibilidade × performance × qualidade) por máquina, turno e mês.
+
+    As paradas e os apontamentos são distribuídos pelas ocorrências de turno do calendário; a taxa
+    nominal vigente em cada parada vem do apontamento anterior da mesma máquina (merge_asof).
+    """
+    instancias = instancias_turnos(calendario, inicio, fim)
+    n = len(instancias['inicio'])
+    maquinas = pd.Index(sorted(producao['Máquina'].unique()))
+    paradas = paradas[paradas['Máquina'].isin(maquinas)]
+
+    # Tempo parado por (máquina, ocorrência de turno)
+    a = paradas['Inicio'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    b = np.maximum(paradas['Fim'].to_numpy(dtype='datetime64[ns]').view(np.int64), a)
+    codigo_parada = maquinas.get_indexer(paradas['Máquina'])
+    parada, k, tempo = dividir_paradas_turnos(instancias, a, b)
+    parado = np.bincount(codigo_parada[parada] * n + k, weights=tempo, minlength=len(maquinas) * n)
+
+    # Produção por (máquina, ocorrência de turno); apontamentos fora dos turnos ficam de fora
+    t = producao['Data'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    j, no_turno = localizar_turno(instancias, t)
+    chave = maquinas.get_indexer(producao['Máquina'])[no_turno] * n + j[no_turno]
+    total = producao['Total'].to_numpy(dtype=float)[no_turno]
+    boas = producao['Boas'].to_numpy(dtype=float)[no_turno]
+    ideais = total / producao['Taxa Nominal'].to_numpy(dtype=float)[no_turno]
+
+    nomes_turnos = np.array([turno[0] for turno in calendario['turnos']], dtype=object)
+    meses = pd.DatetimeIndex(instancias['inicio'].astype('datetime64[ns]')).strftime('%Y-%m')
+    tabela = pd.DataFrame({
+        'Máquina': np.repeat(maquinas.to_numpy(dtype=object), n),
+        'Turno': np.tile(nomes_turnos[instancias['turno']], len(maquinas)),
+        'Ano-Mês': np.tile(np.asarray(meses, dtype=object), len(maquinas)),
+        'Horas Programadas': np.tile(instancias['programado'], len(maquinas)) / 3.6e12,
+        'Horas Paradas': parado / 3.6e12,
+        'Horas Ideais': np.bincount(chave, weights=ideais, minlength=len(maquinas) * n),
+        'Produção Total': np.bincount(chave, weights=total, minlength=len(maquinas) * n),
+        'Produção Boa': np.bincount(chave, weights=boas, minlength=len(maquinas) * n)
+    })
+
+    # Unidades perdidas em cada parada, pela taxa nominal vigente na máquina
+    horas_parada = np.bincount(parada, weights=tempo, minlength=len(a)) / 3.6e12
+    linha_do_tempo = pd.DataFrame({
+        'Inicio': paradas['Inicio'].to_numpy(),
+        'Máquina': paradas['Máquina'].to_numpy(dtype=object),
+        'Parada': paradas['Parada'].to_numpy(dtype=object) if 'Parada' in paradas.columns else "Não informada",
+        'Horas Paradas': horas_parada
+    }).sort_values('Inicio', kind='stable')
+    taxas = producao[['Data', 'Máquina', 'Taxa Nominal']]
+    juncao = pd.merge_asof(linha_do_tempo, taxas, left_on='Inicio', right_on='Data', by='Máquina', direction='backward')
+    # Paradas anteriores ao primeiro apontamento usam a taxa do apontamento seguinte
+    seguinte = pd.merge_asof(linha_do_tempo, taxas, left_on='Inicio', right_on='Data', by='Máquina', direction='forward')
+    juncao['Unidades Perdidas'] = juncao['Horas Paradas'] * juncao['Taxa Nominal'].fillna(seguinte['Taxa Nominal'])
+
+    perdas = (
+        juncao.groupby('Parada')[['Horas Paradas', 'Unidades Perdidas']].sum()
+        .sort_values('Unidades Perdidas', ascending=False)
+        .head(10)
+        .reset_index()
+    )
+
+    return {
+        'geral': resumir_oee(tabela).iloc[0].to_dict(),
+        'por_maquina': resumir_oee(tabela, 'Máquina'),
+        'por_turno': resumir_oee(tabela, 'Turno'),
+        'por_mes': resumir_oee(tabela, 'Ano-Mês'),
+        'perdas_por_causa': perdas,
+        'apontamentos_fora_turno': int((~no_turno).sum())
+    }
+
+# ----- PREVISÃO DE PARADAS -----
+# Tendência linear (mais sazonalidade anual quando há ao menos dois anos de histórico) ajustada
+# por mínimos quadrados. Todas as séries mensais compartilham a mesma matriz de projeto, então um
+# único lstsq com várias colunas resolve o total, as máquinas e as combinações máquina × causa.
+HORIZONTE_PREVISAO = 3
+NIVEL_CONFIANCA_PREVISAO = 0.95
+MIN_MESES_PREVISAO = 4
+MIN_MESES_SAZONALIDADE = 24
+
+def matriz_projeto(meses, sazonal):
+    """Matriz de projeto [1, t, sen, cos] para índices de mês (a fase anual é absorvida por sen/cos)."""
+    meses = np.asarray(meses, dtype=float)
+    colunas = [np.ones_like(meses), meses]
+    if sazonal:
+        angulo = 2 * np.pi * (meses % 12) / 12
+        colunas += [np.sin(angulo), np.cos(angulo)]
+    return np.column_stack(colunas)
+
+def ajustar_series(Y, meses, meses_futuros, nivel=NIVEL_CONFIANCA_PREVISAO):
+    """Ajusta todas as linhas de Y (séries × meses) de uma vez e projeta os meses futuros.
+
+    Retorna (previsto, inferior, superior), cada um com forma (séries × horizonte).
+    """
+    sazonal = len(meses) >= MIN_MESES_SAZONALIDADE
+    # Centraliza o tempo no último mês observado para melhorar o condicionamento
+    referencia = meses[-1]
+    X = matriz_projeto(meses - referencia, sazonal)
+    X_futuro = matriz_projeto(meses_futuros - referencia, sazonal)
+
+    coeficientes, *_ = np.linalg.lstsq(X, Y.T, rcond=None)
+    residuos = Y.T - X @ coeficientes
+    graus_liberdade = max(len(meses) - X.shape[1], 1)
+    variancia = (residuos ** 2).sum(axis=0) / graus_liberdade
+
+    # Variância de predição: sigma² · (1 + x0ᵀ (XᵀX)⁻¹ x0), igual para todas as séries exceto sigma²
+    alavancagem = np.einsum('ij,jk,ik->i', X_futuro, np.linalg.pinv(X.T @ X), X_futuro)
+    margem = NormalDist().inv_cdf(0.5 + nivel / 2) * np.sqrt(variancia[:, None] * (1 + alavancagem[None, :]))
+
+    previsto = (X_futuro @ coeficientes).T
+    return np.clip(previsto, 0, None), np.clip(previsto - margem, 0, None), np.clip(previsto + margem, 0, None)
+
+@cache_monitorado("indicadores")
+def prever_paradas(df, horizonte=HORIZONTE_PREVISAO):
+    """Prevê número de paradas e horas paradas dos próximos meses.
+
+    Retorna {'total', 'por_maquina', 'por_causa'} ou None com menos de MIN_MESES_PREVISAO meses.
+    """
+    if df.empty:
+        return None
+
+    mes_absoluto = df['Ano'].to_numpy(dtype=np.int64) * 12 + df['Mês'].to_numpy(dtype=np.int64) - 1
+    primeiro = mes_absoluto.min()
+    n_meses = int(mes_absoluto.max() - primeiro + 1)
+    if n_meses < MIN_MESES_PREVISAO:
+        return None
+    coluna_mes = mes_absoluto - primeiro
+    horas = df['Duração'].dt.total_seconds().to_numpy() / 3600
+
+    # Identificador de série de cada linha em cada nível (total, máquina, máquina × causa)
+    codigo_maquina, maquinas = pd.factorize(df['Máquina'], sort=True)
+    codigo_causa, causas = pd.factorize(df['Parada'], sort=True)
+    valida = codigo_causa >= 0
+    codigo_combinacao, combinacoes = pd.factorize(codigo_maquina[valida] * len(causas) + codigo_causa[valida], sort=True)
+
+    niveis = [
+        (np.zeros(len(df), dtype=np.int64), coluna_mes, horas, 1),
+        (codigo_maquina, coluna_mes, horas, len(maquinas)),
+        (codigo_combinacao, coluna_mes[valida], horas[valida], len(combinacoes))
+    ]
+    paradas, horas_paradas = [], []
+    for serie, mes, peso, n_series in niveis:
+        posicao = serie * n_meses + mes
+        tamanho = n_series * n_meses
+        paradas.append(np.bincount(posicao, minlength=tamanho).reshape(n_series, n_meses))
+        horas_paradas.append(np.bincount(posicao, weights=peso, minlength=tamanho).reshape(n_series, n_meses))
+
+    # Um único ajuste para as duas medidas de todas as séries
+    Y = np.vstack(paradas + horas_paradas).astype(float)
+    meses = np.arange(n_meses) + primeiro
+    meses_futuros = meses[-1] + 1 + np.arange(horizonte)
+    previsto, inferior, superior = ajustar_series(Y, meses, meses_futuros)
+
+    n_total = sum(nivel[3] for nivel in niveis)
+    rotulos_meses = [f"{m // 12:04d}-{m % 12 + 1:02d}" for m in meses_futuros]
+
+    def tabela(inicio, n_series):
+        """Monta a tabela longa (série × mês) de um nível a partir das linhas do ajuste."""
+        linhas = slice(inicio, inicio + n_series)
+        linhas_horas = slice(n_total + inicio, n_total + inicio + n_series)
+        return pd.DataFrame({
+            'Mês': np.tile(rotulos_meses, n_series),
+            'Paradas Previstas': previsto[linhas].ravel(),
+            'Paradas (mín.)': inferior[linhas].ravel(),
+            'Paradas (máx.)': superior[linhas].ravel(),
+            'Horas Previstas': previsto[linhas_horas].ravel(),
+            'Horas (mín.)': inferior[linhas_horas].ravel(),
+            'Horas (máx.)': superior[linhas_horas].ravel()
+        })
+
+    total = tabela(0, 1).set_index('Mês')
+
+    por_maquina = tabela(1, len(maquinas))
+    por_maquina.insert(0, 'Máquina', np.repeat(np.asarray(maquinas), horizonte))
+
+    por_causa = tabela(1 + len(maquinas), len(combinacoes))
+    combinacoes = np.asarray(combinacoes)
+    por_causa.insert(0, 'Parada', np.repeat(np.asarray(causas)[combinacoes % len(causas)], horizonte))
+    por_causa.insert(0, 'Máquina', np.repeat(np.asarray(maquinas)[combinacoes // len(causas)], horizonte))
+
+    return {'total': total, 'por_maquina': por_maquina, 'por_causa': por_causa}
+
+# ----- CONFIABILIDADE (WEIBULL) -----
+# Weibull e exponencial ajustadas por máxima verossimilhança para todos os grupos de uma vez:
+# os valores ficam ordenados por grupo e as somas de cada iteração de Newton saem de um único
+# np.add.reduceat, sem laço por grupo.
+MIN_FALHAS_CONFIABILIDADE = 5
+TOP_CAUSAS_CONFIABILIDADE = 10
+MAX_ITERACOES_WEIBULL = 100
+LIMITES_FORMA_WEIBULL = (0.05, 50.0)
+
+def ajustar_weibull(valores, grupos, n_grupos):
+    """Estimativa de máxima verossimilhança da Weibull para vários grupos simultaneamente.
+
+    `valores` (> 0) devem estar ordenados por `grupos` (códigos 0..n_grupos-1, todos presentes).
+    Retorna um dicionário de arrays por grupo: n, forma, escala, media, logv_weibull, logv_exponencial.
+    """
+    if n_grupos == 0:
+        vazio = np.array([], dtype=float)
+        return {'n': np.array([], dtype=np.int64), 'forma': vazio, 'escala': vazio, 'media': vazio,
+                'logv_weibull': vazio, 'logv_exponencial': vazio}
+
+    n = np.bincount(grupos, minlength=n_grupos).astype(float)
+    inicios = np.concatenate(([0], np.cumsum(n[:-1]).astype(np.int64)))
+    log_x = np.log(valores)
+    media_log = np.add.reduceat(log_x, inicios) / n
+
+    # Centraliza pelo log-médio do grupo: a forma é invariante à escala e as exponenciais não estouram
+    z = log_x - media_log[grupos]
+    desvio = np.sqrt(np.add.reduceat(z ** 2, inicios) / n)
+    forma = np.clip(1.2 / np.maximum(desvio, 1e-12), *LIMITES_FORMA_WEIBULL)
+
+    def somas(forma):
+        kz = forma[grupos] * z
+        maximo = np.maximum.reduceat(kz, inicios)
+        peso = np.exp(kz - maximo[grupos])
+        return (np.add.reduceat(peso, inicios), np.add.reduceat(peso * z, inicios),
+                np.add.reduceat(peso * z ** 2, inicios), maximo)
+
+    # Newton sobre a equação de verossimilhança perfilada da forma: E_w[z] - 1/k = 0
+    for _ in range(MAX_ITERACOES_WEIBULL):
+        s0, s1, s2, _maximo = somas(forma)
+        media_z = s1 / s0
+        funcao = media_z - 1 / forma
+        derivada = s2 / s0 - media_z ** 2 + 1 / forma ** 2
+        nova = forma - funcao / derivada
+        nova = np.clip(np.where(nova > 0, nova, forma / 2), *LIMITES_FORMA_WEIBULL)
+        convergiu = np.abs(nova - forma) <= 1e-8 * forma
+        forma = nova
+        if convergiu.all():
+            break
+
+    s0, _s1, _s2, maximo = somas(forma)
+    log_escala = media_log + (np.log(s0 / n) + maximo) / forma
+    media = np.add.reduceat(valores, inicios) / n
+    return {
+        'n': n.astype(np.int64),
+        'forma': forma,
+        'escala': np.exp(log_escala),
+        'media': media,
+        # No ótimo, Σ (x/η)^k = n
+        'logv_weibull': n * np.log(forma) - n * forma * log_escala + (forma - 1) * n * media_log - n,
+        'logv_exponencial': -n * np.log(media) - n
+    }
+
+def vida_b(forma, escala, fracao=0.10):
+    """Vida B (tempo até `fracao` de falhas acumuladas) da Weibull; B10 por padrão."""
+    return escala * (-np.log1p(-fracao)) ** (1 / forma)
+
+def taxa_falha_weibull(t, forma, escala):
+    """Taxa de falha instantânea h(t) = (k/η)(t/η)^(k-1)."""
+    return (forma / escala) * (t / escala) ** (forma - 1)
+
+def tabela_confiabilidade(tempos, reparos, grupos, n_grupos):
+    """Ajusta tempos entre falhas e de reparo por grupo e monta as colunas da tabela."""
+    ordem = np.argsort(grupos, kind='stable')
+    falhas = ajustar_weibull(tempos[ordem], grupos[ordem], n_grupos)
+
+    valido = reparos > 0
+    ordem_reparo = np.argsort(grupos[valido], kind='stable')
+    grupos_reparo = grupos[valido][ordem_reparo]
+    presentes = np.bincount(grupos_reparo, minlength=n_grupos) > 0
+
+    def espalhar(valores):
+        saida = np.full(n_grupos, np.nan)
+        saida[presentes] = valores
+        return saida
+
+    # Só micro-paradas de duração zero: sem ajuste de reparo, colunas vazias
+    if presentes.sum() == 0:
+        reparo = {'forma': np.array([]), 'escala': np.array([]), 'media': np.array([])}
+    else:
+        _, grupos_reparo = np.unique(grupos_reparo, return_inverse=True)
+        reparo = ajustar_weibull(reparos[valido][ordem_reparo], grupos_reparo, int(presentes.sum()))
+
+    gama = np.array([math.gamma(1 + 1 / k) for k in falhas['forma']])
+    # AIC: a Weibull tem um parâmetro a mais que a exponencial
+    aic_weibull = 4 - 2 * falhas['logv_weibull']
+    aic_exponencial = 2 - 2 * falhas['logv_exponencial']
+    return pd.DataFrame({
+        'Falhas': falhas['n'],
+        'Forma (β)': falhas['forma'],
+        'Escala (η, h)': falhas['escala'],
+        'MTBF Weibull (h)': falhas['escala'] * gama,
+        'MTBF Exponencial (h)': falhas['media'],
+        'B10 (h)': vida_b(falhas['forma'], falhas['escala']),
+        'Modelo Sugerido': np.where(aic_weibull < aic_exponencial, 'Weibull', 'Exponencial'),
+        'Forma Reparo (β)': espalhar(reparo['forma']),
+        'Escala Reparo (η, h)': espalhar(reparo['escala']),
+        'MTTR (h)': espalhar(reparo['media'])
+    })
+
+@cache_monitorado("indicadores")
+def analisar_confiabilidade(df, top_causas=TOP_CAUSAS_CONFIABILIDADE):
+    """Ajustes de Weibull/exponencial dos tempos entre falhas e de reparo.
+
+    Por máquina, o tempo entre falhas é o intervalo entre o fim de uma parada e o início da
+    seguinte; por máquina × causa (causas mais frequentes), o intervalo entre inícios
+    consecutivos da mesma causa. Grupos com menos de MIN_FALHAS_CONFIABILIDADE são omitidos.
+    """
+    vazio = {'por_maquina': pd.DataFrame(), 'por_causa': pd.DataFrame()}
+    if len(df) < 2:
+        return vazio
+
+    codigo_maquina, maquinas = pd.factorize(df['Máquina'], sort=True)
+    inicio = df['Inicio'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    fim = df['Fim'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    reparo = df['Duração'].to_numpy(dtype='timedelta64[ns]').view(np.int64) / 3.6e12
+
+    def por_grupo(chave, referencia):
+        """Tempos entre falhas (h) dentro de cada grupo, ordenados por início; chave -1 é ignorada."""
+        linhas = np.flatnonzero(chave >= 0)
+        ordem = linhas[np.lexsort((inicio[linhas], chave[linhas]))]
+        chave_ordenada = chave[ordem]
+        mesmo_grupo = chave_ordenada[1:] == chave_ordenada[:-1]
+        intervalo = (inicio[ordem][1:] - referencia[ordem][:-1]) / 3.6e12
+        util = mesmo_grupo & (intervalo > 0)
+        # O reparo associado é o da parada que encerra o intervalo
+        return chave_ordenada[1:][util], intervalo[util], reparo[ordem][1:][util]
+
+    def montar(chave, referencia, rotulos):
+        grupos, tempos, reparos = por_grupo(chave, referencia)
+        contagem = np.bincount(grupos, minlength=len(rotulos))
+        manter = contagem[grupos] >= MIN_FALHAS_CONFIABILIDADE
+        if not manter.any():
+            return pd.DataFrame()
+        codigos, grupos = np.unique(grupos[manter], return_inverse=True)
+        tabela = tabela_confiabilidade(tempos[manter], reparos[manter], grupos, len(codigos))
+        return pd.concat([rotulos.iloc[codigos].reset_index(drop=True), tabela], axis=1)
+
+    por_maquina = montar(codigo_maquina, fim, pd.DataFrame({'Máquina': np.asarray(maquinas)}))
+
+    # Máquina × causa, só para as causas mais frequentes
+    codigo_causa, causas = pd.factorize(df['Parada'], sort=True)
+    frequencia = np.bincount(codigo_causa[codigo_causa >= 0], minlength=len(causas))
+    frequentes = np.argsort(-frequencia, kind='stable')[:top_causas]
+    selecionada = np.isin(codigo_causa, frequentes)
+    combinacao = np.full(len(df), -1, dtype=np.int64)
+    combinacao[selecionada], codigos_combinacao = pd.factorize(
+        codigo_maquina[selecionada] * len(causas) + codigo_causa[selecionada], sort=True
+    )
+    codigos_combinacao = np.asarray(codigos_combinacao)
+    rotulos = pd.DataFrame({
+        'Máquina': np.asarray(maquinas)[codigos_combinacao // max(len(causas), 1)],
+        'Parada': np.asarray(causas, dtype=object)[codigos_combinacao % max(len(causas), 1)]
+    })
+    por_causa = montar(combinacao, inicio, rotulos)
+    return {'por_maquina': por_maquina, 'por_causa': por_causa}
+
+# ----- CARTAS DE CONTROLE (EWMA / CUSUM) -----
+# Número de paradas e horas paradas por máquina e dia, monitorados com EWMA e CUSUM superiores
+# (detecção de piora). Os primeiros DIAS_BASE_CONTROLE dias de cada máquina definem a média e o
+# desvio de referência. O estado guarda apenas o necessário para avançar um dia: linhas novas
+# somam-se aos dias em aberto e só os dias completos são fechados, sem recalcular o histórico.
+LAMBDA_EWMA = 0.2
+LARGURA_LIMITE_EWMA = 3.0
+FOLGA_CUSUM = 0.5
+LIMIAR_CUSUM = 5.0
+DIAS_BASE_CONTROLE = 28
+PISO_DESVIO_CONTROLE = np.array([0.5, 0.1])  # paradas/dia, horas/dia
+MEDIDAS_CONTROLE = ('Paradas', 'Horas Paradas')
+NS_POR_DIA = 86_400 * 10 ** 9
+
+def novo_estado_controle():
+    """Estado vazio das cartas de controle (arrays por máquina × medida)."""
+    return {
+        'maquinas': [],
+        'dia_aberto': None,  # primeiro dia ainda não fechado, em dias desde 1970-01-01
+        'pendentes': np.zeros((0, 1, 2)),  # máquina × dia em aberto × medida
+        'ativo_desde': np.zeros(0, dtype=np.int64),
+        'n_base': np.zeros(0, dtype=np.int64),
+        'soma': np.zeros((0, 2)),
+        'soma_quadrados': np.zeros((0, 2)),
+        'media': np.zeros((0, 2)),
+        'desvio': np.ones((0, 2)),
+        'ewma': np.zeros((0, 2)),
+        'cusum': np.zeros((0, 2)),
+        'passos': np.zeros(0, dtype=np.int64),
+        'historico': [],
+        'atrasadas': 0
+    }
+
+def _crescer(array, n_linhas, valor=0):
+    """Acrescenta ao fim do eixo 0 as linhas das máquinas novas, preenchidas com `valor`."""
+    if len(array) >= n_linhas:
+        return array
+    extra = np.full((n_linhas - len(array),) + array.shape[1:], valor, dtype=array.dtype)
+    return np.concatenate([array, extra])
+
+def _fechar_dia(estado, valores, dia):
+    """Avança EWMA e CUSUM de todas as máquinas em um dia fechado; retorna os registros do dia."""
+    ativo = estado['ativo_desde'] <= dia
+    em_base = ativo & (estado['n_base'] < DIAS_BASE_CONTROLE)
+    monitorado = ativo & ~em_base
+
+    if em_base.any():
+        estado['soma'][em_base] += valores[em_base]
+        estado['soma_quadrados'][em_base] += valores[em_base] ** 2
+        estado['n_base'][em_base] += 1
+        calibrado = em_base & (estado['n_base'] == DIAS_BASE_CONTROLE)
+        if calibrado.any():
+            media = estado['soma'][calibrado] / DIAS_BASE_CONTROLE
+            variancia = np.maximum(estado['soma_quadrados'][calibrado] / DIAS_BASE_CONTROLE - media ** 2, 0)
+            estado['media'][calibrado] = media
+            estado['desvio'][calibrado] = np.maximum(np.sqrt(variancia), PISO_DESVIO_CONTROLE)
+            estado['ewma'][calibrado] = media
+            estado['cusum'][calibrado] = 0
+            estado['passos'][calibrado] = 0
+
+    if not monitorado.any():
+        return None
+
+    x = valores[monitorado]
+    media = estado['media'][monitorado]
+    desvio = estado['desvio'][monitorado]
+    ewma = LAMBDA_EWMA * x + (1 - LAMBDA_EWMA) * estado['ewma'][monitorado]
+    passos = estado['passos'][monitorado] + 1
+    fator = np.sqrt(LAMBDA_EWMA / (2 - LAMBDA_EWMA) * (1 - (1 - LAMBDA_EWMA) ** (2 * passos)))
+    limite = media + LARGURA_LIMITE_EWMA * desvio * fator[:, None]
+    cusum = np.maximum(0, estado['cusum'][monitorado] + (x - media) / desvio - FOLGA_CUSUM)
+    alarme_ewma = ewma > limite
+    alarme_cusum = cusum > LIMIAR_CUSUM
+
+    estado['ewma'][monitorado] = ewma
+    estado['passos'][monitorado] = passos
+    # Após o sinal o CUSUM é reiniciado, como na investigação de uma causa especial
+    estado['cusum'][monitorado] = np.where(alarme_cusum, 0, cusum)
+
+    return {
+        'dia': np.full(len(x), dia, dtype=np.int64),
+        'maquina': np.flatnonzero(monitorado),
+        'valor': x,
+        'ewma': ewma,
+        'limite': limite,
+        'cusum': cusum,
+        'alarme_ewma': alarme_ewma,
+        'alarme_cusum': alarme_cusum
+    }
+
+def atualizar_controle(estado, novas):
+    """Incorpora paradas novas ao estado e fecha os dias completos; retorna um novo estado.
+
+    O último dia observado permanece em aberto (pode estar incompleto). Paradas de dias já
+    fechados chegam tarde demais para as cartas e são apenas contadas em 'atrasadas'.
+    """
+    if novas is None or len(novas) == 0:
+        return estado
+
+    # Cópia rasa: o estado anterior continua válido para quem já o referencia
+    estado = {chave: (valor.copy() if isinstance(valor, np.ndarray) else valor) for chave, valor in estado.items()}
+    estado['maquinas'] = list(estado['maquinas'])
+    estado['historico'] = list(estado['historico'])
+
+    dia = novas['Inicio'].to_numpy(dtype='datetime64[ns]').view(np.int64) // NS_POR_DIA
+    horas = novas['Duração'].to_numpy(dtype='timedelta64[ns]').view(np.int64) / 3.6e12
+    codigos, nomes = pd.factorize(novas['Máquina'])
+    posicoes = {nome: i for i, nome in enumerate(estado['maquinas'])}
+    for nome in nomes:
+        if nome not in posicoes:
+            posicoes[nome] = len(estado['maquinas'])
+            estado['maquinas'].append(nome)
+    maquina = np.array([posicoes[nome] for nome in nomes], dtype=np.int64)[codigos]
+    n_maquinas = len(estado['maquinas'])
+
+    if estado['dia_aberto'] is None:
+        estado['dia_aberto'] = int(dia.min())
+    no_prazo = dia >= estado['dia_aberto']
+    estado['atrasadas'] += int((~no_prazo).sum())
+    dia, horas, maquina = dia[no_prazo], horas[no_prazo], maquina[no_prazo]
+
+    # Máquinas novas passam a ser acompanhadas a partir do primeiro dia em que aparecem
+    estado['ativo_desde'] = _crescer(estado['ativo_desde'], n_maquinas, np.iinfo(np.int64).max)
+    if len(dia):
+        primeiro_dia = pd.Series(dia).groupby(maquina).min()
+        indices = primeiro_dia.index.to_numpy()
+        estado['ativo_desde'][indices] = np.minimum(estado['ativo_desde'][indices], primeiro_dia.to_numpy())
+    for chave, valor in [('n_base', 0), ('soma', 0.0), ('soma_quadrados', 0.0), ('media', 0.0),
+                         ('desvio', 1.0), ('ewma', 0.0), ('cusum', 0.0), ('passos', 0)]:
+        estado[chave] = _crescer(estado[chave], n_maquinas, valor)
+
+    # Acumula nos dias em aberto (máquina × dia × medida)
+    n_dias = max(estado['pendentes'].shape[1], int(dia.max()) - estado['dia_aberto'] + 1 if len(dia) else 0)
+    pendentes = np.zeros((n_maquinas, n_dias, 2))
+    pendentes[:estado['pendentes'].shape[0], :estado['pendentes'].shape[1]] = estado['pendentes']
+    posicao = maquina * n_dias + (dia - estado['dia_aberto'])
+    tamanho = n_maquinas * n_dias
+    pendentes[..., 0] += np.bincount(posicao, minlength=tamanho).reshape(n_maquinas, n_dias)
+    pendentes[..., 1] += np.bincount(posicao, weights=horas, minlength=tamanho).reshape(n_maquinas, n_dias)
+
+    # Fecha todos os dias anteriores ao último observado
+    registros = []
+    for j in range(n_dias - 1):
+        registro = _fechar_dia(estado, pendentes[:, j], estado['dia_aberto'] + j)
+        if registro is not None:
+            registros.append(registro)
+    if registros:
+        estado['historico'].append({chave: np.concatenate([r[chave] for r in registros]) for chave in registros[0]})
+
+    estado['pendentes'] = pendentes[:, n_dias - 1:]
+    estado['dia_aberto'] += n_dias - 1
+    return estado
+
+def paradas_atrasadas(estado, novas):
+    """Indica se há paradas novas em dias que o estado das cartas já fechou."""
+    if estado is None or estado['dia_aberto'] is None or len(novas) == 0:
+        return False
+    return bool(novas['Inicio'].min().value // NS_POR_DIA < estado['dia_aberto'])
+
+@cache_monitorado("indicadores")
+def cartas_controle(df):
+    """Calcula as cartas de controle do histórico completo de um dataset fora do armazém."""
+    return atualizar_controle(novo_estado_controle(), df)
+
+def controle_dataset(df):
+    """Retorna o estado das cartas de controle do dataset, guardado no armazém junto ao DataFrame."""
+    armazem = armazem_datasets()
+    with armazem['trava']:
+        entrada = next((e for e in armazem['entradas'].values() if e['df'] is df), None)
+
+    if entrada is None:
+        return cartas_controle(df)
+
+    if entrada.get('controle') is None:
+        controle = atualizar_controle(novo_estado_controle(), df)
+        with armazem['trava']:
+            if entrada.get('controle') is None:
+                entrada['controle'] = controle
+    return entrada['controle']
+
+def historico_controle(estado, maquinas="Todas", inicio=None, fim=None):
+    """DataFrame longo (dia × máquina × medida) das estatísticas de controle, com filtros opcionais."""
+    colunas = ['Dia', 'Máquina', 'Medida', 'Valor', 'EWMA', 'Limite EWMA', 'CUSUM', 'Alarme EWMA', 'Alarme CUSUM']
+    if estado is None or not estado['historico']:
+        return pd.DataFrame(columns=colunas)
+
+    partes = estado['historico']
+    dados = {chave: np.concatenate([parte[chave] for parte in partes]) for chave in partes[0]}
+    n = len(dados['dia'])
+    tabela = pd.DataFrame({
+        'Dia': np.repeat((dados['dia'] * NS_POR_DIA).astype('datetime64[ns]'), 2),
+        'Máquina': np.repeat(np.asarray(estado['maquinas'], dtype=object)[dados['maquina']], 2),
+        'Medida': np.tile(MEDIDAS_CONTROLE, n),
+        'Valor': dados['valor'].ravel(),
+        'EWMA': dados['ewma'].ravel(),
+        'Limite EWMA': dados['limite'].ravel(),
+        'CUSUM': dados['cusum'].ravel(),
+        'Alarme EWMA': dados['alarme_ewma'].ravel(),
+        'Alarme CUSUM': dados['alarme_cusum'].ravel()
+    })
+
+    manter = np.ones(len(tabela), dtype=bool)
+    if maquinas != "Todas":
+        manter &= tabela['Máquina'].isin(list(maquinas)).to_numpy()
+    if inicio is not None:
+        manter &= (tabela['Dia'] >= inicio.normalize()).to_numpy()
+    if fim is not None:
+        manter &= (tabela['Dia'] < fim).to_numpy()
+    return tabela[manter].reset_index(drop=True)
+
+def alarmes_controle(estado, maquinas="Todas", inicio=None, fim=None):
+    """Pontos fora de controle (EWMA acima do limite ou sinal do CUSUM) da seleção."""
+    historico = historico_controle(estado, maquinas, inicio, fim)
+    alarmes = historico[historico['Alarme EWMA'] | historico['Alarme CUSUM']].copy()
+    ewma = alarmes['Alarme EWMA'].to_numpy(dtype=bool)
+    cusum = alarmes['Alarme CUSUM'].to_numpy(dtype=bool)
+    # Sem alarmes o histórico pode vir vazio com colunas object; as máscaras são sempre booleanas
+    alarmes['Sinal'] = np.select([ewma & cusum, ewma], ['EWMA + CUSUM', 'EWMA'], 'CUSUM')
+    return alarmes.drop(columns=['Alarme EWMA', 'Alarme CUSUM']).reset_index(drop=True)
+
+# ----- SEQUÊNCIAS DE PARADAS -----
+# Pares de paradas da mesma máquina em que a segunda começa até `janela` minutos após o fim da
+# primeira. Sobre os arrays ordenados por (Máquina, Inicio), cada defasagem é uma comparação
+# deslocada; como o intervalo cresce com a defasagem, só as paradas que ainda têm par seguem para a
+# próxima, e o laço termina quando nenhuma tem (sem limite de defasagem, mesmo em rajadas longas).
+JANELA_SEQUENCIAS_PADRAO = 30  # minutos
+TOP_CAUSAS_SEQUENCIAS = 15
+LIMITE_PARES_SEQUENCIAS = 5000
+
+@cache_monitorado("indicadores")
+def minerar_sequencias(df, janela_minutos=JANELA_SEQUENCIAS_PADRAO):
+    """Encontra, por máquina, paradas seguidas por outra causa (ou pela mesma) dentro da janela.
+
+    Cada parada conta no máximo uma vez por causa seguinte. Retorna {'pares', 'matrizes',
+    'recorrencias'}: os LIMITE_PARES_SEQUENCIAS pares mais frequentes com probabilidade e lift
+    (frente à chance de qualquer parada da máquina ser seguida pela mesma causa), as matrizes de
+    transições das causas mais frequentes ("Todas" e por máquina) e as recorrências da mesma causa.
+    """
+    vazio = {'pares': pd.DataFrame(), 'matrizes': {}, 'recorrencias': pd.DataFrame()}
+    if len(df) < 2:
+        return vazio
+
+    indice = indice_temporal(df)
+    ordem = indice['ordem']
+    inicio = indice['inicio']
+    fim = df['Fim'].to_numpy(dtype='datetime64[ns]').view(np.int64)[ordem]
+    codigo_maquina, maquinas = pd.factorize(df['Máquina'], sort=True)
+    codigo_causa, causas = pd.factorize(df['Parada'], sort=True)
+    maquina = codigo_maquina[ordem]
+    causa = codigo_causa[ordem]
+    n, n_causas, n_maquinas = len(ordem), len(causas), len(maquinas)
+    if n_causas == 0:
+        return vazio
+    janela = int(janela_minutos * 60 * 10 ** 9)
+
+    anteriores, seguintes, intervalos = [], [], []
+    ativas = np.arange(n - 1)
+    defasagem = 0
+    while len(ativas) > 0:
+        defasagem += 1
+        ativas = ativas[ativas + defasagem < n]
+        intervalo = inicio[ativas + defasagem] - fim[ativas]
+        par = (maquina[ativas + defasagem] == maquina[ativas]) & (intervalo <= janela)
+        ativas, intervalo = ativas[par], intervalo[par]
+
+        validas = (causa[ativas] >= 0) & (causa[ativas + defasagem] >= 0)
+        anteriores.append(ativas[validas])
+        seguintes.append(ativas[validas] + defasagem)
+        intervalos.append(intervalo[validas])
+
+    anterior = np.concatenate(anteriores)
+    seguinte = np.concatenate(seguintes)
+    intervalo = np.concatenate(intervalos)
+    if len(anterior) == 0:
+        return vazio
+
+    # Uma ocorrência por (parada anterior, causa seguinte): fica a mais próxima
+    _, primeiros = np.unique(anterior * n_causas + causa[seguinte], return_index=True)
+    anterior, seguinte, intervalo = anterior[primeiros], seguinte[primeiros], intervalo[primeiros]
+
+    chave = (maquina[anterior] * n_causas + causa[anterior]) * n_causas + causa[seguinte]
+    chaves, grupo, ocorrencias = np.unique(chave, return_inverse=True, return_counts=True)
+    intervalo_medio = np.bincount(grupo, weights=intervalo / 6e10) / ocorrencias
+    m, resto = np.divmod(chaves, n_causas * n_causas)
+    a, b = np.divmod(resto, n_causas)
+
+    valida = causa >= 0
+    paradas_causa = np.bincount(maquina[valida] * n_causas + causa[valida], minlength=n_maquinas * n_causas)
+    paradas_maquina = np.bincount(maquina[valida], minlength=n_maquinas)
+    seguidas_por = np.bincount(m * n_causas + b, weights=ocorrencias, minlength=n_maquinas * n_causas)
+
+    probabilidade = ocorrencias / paradas_causa[m * n_causas + a]
+    lift = probabilidade / (seguidas_por[m * n_causas + b] / paradas_maquina[m])
+    nomes_maquinas = np.asarray(maquinas, dtype=object)
+    nomes_causas = np.asarray(causas, dtype=object)
+
+    def tabela(linhas):
+        """Monta a tabela dos pares selecionados, do mais frequente para o menos frequente."""
+        linhas = linhas[np.lexsort((-lift[linhas], -ocorrencias[linhas]))]
+        return pd.DataFrame({
+            'Máquina': nomes_maquinas[m[linhas]],
+            'Causa Anterior': nomes_causas[a[linhas]],
+            'Causa Seguinte': nomes_causas[b[linhas]],
+            'Ocorrências': ocorrencias[linhas],
+            'Probabilidade (%)': probabilidade[linhas] * 100,
+            'Lift': lift[linhas],
+            'Intervalo Médio (min)': intervalo_medio[linhas]
+        })
+
+    # A tabela de pares guarda só os mais frequentes; a matriz usa todos
+    if len(chaves) > LIMITE_PARES_SEQUENCIAS:
+        mais_frequentes = np.argpartition(-ocorrencias, LIMITE_PARES_SEQUENCIAS)[:LIMITE_PARES_SEQUENCIAS]
+    else:
+        mais_frequentes = np.arange(len(chaves))
+    pares = tabela(mais_frequentes)
+
+    recorrencias = tabela(np.flatnonzero(a == b)).drop(columns=['Causa Seguinte'])
+    recorrencias = recorrencias.rename(columns={'Causa Anterior': 'Parada', 'Ocorrências': 'Recorrências'})
+
+    # Matriz de transições (todas as máquinas) restrita às causas mais frequentes
+    frequentes = np.argsort(-np.bincount(causa[valida], minlength=n_causas), kind='stable')[:TOP_CAUSAS_SEQUENCIAS]
+    posicao = np.full(n_causas, -1)
+    posicao[frequentes] = np.arange(len(frequentes))
+    no_topo = (posicao[a] >= 0) & (posicao[b] >= 0)
+    contagens = np.zeros((n_maquinas, len(frequentes), len(frequentes)), dtype=np.int64)
+    np.add.at(contagens, (m[no_topo], posicao[a][no_topo], posicao[b][no_topo]), ocorrencias[no_topo])
+
+    def matriz(valores):
+        return pd.DataFrame(
+            valores,
+            index=pd.Index(nomes_causas[frequentes], name='Causa Anterior'),
+            columns=pd.Index(nomes_causas[frequentes], name='Causa Seguinte')
+        )
+
+    matrizes = {"Todas": matriz(contagens.sum(axis=0))}
+    matrizes.update({maquina: matriz(contagens[i]) for i, maquina in enumerate(maquinas)})
+    return {'pares': pares, 'matrizes': matrizes, 'recorrencias': recorrencias}
+
+# ----- COMPARATIVO ENTRE PERÍODOS -----
+# Tabela de KPIs por (máquina, mês), calculada uma vez por dataset e calendário de turnos. Os
+# comparativos com o mês anterior e com o mesmo mês do ano anterior são somas e junções sobre
+# ela, sem reexecutar analisar_dados para os outros períodos.
+COMPARACOES_PERIODO = {'Mês Anterior': -1, 'Ano Anterior': -12}
+KPIS_MAIOR_MELHOR = {'Disponibilidade (%)': True, 'Eficiência (%)': True, 'MTBF (h)': True, 'MTTR (h)': False,
+                     'Paradas': False, 'Horas Paradas': False, 'Tempo Médio (min)': False, 'Paradas Críticas (%)': False}
+
+def mes_deslocado(mes, deslocamento):
+    """Retorna o mês 'AAAA-MM' deslocado de `deslocamento` meses."""
+    return (pd.Period(mes, freq='M') + deslocamento).strftime('%Y-%m')
+
+@cache_monitorado("indicadores")
+def calcular_kpis_mensais(df, calendario):
+    """Agrega o dataset por (máquina, mês), (máquina, mês, causa) e (máquina, mês, área).
+
+    O tempo parado dentro dos turnos e o tempo programado de cada mês seguem exatamente o
+    cálculo de analisar_turnos para aquele mês; o laço é por mês, vetorizado dentro de cada um.
+    """
+    inicio_ns = df['Inicio'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    fim_ns = np.maximum(df['Fim'].to_numpy(dtype='datetime64[ns]').view(np.int64), inicio_ns)
+    horas = df['Duração'].dt.total_seconds().to_numpy() / 3600
+
+    codigo_mes, meses = pd.factorize(df['Ano-Mês'], sort=True)
+    ordem = np.argsort(codigo_mes, kind='stable')
+    limites = np.searchsorted(codigo_mes[ordem], np.arange(len(meses) + 1))
+    parado_turno = np.zeros(len(df))
+    programado = {}
+    for i, mes in enumerate(meses):
+        inicio, fim = limites_periodo(mes)
+        instancias = instancias_turnos(calendario, inicio, fim)
+        programado[mes] = instancias['programado'].sum() / 3.6e12
+        linhas = ordem[limites[i]:limites[i + 1]]
+        parada, _, tempo = dividir_paradas_turnos(instancias, inicio_ns[linhas], fim_ns[linhas])
+        parado_turno[linhas] = np.bincount(parada, weights=tempo, minlength=len(linhas)) / 3.6e12
+
+    base = pd.DataFrame({
+        'Máquina': df['Máquina'].to_numpy(),
+        'Ano-Mês': df['Ano-Mês'].to_numpy(),
+        'Paradas': 1,
+        'Horas Paradas': horas,
+        'Horas Paradas em Turno': parado_turno,
+        'Paradas Críticas': (df['Duração'] > pd.Timedelta(hours=1)).to_numpy()
+    })
+    medidas = ['Paradas', 'Horas Paradas']
+
+    def por_categoria(coluna):
+        if coluna not in df.columns:
+            return None
+        return base.assign(**{coluna: df[coluna].to_numpy()}).groupby(['Máquina', 'Ano-Mês', coluna])[medidas].sum()
+
+    return {
+        'maquina': base.groupby(['Máquina', 'Ano-Mês'])[medidas + ['Horas Paradas em Turno', 'Paradas Críticas']].sum(),
+        'causa': por_categoria('Parada'),
+        'area': por_categoria('Área Responsável'),
+        'programado': pd.Series(programado, name='Horas Programadas', dtype=float)
+    }
+
+def kpis_mensais_dataset(df, nome_calendario, calendario):
+    """Retorna a tabela mensal de KPIs do dataset, guardada no armazém por calendário de turnos."""
+    armazem = armazem_datasets()
+    with armazem['trava']:
+        entrada = next((e for e in armazem['entradas'].values() if e['df'] is df), None)
+
+    if entrada is None:
+        return calcular_kpis_mensais(df, calendario)
+
+    tabelas = entrada.get('kpis_mensais') or {}
+    if nome_calendario not in tabelas:
+        tabela = calcular_kpis_mensais.sem_cache(df, calendario)
+        with armazem['trava']:
+            entrada['kpis_mensais'] = {**(entrada.get('kpis_mensais') or {}), nome_calendario: tabela}
+        return tabela
+    return tabelas[nome_calendario]
+
+def _selecionar_maquinas(tabela, maquinas_selecionadas):
+    """Restringe uma tabela indexada por Máquina às máquinas selecionadas."""
+    if maquinas_selecionadas == "Todas":
+        return tabela
+    maquinas = [maquinas_selecionadas] if isinstance(maquinas_selecionadas, str) else list(maquinas_selecionadas)
+    return tabela[tabela.index.get_level_values('Máquina').isin(maquinas)]
+
+def kpis_periodos(kpis, maquinas_selecionadas, meses):
+    """KPIs dos cartões para cada mês de `meses` (linhas); meses fora do dataset ficam vazios."""
+    soma = _selecionar_maquinas(kpis['maquina'], maquinas_selecionadas).groupby(level='Ano-Mês').sum()
+    programado = kpis['programado'].reindex(meses).to_numpy()
+    # Mês presente no dataset mas sem paradas das máquinas selecionadas: tudo zero
+    soma = soma.reindex(meses).fillna(0).where(pd.Series(~np.isnan(programado), index=meses), axis=0)
+
+    paradas = soma['Paradas'].to_numpy()
+    horas = soma['Horas Paradas'].to_numpy()
+    operando = programado - soma['Horas Paradas em Turno'].to_numpy()
+
+    def razao(numerador, denominador, condicao):
+        return np.divide(numerador, denominador, out=np.where(np.isnan(denominador), np.nan, 0.0), where=condicao)
+
+    disponibilidade = np.clip(razao(operando, programado, programado > 0) * 100, 0, 100)
+    return pd.DataFrame({
+        'Disponibilidade (%)': disponibilidade,
+        'Eficiência (%)': disponibilidade,
+        'MTBF (h)': razao(operando, paradas, paradas > 1),
+        'MTTR (h)': razao(horas, paradas, paradas > 0),
+        'Paradas': paradas,
+        'Horas Paradas': horas,
+        'Tempo Médio (min)': razao(horas * 60, paradas, paradas > 0),
+        'Paradas Críticas (%)': razao(soma['Paradas Críticas'].to_numpy() * 100, paradas, paradas > 0)
+    }, index=pd.Index(meses, name='Ano-Mês'))
+
+def variacao_categorias(tabela, nivel, maquinas_selecionadas, meses, rotulos):
+    """Horas paradas e paradas por categoria nos meses comparados, com as diferenças para o atual."""
+    selecao = _selecionar_maquinas(tabela, maquinas_selecionadas)
+    selecao = selecao[selecao.index.get_level_values('Ano-Mês').isin(meses)]
+    por_mes = selecao.groupby(level=[nivel, 'Ano-Mês']).sum().unstack('Ano-Mês').reindex(columns=meses, level=1).fillna(0)
+
+    resultado = pd.DataFrame(index=por_mes.index)
+    for medida in ['Horas Paradas', 'Paradas']:
+        for mes, rotulo in zip(meses, rotulos):
+            resultado[f'{medida} ({rotulo})'] = por_mes[(medida, mes)] if (medida, mes) in por_mes else 0.0
+        for rotulo in rotulos[1:]:
+            resultado[f'Δ {medida} vs {rotulo}'] = resultado[f'{medida} ({rotulos[0]})'] - resultado[f'{medida} ({rotulo})']
+    return resultado.reset_index()
+
+@cache_monitorado("indicadores")
+def comparar_periodos(kpis, maquinas_selecionadas, mes):
+    """Compara o mês com o anterior e com o mesmo mês do ano anterior (cartões, causas e áreas)."""
+    rotulos = ['Atual'] + list(COMPARACOES_PERIODO)
+    meses = [mes] + [mes_deslocado(mes, d) for d in COMPARACOES_PERIODO.values()]
+
+    indicadores = kpis_periodos(kpis, maquinas_selecionadas, meses).T
+    indicadores.columns = rotulos
+    for rotulo in rotulos[1:]:
+        indicadores[f'Δ vs {rotulo}'] = indicadores['Atual'] - indicadores[rotulo]
+
+    comparativo = {
+        'meses': dict(zip(rotulos, meses)),
+        'indicadores': indicadores.rename_axis('Indicador').reset_index(),
+        'causas': pd.DataFrame(),
+        'pioraram': pd.DataFrame(),
+        'melhoraram': pd.DataFrame(),
+        'areas': pd.DataFrame()
+    }
+    if kpis['causa'] is not None:
+        causas = variacao_categorias(kpis['causa'], 'Parada', maquinas_selecionadas, meses, rotulos)
+        delta = 'Δ Horas Paradas vs Mês Anterior'
+        comparativo['causas'] = causas.sort_values('Horas Paradas (Atual)', ascending=False, ignore_index=True)
+        comparativo['pioraram'] = causas[causas[delta] > 0].nlargest(5, delta).reset_index(drop=True)
+        comparativo['melhoraram'] = causas[causas[delta] < 0].nsmallest(5, delta).reset_index(drop=True)
+    if kpis['area'] is not None:
+        comparativo['areas'] = variacao_categorias(kpis['area'], 'Área Responsável', maquinas_selecionadas, meses, rotulos)
+    return comparativo
+
+def html_variacao_kpi(comparativo, indicador, unidade):
+    """Linha HTML com a variação de um cartão frente ao mês anterior e ao ano anterior."""
+    if not comparativo:
+        return ""
+    linha = comparativo['indicadores'].set_index('Indicador').loc[indicador]
+    partes = []
+    for rotulo in COMPARACOES_PERIODO:
+        delta = linha[f'Δ vs {rotulo}']
+        if pd.isna(delta):
+            partes.append(f'<span class="delta-neutro">sem dados vs {rotulo.lower()}</span>')
+            continue
+        if abs(delta) < 0.05:
+            classe, seta = 'delta-neutro', '='
+        else:
+            melhorou = (delta > 0) == KPIS_MAIOR_MELHOR[indicador]
+            classe, seta = ('delta-melhor' if melhorou else 'delta-pior'), ('▲' if delta > 0 else '▼')
+        partes.append(f'<span class="{classe}">{seta} {abs(delta):.1f}{unidade} vs {rotulo.lower()}</span>')
+    return f'<div class="metric-delta">{" · ".join(partes)}</div>'
+
+# ----- MOTOR DE RECOMENDAÇÕES -----
+# Cada regra lista faixas (operador, limite, severidade, mensagem) avaliadas em ordem: vale a
+# primeira que casar. Operador None casa com qualquer valor presente; valores ausentes não geram texto.
+NIVEIS_SEVERIDADE = {3: "Alta", 2: "Média", 1: "Baixa", 0: "OK"}
+OPERADORES_REGRA = {'<': np.less, '<=': np.less_equal, '>': np.greater, '>=': np.greater_equal}
+
+REGRAS_RECOMENDACAO = [
+    {'indicador': 'Disponibilidade (%)', 'faixas': [
+        ('<', 70, 3, "⚠️ A disponibilidade está abaixo do nível recomendado (70%). Priorize a redução do tempo de paradas não programadas."),
+        ('<', 85, 2, "⚠️ A disponibilidade está em nível moderado. Considere implementar melhorias no processo de manutenção preventiva."),
+        (None, None, 0, "✅ A disponibilidade está em um bom nível. Continue monitorando para manter este desempenho.")
+    ]},
+    {'indicador': 'Eficiência (%)', 'faixas': [
+        ('<', 65, 3, "⚠️ A eficiência operacional está baixa. Analise as causas mais frequentes de paradas e implemente ações corretivas."),
+        ('<', 80, 2, "⚠️ A eficiência operacional está em nível moderado. Busque otimizar os processos para reduzir o tempo de paradas."),
+        (None, None, 0, "✅ A eficiência operacional está em um bom nível. Continue com as práticas atuais de manutenção.")
+    ]},
+    {'indicador': 'Paradas Críticas (%)', 'faixas': [
+        ('>', 20, 3, "⚠️ Alta incidência de paradas críticas ({valor:.1f}%). Revise os procedimentos de manutenção corretiva."),
+        ('>', 10, 2, "⚠️ Incidência moderada de paradas críticas ({valor:.1f}%). Implemente um plano de ação para reduzir este índice."),
+        (None, None, 0, "✅ Baixa incidência de paradas críticas ({valor:.1f}%). Continue monitorando para manter este desempenho.")
+    ]},
+    {'indicador': 'Área Principal (%)', 'contexto': {'area': 'Área Principal'}, 'faixas': [
+        ('>', 40, 2, "⚠️ A área de {area} é responsável por {valor:.1f}% das paradas. Priorize ações nesta área.")
+    ]},
+    {'indicador': 'Tendência de Paradas', 'faixas': [
+        ('>', 0, 1, "⚠️ Tendência de aumento no número de paradas. Revise os procedimentos de manutenção preventiva."),
+        ('<', 0, 0, "✅ Tendência de redução no número de paradas. Continue com as melhorias implementadas.")
+    ]}
+]
+
+def avaliar_regras(indicadores, regras=REGRAS_RECOMENDACAO):
+    """Avalia as regras sobre todas as linhas da tabela de indicadores de uma só vez.
+
+    Retorna uma linha por (linha da tabela, regra que casou), na ordem das linhas e das regras,
+    com o índice da tabela como colunas, o valor, a severidade e o texto da recomendação.
+    """
+    partes = []
+    for ordem_regra, regra in enumerate(regras):
+        if regra['indicador'] not in indicadores.columns:
+            continue
+        valores = indicadores[regra['indicador']].to_numpy(dtype=float)
+        presente = ~np.isnan(valores)
+        condicoes = [
+            presente & OPERADORES_REGRA[operador](valores, limite) if operador else presente
+            for operador, limite, _, _ in regra['faixas']
+        ]
+        escolha = np.select(condicoes, np.arange(len(regra['faixas'])), default=-1)
+        linhas = np.flatnonzero(escolha >= 0)
+        if len(linhas) == 0:
+            continue
+
+        faixas = escolha[linhas]
+        contexto = {
+            campo: indicadores[coluna].to_numpy()[linhas] for campo, coluna in regra.get('contexto', {}).items()
+        }
+        textos = [
+            regra['faixas'][faixa][3].format(valor=valores[linha], **{c: v[i] for c, v in contexto.items()})
+            for i, (linha, faixa) in enumerate(zip(linhas, faixas))
+        ]
+        partes.append(pd.DataFrame({
+            '_linha': linhas,
+            '_regra': ordem_regra,
+            'Indicador': regra['indicador'],
+            'Valor': valores[linhas],
+            'Severidade': np.array([f[2] for f in regra['faixas']])[faixas],
+            'Recomendação': textos
+        }))
+
+    colunas_indice = [n for n in indicadores.index.names if n is not None]
+    if not partes:
+        return pd.DataFrame(columns=colunas_indice + ['Indicador', 'Valor', 'Severidade', 'Nível', 'Recomendação'])
+
+    avaliadas = pd.concat(partes, ignore_index=True).sort_values(['_linha', '_regra'], kind='stable')
+    for coluna in reversed(colunas_indice):
+        avaliadas.insert(0, coluna, indicadores.index.get_level_values(coluna).to_numpy()[avaliadas['_linha']])
+    avaliadas.insert(avaliadas.columns.get_loc('Recomendação'), 'Nível', avaliadas['Severidade'].map(NIVEIS_SEVERIDADE))
+    return avaliadas.drop(columns=['_linha', '_regra']).reset_index(drop=True)
+
+def indicadores_maquina_mes(kpis):
+    """Indicadores das regras com uma linha por (máquina, mês), a partir da tabela mensal de KPIs.
+
+    Sem apontamentos de produção a eficiência é igual à disponibilidade, por isso fica de fora.
+    A tendência compara as paradas do mês com as de dois meses antes (janela de três meses).
+    """
+    maquina = kpis['maquina']
+    programado = kpis['programado'].reindex(maquina.index.get_level_values('Ano-Mês')).to_numpy()
+    paradas = maquina['Paradas'].to_numpy(dtype=float)
+    operando = programado - maquina['Horas Paradas em Turno'].to_numpy()
+
+    tabela = pd.DataFrame({
+        'Disponibilidade (%)': np.clip(
+            np.divide(operando, programado, out=np.zeros(len(maquina)), where=programado > 0) * 100, 0, 100
+        ),
+        'Paradas Críticas (%)': maquina['Paradas Críticas'].to_numpy() * 100 / paradas,
+        'Paradas': paradas
+    }, index=maquina.index)
+
+    if kpis['area'] is not None:
+        # Área com mais paradas em cada (máquina, mês) e sua participação no total
+        por_area = kpis['area']['Paradas']
+        total = por_area.groupby(level=['Máquina', 'Ano-Mês']).sum()
+        maiores = por_area.sort_values(ascending=False, kind='stable')
+        maiores = maiores[~maiores.index.droplevel('Área Responsável').duplicated()]
+        chaves = maiores.index.droplevel('Área Responsável')
+        tabela['Área Principal'] = pd.Series(maiores.index.get_level_values('Área Responsável'), index=chaves).reindex(tabela.index)
+        tabela['Área Principal (%)'] = (pd.Series(maiores.to_numpy(), index=chaves) / total * 100).reindex(tabela.index)
+
+    grade = maquina['Paradas'].unstack('Ano-Mês', fill_value=0)
+    anteriores = grade.reindex(columns=[mes_deslocado(mes, -2) for mes in grade.columns])
+    anteriores.columns = grade.columns
+    tabela['Tendência de Paradas'] = (grade - anteriores).stack().reindex(tabela.index)
+    return tabela
+
+@cache_monitorado("indicadores")
+def recomendacoes_por_maquina(kpis, maquinas_selecionadas, severidade_minima=1):
+    """Recomendações de todas as máquinas e meses numa só avaliação, da mais severa e recente para a mais branda."""
+    indicadores = _selecionar_maquinas(indicadores_maquina_mes(kpis), maquinas_selecionadas)
+    avaliadas = avaliar_regras(indicadores)
+    avaliadas = avaliadas[avaliadas['Severidade'] >= severidade_minima]
+    return avaliadas.sort_values(['Severidade', 'Ano-Mês'], ascending=False, kind='stable', ignore_index=True)
+
+# ----- FUNÇÕES DE VISUALIZAÇÃO -----
+@cache_monitorado("graficos")
+def criar_grafico_pareto(pareto):
+    """Cria um gráfico de Pareto com Plotly."""
+    if pareto.empty:
+        return None
+    
+    # Converte durações para horas
+    pareto_horas = pareto.apply(lambda x: x.total_seconds() / 3600)
+    
+    fig = px.bar(
+        x=pareto_horas.index,
+        y=pareto_horas.values,
+        labels={'x': 'Causa de Parada', 'y': 'Duração Total (horas)'},
+        title="Pareto de Causas de Paradas (Top 10 por Duração)",
+        color_discrete_sequence=['#3498db'],
+        text=pareto_horas.values.round(1)
+    )
+    
+    fig.update_traces(
+        texttemplate='%{text}h', 
+        textposition='outside'
+    )
+    
+    fig.update_layout(
+        xaxis_tickangle=-45,
+        autosize=True,
+        margin=dict(l=50, r=50, t=80, b=100),
+        plot_bgcolor='rgba(0,0,0,0)',
+        yaxis_title="Duração Total (horas)",
+        xaxis_title="Causa de Parada",
+        hoverlabel=dict(
+            bgcolor="white",
+            font_size=12,
+            font_family="Arial"
+        ),
+        title={
+            'y':0.95,
+            'x':0.5,
+            'xanchor': 'center',
+            'yanchor': 'top'
+        }
+    )
+    
+    return fig
+
+@cache_monitorado("graficos")
+def criar_grafico_pizza_areas(indice_paradas):
+    """Cria um gráfico de pizza para áreas responsáveis com Plotly."""
+    if indice_paradas.empty:
         return None
     
     fig = px.pie(
@@ -390,9 +2751,27 @@ def criar_grafico_pizza_areas(indice_paradas):
     
     return fig
 
-@st.cache_data
-def criar_grafico_ocorrencias(ocorrencias):
-    """Cria um gráfico de linha para ocorrências mensais com Plotly."""
+def adicionar_previsao(fig, previsao, medida, ultimo_mes, ultimo_valor, cor):
+    """Acrescenta a linha prevista (tracejada) e a faixa de confiança a um gráfico mensal."""
+    meses = [ultimo_mes] + list(previsao.index)
+    prevista = [ultimo_valor] + list(previsao[f'{medida} Previstas'])
+    inferior = [ultimo_valor] + list(previsao[f'{medida} (mín.)'])
+    superior = [ultimo_valor] + list(previsao[f'{medida} (máx.)'])
+
+    fig.add_trace(go.Scatter(x=meses, y=superior, mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
+    fig.add_trace(go.Scatter(
+        x=meses, y=inferior, mode='lines', line=dict(width=0), fill='tonexty',
+        fillcolor=f'rgba({cor}, 0.15)', name=f'Faixa de {NIVEL_CONFIANCA_PREVISAO:.0%}', hoverinfo='skip'
+    ))
+    fig.add_trace(go.Scatter(
+        x=meses, y=prevista, mode='lines+markers', name='Previsão',
+        line=dict(color=f'rgb({cor})', dash='dash')
+    ))
+    return fig
+
+@cache_monitorado("graficos")
+def criar_grafico_ocorrencias(ocorrencias, previsao=None):
+    """Cria um gráfico de linha para ocorrências mensais com Plotly (e a previsão, se houver)."""
     if ocorrencias.empty or len(ocorrencias) <= 1:
         return None
     
@@ -428,6 +2807,9 @@ def criar_grafico_ocorrencias(ocorrencias):
             font=dict(color="#2c3e50")
         )
     
+    if previsao is not None:
+        adicionar_previsao(fig, previsao['total'], 'Paradas', ocorrencias.index[-1], ocorrencias.iloc[-1], '46, 204, 113')
+    
     fig.update_layout(
         xaxis_tickangle=-45,
         autosize=True,
@@ -446,9 +2828,9 @@ def criar_grafico_ocorrencias(ocorrencias):
     
     return fig
 
-@st.cache_data
-def criar_grafico_duracao_mensal(duracao_mensal):
-    """Cria um gráfico de linha para duração total de paradas por mês."""
+@cache_monitorado("graficos")
+def criar_grafico_duracao_mensal(duracao_mensal, previsao=None):
+    """Cria um gráfico de linha para duração total de paradas por mês (e a previsão, se houver)."""
     if duracao_mensal.empty or len(duracao_mensal) <= 1:
         return None
     
@@ -487,6 +2869,9 @@ def criar_grafico_duracao_mensal(duracao_mensal):
             font=dict(color="#2c3e50")
         )
     
+    if previsao is not None:
+        adicionar_previsao(fig, previsao['total'], 'Horas', duracao_horas.index[-1], duracao_horas.iloc[-1], '231, 76, 60')
+    
     fig.update_layout(
         xaxis_tickangle=-45,
         autosize=True,
@@ -505,7 +2890,7 @@ def criar_grafico_duracao_mensal(duracao_mensal):
     
     return fig
 
-@st.cache_data
+@cache_monitorado("graficos")
 def criar_grafico_tempo_area(tempo_area):
     """Cria um gráfico de barras horizontais para tempo por área com Plotly."""
     if tempo_area.empty:
@@ -548,7 +2933,7 @@ def criar_grafico_tempo_area(tempo_area):
     
     return fig
 
-@st.cache_data
+@cache_monitorado("graficos")
 def criar_grafico_paradas_criticas(top_criticas):
     """Cria um gráfico de barras horizontais para paradas críticas com Plotly."""
     if top_criticas.empty:
@@ -591,7 +2976,7 @@ def criar_grafico_paradas_criticas(top_criticas):
     
     return fig
 
-@st.cache_data
+@cache_monitorado("graficos")
 def criar_grafico_pizza_areas_criticas(paradas_criticas):
     """Cria um gráfico de pizza para áreas responsáveis por paradas críticas."""
     if 'Área Responsável' not in paradas_criticas.columns or paradas_criticas.empty:
@@ -633,131 +3018,1347 @@ def criar_grafico_pizza_areas_criticas(paradas_criticas):
     
     return fig
 
-@st.cache_data
-def criar_grafico_distribuicao_duracao(df):
-    """Cria um histograma da distribuição de duração das paradas."""
-    if df.empty:
-        return None
-    
-    # Converte durações para minutos para melhor visualização
-    duracoes_minutos = df['Duração'].apply(lambda x: x.total_seconds() / 60)
-    
-    fig = px.histogram(
-        x=duracoes_minutos,
-        nbins=20,
-        labels={'x': 'Duração (minutos)', 'y': 'Frequência'},
-        title="Distribuição da Duração das Paradas",
-        color_discrete_sequence=['#1abc9c']
-    )
-    
-    fig.update_layout(
-        autosize=True,
-        margin=dict(l=50, r=50, t=80, b=50),
-        plot_bgcolor='rgba(0,0,0,0)',
-        xaxis_title="Duração (minutos)",
-        yaxis_title="Frequência",
-        bargap=0.1,
-        title={
-            'y':0.95,
-            'x':0.5,
-            'xanchor': 'center',
-            'yanchor': 'top'
-        }
-    )
-    
-    return fig
+@cache_monitorado("graficos")
+def criar_grafico_distribuicao_duracao(df):
+    """Cria um histograma da distribuição de duração das paradas."""
+    if df.empty:
+        return None
+    
+    # Converte durações para minutos para melhor visualização
+    duracoes_minutos = df['Duração'].apply(lambda x: x.total_seconds() / 60)
+    
+    fig = px.histogram(
+        x=duracoes_minutos,
+        nbins=20,
+        labels={'x': 'Duração (minutos)', 'y': 'Frequência'},
+        title="Distribuição da Duração das Paradas",
+        color_discrete_sequence=['#1abc9c']
+    )
+    
+    fig.update_layout(
+        autosize=True,
+        margin=dict(l=50, r=50, t=80, b=50),
+        plot_bgcolor='rgba(0,0,0,0)',
+        xaxis_title="Duração (minutos)",
+        yaxis_title="Frequência",
+        bargap=0.1,
+        title={
+            'y':0.95,
+            'x':0.5,
+            'xanchor': 'center',
+            'yanchor': 'top'
+        }
+    )
+    
+    return fig
+
+@cache_monitorado("graficos")
+def criar_grafico_disponibilidade_turnos(tabela, rotulo):
+    """Cria um gráfico de barras com a disponibilidade e o número de paradas por turno ou equipe."""
+    if tabela.empty or tabela['Horas Programadas'].sum() == 0:
+        return None
+    
+    fig = px.bar(
+        tabela,
+        x=rotulo,
+        y='Disponibilidade (%)',
+        title=f"Disponibilidade por {rotulo}",
+        color_discrete_sequence=['#3498db'],
+        text=tabela['Disponibilidade (%)'].round(1),
+        hover_data=['Paradas', 'Horas Paradas', 'Horas Programadas']
+    )
+    
+    fig.update_traces(
+        texttemplate='%{text}%',
+        textposition='outside'
+    )
+    
+    fig.update_layout(
+        autosize=True,
+        margin=dict(l=50, r=50, t=80, b=50),
+        plot_bgcolor='rgba(0,0,0,0)',
+        yaxis_range=[0, 105],
+        xaxis_title=rotulo,
+        yaxis_title="Disponibilidade (%)"
+    )
+    
+    return fig
+
+@cache_monitorado("graficos")
+def criar_grafico_taxa_falha(tabela, limite_curvas=8):
+    """Cria o gráfico das curvas de taxa de falha h(t) dos grupos com mais falhas."""
+    if tabela.empty:
+        return None
+    
+    tabela = tabela.nlargest(limite_curvas, 'Falhas')
+    rotulos = tabela['Máquina'].astype(str)
+    if 'Parada' in tabela.columns:
+        rotulos = rotulos + " • " + tabela['Parada'].astype(str)
+    
+    # Horizonte comum: duas vezes a maior escala entre as curvas exibidas
+    t = np.linspace(0, 2 * tabela['Escala (η, h)'].max(), 201)[1:]
+    fig = go.Figure()
+    for rotulo, forma, escala in zip(rotulos, tabela['Forma (β)'], tabela['Escala (η, h)']):
+        fig.add_trace(go.Scatter(x=t, y=taxa_falha_weibull(t, forma, escala), mode='lines', name=rotulo))
+    
+    fig.update_layout(
+        title="Taxa de Falha h(t) - Weibull",
+        autosize=True,
+        margin=dict(l=50, r=50, t=80, b=50),
+        plot_bgcolor='rgba(0,0,0,0)',
+        xaxis_title="Tempo desde a última falha (horas)",
+        yaxis_title="Falhas por hora",
+        hovermode="x unified"
+    )
+    
+    return fig
+
+@cache_monitorado("graficos")
+def criar_grafico_resumo_maquinas(resumo_maquina):
+    """Cria o gráfico de barras da duração total de paradas por máquina."""
+    fig = px.bar(
+        resumo_maquina.reset_index(),
+        x='Máquina',
+        y='Duração Total (horas)',
+        color='Máquina',
+        title="Duração Total de Paradas por Máquina",
+        labels={'Duração Total (horas)': 'Duração Total (horas)', 'Máquina': 'Máquina'},
+        text='Duração Total (horas)'
+    )
+    
+    fig.update_traces(
+        texttemplate='%{text:.1f}h', 
+        textposition='outside'
+    )
+    
+    fig.update_layout(
+        xaxis_tickangle=0,
+        autosize=True,
+        margin=dict(l=50, r=50, t=80, b=50),
+        plot_bgcolor='rgba(0,0,0,0)',
+        showlegend=False
+    )
+    return fig
+
+@cache_monitorado("graficos")
+def criar_grafico_dias_semana(paradas_por_dia):
+    """Cria o gráfico de barras do número de paradas por dia da semana."""
+    fig = px.bar(
+        paradas_por_dia.reset_index(),
+        x='Dia da Semana PT',
+        y='Número de Paradas',
+        title="Distribuição de Paradas por Dia da Semana",
+        labels={'Número de Paradas': 'Número de Paradas', 'Dia da Semana PT': 'Dia da Semana'},
+        text='Número de Paradas',
+        color='Dia da Semana PT',
+        color_discrete_sequence=px.colors.qualitative.Pastel
+    )
+    
+    fig.update_traces(
+        texttemplate='%{text}', 
+        textposition='outside'
+    )
+    
+    fig.update_layout(
+        xaxis_tickangle=0,
+        autosize=True,
+        margin=dict(l=50, r=50, t=80, b=50),
+        plot_bgcolor='rgba(0,0,0,0)',
+        showlegend=False
+    )
+    return fig
+
+@cache_monitorado("graficos")
+def criar_grafico_horas_dia(paradas_por_hora):
+    """Cria o gráfico de linha (com área) do número de paradas por hora do dia."""
+    fig = px.line(
+        paradas_por_hora.reset_index(),
+        x='Hora do Dia',
+        y='Número de Paradas',
+        title="Distribuição de Paradas por Hora do Dia",
+        labels={'Número de Paradas': 'Número de Paradas', 'Hora do Dia': 'Hora do Dia'},
+        markers=True
+    )
+    
+    # Adiciona área sob a linha
+    fig.add_trace(
+        go.Scatter(
+            x=paradas_por_hora.reset_index()['Hora do Dia'],
+            y=paradas_por_hora['Número de Paradas'],
+            fill='tozeroy',
+            fillcolor='rgba(52, 152, 219, 0.2)',
+            line=dict(color='rgba(52, 152, 219, 0)'),
+            showlegend=False
+        )
+    )
+    
+    fig.update_layout(
+        xaxis=dict(
+            tickmode='array',
+            tickvals=list(range(0, 24)),
+            ticktext=[f"{h}:00" for h in range(0, 24)]
+        ),
+        autosize=True,
+        margin=dict(l=50, r=50, t=80, b=50),
+        plot_bgcolor='rgba(0,0,0,0)',
+        showlegend=False
+    )
+    return fig
+
+# ----- CONSTRUÇÃO PARALELA DE GRÁFICOS -----
+THREADS_GRAFICOS = int(os.environ.get("ATD_THREADS_GRAFICOS", min(8, os.cpu_count() or 1)))
+
+@st.cache_resource(show_spinner=False)
+def pool_graficos():
+    """Pool de threads compartilhado entre as sessões para construir os gráficos das páginas."""
+    return ThreadPoolExecutor(max_workers=max(1, THREADS_GRAFICOS), thread_name_prefix="atd-graficos")
+
+def construir_graficos(tarefas):
+    """Inicia a construção dos gráficos independentes de uma página, em paralelo.
+
+    `tarefas` mapeia o nome de cada gráfico para (função, argumentos...), na ordem do layout; o
+    retorno mapeia os mesmos nomes para futuros. A página chama `result()` ao desenhar cada
+    gráfico, então só espera o que ainda não ficou pronto enquanto desenha o restante.
+    """
+    ctx = get_script_run_ctx()
+    # A instrumentação é local à thread: captura a da execução atual para os workers
+    registros = getattr(_instrumentacao, 'registros', None)
+    gatilho = getattr(_instrumentacao, 'gatilho', None)
+
+    def executar(funcao, *args):
+        # As funções de gráfico usam o cache do Streamlit, que depende do contexto da sessão
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        if registros is None:
+            return funcao(*args)
+
+        # As funções de gráfico são decoradas (cache_monitorado/instrumentar) e se medem no worker;
+        # as medições são entregues à execução que pediu os gráficos
+        iniciar_instrumentacao(gatilho)
+        _instrumentacao.paralelo = True
+        try:
+            return funcao(*args)
+        finally:
+            medicoes = finalizar_instrumentacao()
+            _instrumentacao.paralelo = False
+            with _trava_registros:
+                registros.extend(medicoes)
+
+    pool = pool_graficos()
+    return {nome: pool.submit(executar, *tarefa) for nome, tarefa in tarefas.items()}
+
+# ----- FUNÇÕES DE TENDÊNCIA DETALHADA (LTTB) -----
+GRANULARIDADES_TENDENCIA = {"Diária": "D", "Horária": "h"}
+
+def lttb_indices(x, y, n_pontos):
+    """Seleciona os índices de n_pontos de uma série com Largest-Triangle-Three-Buckets."""
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+
+    # Série já cabe no gráfico: devolve todos os pontos
+    if n_pontos >= n or n_pontos < 3:
+        return np.arange(n)
+
+    # Limites dos baldes intermediários (o primeiro e o último ponto são fixos)
+    limites = (np.arange(n_pontos - 1) * ((n - 2) / (n_pontos - 2))).astype(np.int64) + 1
+    limites[-1] = n - 1
+
+    indices = np.empty(n_pontos, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    a = 0
+
+    for i in range(n_pontos - 2):
+        inicio, fim = limites[i], limites[i + 1]
+
+        # Média do próximo balde (ou o último ponto, no último balde)
+        if i + 2 < len(limites):
+            prox_inicio, prox_fim = limites[i + 1], limites[i + 2]
+            media_x = x[prox_inicio:prox_fim].mean()
+            media_y = y[prox_inicio:prox_fim].mean()
+        else:
+            media_x, media_y = x[-1], y[-1]
+
+        # Área do triângulo formado pelo ponto anterior, o candidato e a média do próximo balde
+        areas = np.abs(
+            (x[a] - media_x) * (y[inicio:fim] - y[a]) -
+            (x[a] - x[inicio:fim]) * (media_y - y[a])
+        )
+        a = inicio + int(areas.argmax())
+        indices[i + 1] = a
+
+    return indices
+
+@cache_monitorado("indicadores")
+def serie_tendencia_detalhada(df, freq):
+    """Agrega o número de paradas e a duração (horas) em intervalos diários ou horários."""
+    if df.empty:
+        return pd.DataFrame(columns=['Número de Paradas', 'Duração (horas)'])
+
+    serie = df.resample(freq, on='Inicio')['Duração'].agg(['count', 'sum'])
+    serie.columns = ['Número de Paradas', 'Duração (horas)']
+    serie['Duração (horas)'] = serie['Duração (horas)'].dt.total_seconds() / 3600
+    return serie
+
+@instrumentar("indicadores")
+def reduzir_serie_tendencia(serie, janela, n_pontos):
+    """Recorta a série na janela visível e reduz cada métrica com LTTB para n_pontos."""
+    # O índice de resample é ordenado, então o recorte é feito por busca binária
+    inicio = serie.index.searchsorted(pd.Timestamp(janela[0]), side='left')
+    fim = serie.index.searchsorted(pd.Timestamp(janela[1]), side='right')
+    recorte = serie.iloc[inicio:fim]
+
+    x = recorte.index.asi8
+    reduzidas = {}
+    for coluna in recorte.columns:
+        idx = lttb_indices(x, recorte[coluna].to_numpy(), n_pontos)
+        reduzidas[coluna] = recorte[coluna].iloc[idx]
+
+    return reduzidas, len(recorte)
+
+@instrumentar("graficos")
+def criar_grafico_tendencia_detalhada(reduzidas, granularidade, alarmes=None):
+    """Cria um gráfico de linhas com a tendência detalhada de paradas e duração.
+
+    Os dias com `alarmes` das cartas de controle são marcados sobre a linha de paradas.
+    """
+    contagem = reduzidas['Número de Paradas']
+    horas = reduzidas['Duração (horas)']
+    if contagem.empty:
+        return None
+
+    fig = go.Figure()
+
+    fig.add_trace(
+        go.Scatter(
+            x=contagem.index,
+            y=contagem.values,
+            mode='lines',
+            name='Número de Paradas',
+            line=dict(color='#2ecc71', width=1.5)
+        )
+    )
+
+    fig.add_trace(
+        go.Scatter(
+            x=horas.index,
+            y=horas.values,
+            mode='lines',
+            name='Duração Total (horas)',
+            line=dict(color='#e74c3c', width=1.5),
+            yaxis='y2'
+        )
+    )
+
+    if alarmes is not None and not alarmes.empty:
+        dias = alarmes.groupby('Dia')['Máquina'].agg(lambda m: ", ".join(sorted(set(m))))
+        dias = dias[(dias.index >= contagem.index.min().normalize()) & (dias.index <= contagem.index.max())]
+        if not dias.empty:
+            # Posiciona cada marcador no ponto exibido mais próximo do dia do alarme
+            posicao = np.clip(contagem.index.searchsorted(dias.index), 0, len(contagem) - 1)
+            fig.add_trace(
+                go.Scatter(
+                    x=dias.index,
+                    y=contagem.values[posicao],
+                    mode='markers',
+                    name='Fora de controle',
+                    marker=dict(color='#c0392b', size=9, symbol='x'),
+                    text=dias.values,
+                    hovertemplate="%{x|%d/%m/%Y}: %{text}<extra>Fora de controle</extra>"
+                )
+            )
+
+    fig.update_layout(
+        title={
+            'text': f"Tendência {granularidade} de Paradas",
+            'y':0.95,
+            'x':0.5,
+            'xanchor': 'center',
+            'yanchor': 'top'
+        },
+        autosize=True,
+        margin=dict(l=50, r=50, t=80, b=50),
+        plot_bgcolor='rgba(0,0,0,0)',
+        xaxis_title="Período",
+        yaxis=dict(title="Número de Paradas"),
+        yaxis2=dict(title="Duração Total (horas)", overlaying='y', side='right'),
+        hovermode="x unified",
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=-0.3,
+            xanchor="center",
+            x=0.5
+        )
+    )
+
+    return fig
+
+@cache_monitorado("graficos")
+def criar_grafico_controle(serie, maquina, medida):
+    """Cria a carta de controle EWMA (com o CUSUM no eixo secundário) de uma máquina e medida."""
+    if serie.empty:
+        return None
+    
+    alarmes = serie[serie['Alarme EWMA'] | serie['Alarme CUSUM']]
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=serie['Dia'], y=serie['Valor'], mode='lines+markers', name=medida,
+        line=dict(color='rgba(127, 140, 141, 0.6)', width=1), marker=dict(size=4)
+    ))
+    fig.add_trace(go.Scatter(x=serie['Dia'], y=serie['EWMA'], mode='lines', name='EWMA', line=dict(color='#3498db', width=2)))
+    fig.add_trace(go.Scatter(
+        x=serie['Dia'], y=serie['Limite EWMA'], mode='lines', name='Limite superior',
+        line=dict(color='#e74c3c', dash='dash')
+    ))
+    fig.add_trace(go.Scatter(
+        x=serie['Dia'], y=serie['CUSUM'], mode='lines', name='CUSUM', yaxis='y2',
+        line=dict(color='rgba(142, 68, 173, 0.5)', dash='dot')
+    ))
+    fig.add_trace(go.Scatter(
+        x=alarmes['Dia'], y=alarmes['Valor'], mode='markers', name='Fora de controle',
+        marker=dict(color='#c0392b', size=10, symbol='x')
+    ))
+    
+    fig.update_layout(
+        title=f"Carta de Controle - {maquina} ({medida} por dia)",
+        autosize=True,
+        margin=dict(l=50, r=50, t=80, b=50),
+        plot_bgcolor='rgba(0,0,0,0)',
+        xaxis_title="Dia",
+        yaxis=dict(title=medida),
+        yaxis2=dict(title=f"CUSUM (sinal > {LIMIAR_CUSUM:g})", overlaying='y', side='right', showgrid=False),
+        hovermode="x unified",
+        legend=dict(orientation="h", yanchor="bottom", y=-0.3, xanchor="center", x=0.5)
+    )
+    
+    return fig
+
+@cache_monitorado("graficos")
+def criar_grafico_matriz_transicoes(matriz, maquina):
+    """Cria um mapa de calor com as contagens de transição entre causas de parada."""
+    if matriz.empty or matriz.to_numpy().sum() == 0:
+        return None
+    
+    fig = px.imshow(
+        matriz,
+        text_auto=True,
+        aspect='auto',
+        color_continuous_scale='Reds',
+        labels={'x': 'Causa Seguinte', 'y': 'Causa Anterior', 'color': 'Ocorrências'},
+        title=f"Transições entre Causas de Parada - {maquina}"
+    )
+    
+    fig.update_layout(
+        autosize=True,
+        margin=dict(l=50, r=50, t=80, b=100),
+        xaxis_tickangle=-45
+    )
+    
+    return fig
+
+# ----- FUNÇÕES DA LINHA DO TEMPO DE PARADAS -----
+LIMITE_EVENTOS_LINHA_TEMPO = 5000  # Acima disso, a janela é exibida agregada em baldes
+N_BALDES_LINHA_TEMPO = 300
+
+@cache_monitorado("indicadores")
+def indice_linha_tempo(df):
+    """Pré-calcula, por máquina, os arrays de paradas ordenados por Inicio."""
+    indice = {}
+
+    for maquina, grupo in df.groupby('Máquina'):
+        grupo = grupo.sort_values('Inicio')
+        inicio = grupo['Inicio'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        fim = grupo['Fim'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+        fim = np.maximum(fim, inicio)  # Protege contra registros com Fim anterior ao Inicio
+
+        indice[maquina] = {
+            'inicio': inicio,
+            'fim': fim,
+            'parada': grupo['Parada'].astype(str).to_numpy() if 'Parada' in grupo.columns else np.full(len(grupo), ''),
+            'duracao_maxima': int((fim - inicio).max()) if len(grupo) > 0 else 0
+        }
+
+    return indice
+
+def eventos_na_janela(indice_maquina, inicio_ns, fim_ns):
+    """Retorna as posições das paradas que intersectam a janela, por busca binária em Inicio."""
+    inicio = indice_maquina['inicio']
+
+    # Paradas iniciadas antes da janela só podem intersectá-la se durarem mais que a diferença
+    esquerda = np.searchsorted(inicio, inicio_ns - indice_maquina['duracao_maxima'], side='left')
+    direita = np.searchsorted(inicio, fim_ns, side='right')
+
+    posicoes = np.arange(esquerda, direita)
+    return posicoes[indice_maquina['fim'][esquerda:direita] >= inicio_ns]
+
+def agregar_linha_tempo(indice_maquina, inicio_ns, fim_ns, n_baldes):
+    """Agrega as paradas da janela em baldes de tempo (contagem e horas paradas).
+
+    Usa as mesmas paradas de eventos_na_janela, recortadas à janela: cada uma conta no balde em
+    que começa (dentro da janela) e suas horas são distribuídas pelos baldes que ela cobre.
+    """
+    posicoes = eventos_na_janela(indice_maquina, inicio_ns, fim_ns)
+    inicio = np.maximum(indice_maquina['inicio'][posicoes], inicio_ns)
+    fim = np.minimum(indice_maquina['fim'][posicoes], fim_ns)
+
+    largura = max(1, (fim_ns - inicio_ns) // n_baldes)
+    balde_inicio = np.minimum((inicio - inicio_ns) // largura, n_baldes - 1)
+    balde_fim = np.minimum((fim - inicio_ns) // largura, n_baldes - 1)
+    varios = balde_inicio != balde_fim
+
+    # Trechos parciais no primeiro e no último balde; os baldes intermediários ficam inteiros
+    parcial_inicio = np.where(varios, inicio_ns + largura * (balde_inicio + 1), fim) - inicio
+    parcial_fim = np.where(varios, fim - (inicio_ns + largura * balde_fim), 0)
+    inteiros = np.cumsum(
+        np.bincount(balde_inicio + 1, weights=varios, minlength=n_baldes + 1)
+        - np.bincount(balde_fim, weights=varios, minlength=n_baldes + 1)
+    )[:n_baldes]
+
+    contagem = np.bincount(balde_inicio, minlength=n_baldes)
+    horas = (
+        np.bincount(balde_inicio, weights=parcial_inicio, minlength=n_baldes)
+        + np.bincount(balde_fim, weights=parcial_fim, minlength=n_baldes)
+        + inteiros * largura
+    ) / 3.6e12
+    centros = inicio_ns + largura * np.arange(n_baldes) + largura // 2
+
+    return centros, contagem, horas
+
+@instrumentar("graficos")
+def criar_grafico_linha_tempo(indice, janela, limite_eventos=LIMITE_EVENTOS_LINHA_TEMPO, n_baldes=N_BALDES_LINHA_TEMPO):
+    """Cria a linha do tempo (Gantt) de paradas por máquina com traços WebGL."""
+    if not indice:
+        return None, False
+
+    inicio_ns = pd.Timestamp(janela[0]).value
+    fim_ns = pd.Timestamp(janela[1]).value
+
+    posicoes = {maquina: eventos_na_janela(dados, inicio_ns, fim_ns) for maquina, dados in indice.items()}
+    total_eventos = sum(len(p) for p in posicoes.values())
+    agregado = total_eventos > limite_eventos
+
+    fig = go.Figure()
+
+    for maquina, dados in indice.items():
+        if agregado:
+            # Visão afastada: um marcador por balde, com tamanho pela contagem e cor pelas horas paradas
+            centros, contagem, horas = agregar_linha_tempo(dados, inicio_ns, fim_ns, n_baldes)
+            com_paradas = contagem > 0
+            fig.add_trace(
+                go.Scattergl(
+                    x=pd.to_datetime(centros[com_paradas]),
+                    y=np.full(com_paradas.sum(), maquina),
+                    mode='markers',
+                    name=maquina,
+                    marker=dict(
+                        symbol='square',
+                        size=np.clip(4 + np.sqrt(contagem[com_paradas]) * 2, 4, 18),
+                        color=horas[com_paradas],
+                        colorscale='Reds',
+                        cmin=0,
+                        showscale=False
+                    ),
+                    customdata=np.column_stack([contagem[com_paradas], horas[com_paradas]]),
+                    hovertemplate="%{y}<br>%{x}<br>%{customdata[0]} paradas<br>%{customdata[1]:.1f}h paradas<extra></extra>",
+                    showlegend=False
+                )
+            )
+        else:
+            # Visão aproximada: cada parada é um segmento Inicio→Fim separado por lacunas
+            pos = posicoes[maquina]
+            if len(pos) == 0:
+                continue
+            n = len(pos)
+            x = np.empty(n * 3, dtype='datetime64[ns]')
+            x[0::3] = dados['inicio'][pos].astype('datetime64[ns]')
+            x[1::3] = dados['fim'][pos].astype('datetime64[ns]')
+            x[2::3] = np.datetime64('NaT')
+            texto = np.repeat(dados['parada'][pos], 3)
+            fig.add_trace(
+                go.Scattergl(
+                    x=x,
+                    y=np.full(n * 3, maquina),
+                    mode='lines',
+                    name=maquina,
+                    line=dict(width=12),
+                    text=texto,
+                    hovertemplate="%{y}<br>%{x}<br>%{text}<extra></extra>",
+                    connectgaps=False,
+                    showlegend=False
+                )
+            )
+
+    fig.update_layout(
+        title={
+            'text': "Linha do Tempo de Paradas" + (" (agregada)" if agregado else ""),
+            'y':0.95,
+            'x':0.5,
+            'xanchor': 'center',
+            'yanchor': 'top'
+        },
+        autosize=True,
+        height=150 + 60 * len(indice),
+        margin=dict(l=50, r=50, t=80, b=50),
+        plot_bgcolor='rgba(0,0,0,0)',
+        xaxis=dict(title="Período", range=[pd.Timestamp(janela[0]), pd.Timestamp(janela[1])]),
+        yaxis=dict(title="Máquina", type='category'),
+        hovermode="closest"
+    )
+
+    return fig, agregado
+
+# ----- FUNÇÕES DE ANÁLISE E RELATÓRIO -----
+def gerar_recomendacoes(df, disponibilidade, eficiencia, percentual_criticas, indice_paradas, ocorrencias,
+                        previsao=None, alarmes=None):
+    """Gera recomendações automáticas com base nos dados analisados.
+
+    Os limiares vêm de REGRAS_RECOMENDACAO, avaliadas sobre os indicadores da seleção já
+    calculados em analisar_dados. Com a previsão (`prever_paradas`), a tendência é julgada pela
+    faixa prevista para o próximo mês frente à média dos três últimos meses, em vez de comparar
+    o primeiro e o último mês. Os `alarmes` das cartas de controle apontam as máquinas em
+    degradação dentro do período.
+    """
+    indicadores = {
+        'Disponibilidade (%)': disponibilidade,
+        'Eficiência (%)': eficiencia,
+        'Paradas Críticas (%)': percentual_criticas
+    }
+    if not indice_paradas.empty:
+        indicadores['Área Principal'] = indice_paradas.idxmax()
+        indicadores['Área Principal (%)'] = indice_paradas.max()
+    if previsao is None and len(ocorrencias) >= 3:
+        indicadores['Tendência de Paradas'] = ocorrencias.iloc[-1] - ocorrencias.iloc[0]
+    recomendacoes = avaliar_regras(pd.DataFrame([indicadores]))['Recomendação'].tolist()
+    
+    # Previsão do próximo mês
+    if previsao is not None:
+        proximo_mes = previsao['total'].iloc[0]
+        media_recente = ocorrencias.iloc[-3:].mean()
+        mes = obter_nome_mes(previsao['total'].index[0])
+        if proximo_mes['Paradas (mín.)'] > media_recente:
+            recomendacoes.append(f"⚠️ A previsão para {mes} é de {proximo_mes['Paradas Previstas']:.0f} paradas, acima da média recente ({media_recente:.0f}). Reforce a manutenção preventiva.")
+        elif proximo_mes['Paradas (máx.)'] < media_recente:
+            recomendacoes.append(f"✅ A previsão para {mes} é de {proximo_mes['Paradas Previstas']:.0f} paradas, abaixo da média recente ({media_recente:.0f}). Continue com as melhorias implementadas.")
+
+        # Máquina com o maior aumento previsto de horas paradas
+        recentes = df[df['Ano-Mês'].isin(ocorrencias.index[-3:])]
+        horas_recentes = recentes.groupby('Máquina')['Duração'].sum().dt.total_seconds() / 3600 / min(len(ocorrencias), 3)
+        proxima = previsao['por_maquina'].groupby('Máquina').first()
+        aumento = (proxima['Horas Previstas'] - horas_recentes.reindex(proxima.index, fill_value=0))
+        aumento = aumento[proxima['Horas (mín.)'] > horas_recentes.reindex(proxima.index, fill_value=0)]
+        if not aumento.empty:
+            recomendacoes.append(f"⚠️ A máquina {aumento.idxmax()} tem aumento previsto de {aumento.max():.1f}h de paradas em {mes}. Programe uma intervenção preventiva.")
+    
+    # Cartas de controle: máquinas com pontos fora de controle, da mais recente para a mais antiga
+    if alarmes is not None and not alarmes.empty:
+        por_maquina = alarmes.groupby('Máquina').agg(dias=('Dia', 'nunique'), ultimo=('Dia', 'max'))
+        for maquina, linha in por_maquina.sort_values('ultimo', ascending=False).head(3).iterrows():
+            medidas = " e ".join(sorted(alarmes.loc[alarmes['Máquina'] == maquina, 'Medida'].unique())).lower()
+            recomendacoes.append(
+                f"🚨 {maquina}: {medidas} fora de controle em {linha['dias']} dia(s), o último em "
+                f"{linha['ultimo']:%d/%m/%Y}. Investigue a causa antes do fechamento do mês."
+            )
+    
+    return recomendacoes
+
+# ----- GRADE PAGINADA DE DADOS -----
+TAMANHOS_PAGINA = [50, 100, 250, 500]
+
+@instrumentar("dados")
+def textos_grade(serie):
+    """Converte uma coluna para texto no índice da grade; valores ausentes continuam ausentes (código -1)."""
+    return serie.astype(str).where(serie.notna())
+
+def calcular_indice_grade(df):
+    """Pré-calcula a ordenação de cada coluna e os códigos das colunas de texto (somente leitura).
+
+    Valores ausentes recebem o código -1 e ficam no início da ordenação.
+    """
+    ordens = {}
+    categorias = {}
+
+    for coluna in df.columns:
+        serie = df[coluna]
+        if (pd.api.types.is_numeric_dtype(serie) or pd.api.types.is_datetime64_any_dtype(serie)
+                or pd.api.types.is_timedelta64_dtype(serie)):
+            ordens[coluna] = np.argsort(serie.to_numpy(), kind='stable')
+        else:
+            # Colunas de texto: códigos ordenados permitem ordenar e filtrar pelos valores distintos
+            codigos, valores = pd.factorize(textos_grade(serie), sort=True)
+            categorias[coluna] = (codigos, pd.Index(valores))
+            ordens[coluna] = np.argsort(codigos, kind='stable')
+
+    return {'ordens': ordens, 'categorias': categorias, 'total': len(df)}
+
+def estender_indice_grade(indice, df, linhas_anteriores):
+    """Incorpora ao índice da grade as linhas acrescentadas ao final do DataFrame, sem reordenar as antigas."""
+    if set(indice['ordens']) != set(df.columns) or indice['total'] != linhas_anteriores:
+        return calcular_indice_grade(df)
+
+    novas = df.iloc[linhas_anteriores:]
+    ordens = {}
+    categorias = {}
+
+    for coluna in df.columns:
+        if coluna in indice['categorias']:
+            # Valores distintos novos entram na posição ordenada; os códigos antigos são remapeados
+            codigos_antigos, valores_antigos = indice['categorias'][coluna]
+            textos_novos = textos_grade(novas[coluna])
+            presentes = textos_novos.notna().to_numpy()
+            valores = pd.Index(np.union1d(
+                valores_antigos.to_numpy(dtype=object), textos_novos[presentes].unique().astype(object)
+            ))
+            # O último elemento do remapeamento atende ao código -1 (valor ausente), que é mantido
+            remapeamento = np.append(valores.get_indexer(valores_antigos), -1)
+            codigos_novos = np.full(len(novas), -1, dtype=np.intp)
+            codigos_novos[presentes] = valores.get_indexer(textos_novos[presentes])
+            codigos = np.concatenate([remapeamento[codigos_antigos], codigos_novos])
+            categorias[coluna] = (codigos, valores)
+            chave = codigos
+        else:
+            chave = df[coluna].to_numpy()
+
+        # Intercala as linhas novas (ordenadas entre si) na ordem já existente
+        ordem_antiga = indice['ordens'][coluna]
+        ordem_novas = linhas_anteriores + np.argsort(chave[linhas_anteriores:], kind='stable')
+        posicoes = np.searchsorted(chave[ordem_antiga], chave[ordem_novas], side='right')
+        ordens[coluna] = np.insert(ordem_antiga, posicoes, ordem_novas)
+
+    return {'ordens': ordens, 'categorias': categorias, 'total': len(df)}
+
+@st.cache_resource(show_spinner=False, max_entries=2, ttl=3600)
+def indice_grade_dados(df):
+    """Versão em cache de calcular_indice_grade para DataFrames que não estão no armazém."""
+    return calcular_indice_grade(df)
+
+def mascara_valor(indice, coluna, valor):
+    """Retorna a máscara das linhas cuja coluna de texto é igual ao valor informado."""
+    codigos, valores = indice['categorias'][coluna]
+    posicao = valores.get_indexer([str(valor)])[0]
+    return codigos == posicao if posicao >= 0 else np.zeros(indice['total'], dtype=bool)
+
+def mascara_contem(indice, coluna, termo):
+    """Retorna a máscara das linhas cuja coluna de texto contém o termo (avaliado nos valores distintos)."""
+    codigos, valores = indice['categorias'][coluna]
+    casam = valores.str.contains(termo, case=False, regex=False)
+    # O último elemento atende aos códigos -1 (valores ausentes), que nunca casam
+    return np.append(np.asarray(casam, dtype=bool), False)[codigos]
+
+@instrumentar("dados")
+def pagina_dados(df, indice, mascara, coluna_ordem, crescente, pagina, tamanho_pagina):
+    """Retorna apenas as linhas da página solicitada e o total de linhas que atendem aos filtros."""
+    ordem = indice['ordens'][coluna_ordem]
+    if not crescente:
+        ordem = ordem[::-1]
+
+    # Filtra mantendo a ordenação pré-calculada, sem reordenar
+    if mascara is not None:
+        ordem = ordem[mascara[ordem]]
+
+    inicio = pagina * tamanho_pagina
+    return df.iloc[ordem[inicio:inicio + tamanho_pagina]], len(ordem)
+
+# ----- FUNÇÕES DE EXPORTAÇÃO -----
+MIME_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+LIMITE_LINHAS_MEMORIA_CONSTANTE = 100000  # Acima disso, o xlsxwriter grava linha a linha em disco
+LIMITE_LINHAS_EXCEL = 1048575  # Linhas de dados por aba: o xlsx tem 1.048.576 linhas, uma é o cabeçalho
+
+def escrever_excel_memoria_constante(tabelas, output, progresso=None):
+    """Grava um dicionário {aba: DataFrame} em Excel no modo constant_memory do xlsxwriter.
+
+    Tabelas acima de LIMITE_LINHAS_EXCEL continuam em abas "Nome (2)", "Nome (3)"...
+    """
+    # O modo constant_memory exige escrita linha a linha, em ordem
+    workbook = xlsxwriter.Workbook(output, {
+        'constant_memory': True,
+        'default_date_format': 'dd/mm/yyyy hh:mm:ss',
+        'remove_timezone': True
+    })
+
+    total_linhas = max(1, sum(len(df) for df in tabelas.values()))
+    linhas_gravadas = 0
+
+    for sheet_name, df in tabelas.items():
+        valores = df.astype(object).where(df.notna(), None)
+        n_abas = max(1, -(-len(df) // LIMITE_LINHAS_EXCEL))
+
+        for parte in range(n_abas):
+            sufixo = f" ({parte + 1})" if parte > 0 else ""
+            worksheet = workbook.add_worksheet(sheet_name[:31 - len(sufixo)] + sufixo)
+            worksheet.write_row(0, 0, [str(col) for col in df.columns])
+
+            inicio = parte * LIMITE_LINHAS_EXCEL
+            trecho = valores.iloc[inicio:inicio + LIMITE_LINHAS_EXCEL]
+            for linha, registro in enumerate(trecho.itertuples(index=False, name=None), start=1):
+                # O xlsxwriter não gera exceção fora dos limites da aba: apenas retorna -1
+                if worksheet.write_row(linha, 0, registro) == -1:
+                    raise ValueError(f"Linha {inicio + linha} da aba '{sheet_name}' fora dos limites do Excel.")
+
+                if progresso is not None and linha % 10000 == 0:
+                    progresso((linhas_gravadas + inicio + linha) / total_linhas, f"Gravando aba '{sheet_name}'...")
+
+        linhas_gravadas += len(df)
+
+    workbook.close()
+
+@instrumentar("exportacao")
+def gerar_excel(df, sheet_name='Dados'):
+    """Gera o conteúdo (bytes) de um arquivo Excel a partir de um DataFrame."""
+    output = io.BytesIO()
+
+    if len(df) > LIMITE_LINHAS_MEMORIA_CONSTANTE:
+        escrever_excel_memoria_constante({sheet_name: df.reset_index()}, output)
+    else:
+        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+            df.to_excel(writer, sheet_name=sheet_name, index=True)
+
+    return output.getvalue()
+
+def assinatura_exportacao(*selecao):
+    """Identifica o conteúdo de um arquivo exportado: dataset, versão da pasta monitorada e seleção."""
+    return (st.session_state.get('dataset_id'), st.session_state.get('versao_pasta'), *selecao)
+
+def botao_download_excel(df, filename, text, key, assinatura=None):
+    """Exibe um botão que gera o Excel apenas quando solicitado e o entrega para download."""
+    chave_arquivo = f"arquivo_{key}"
+
+    if st.button(text, key=f"btn_gerar_{key}"):
+        with st.spinner("Gerando arquivo..."):
+            st.session_state[chave_arquivo] = (assinatura, gerar_excel(df))
+
+    # Só oferece o arquivo se ele corresponder à seleção atual
+    arquivo = st.session_state.get(chave_arquivo)
+    if arquivo is not None and arquivo[0] == assinatura:
+        st.download_button(
+            f"💾 Salvar {filename}",
+            data=arquivo[1],
+            file_name=filename,
+            mime=MIME_XLSX,
+            key=f"btn_download_{key}"
+        )
+
+# ----- MOTOR DE EXPORTAÇÃO EM SEGUNDO PLANO -----
+FORMATOS_EXPORTACAO = {
+    "Excel (várias abas)": "xlsx",
+    "CSV (zip)": "csv",
+    "Parquet (zip)": "parquet"
+}
+
+def remover_acentos(texto):
+    """Remove acentos e diacríticos de um texto."""
+    return unicodedata.normalize('NFKD', texto).encode('ascii', 'ignore').decode('ascii')
+
+def montar_tabelas_exportacao(dados_filtrados, resultados):
+    """Reúne as tabelas do relatório completo em um dicionário {aba: DataFrame}."""
+    def em_horas(serie):
+        return pd.to_timedelta(serie).dt.total_seconds() / 3600
+
+    pareto = resultados['pareto']
+    resumo = resumo_por_maquina(dados_filtrados)
+
+    tabelas = {
+        'Paradas Filtradas': dados_filtrados,
+        'Paradas Críticas': resultados['paradas_criticas'],
+        'Resumo por Máquina': resumo[['Número de Paradas', 'Duração Total (horas)', 'Duração Média (horas)']].reset_index(),
+        'Pareto': pd.DataFrame({
+            'Causa de Parada': pareto.index,
+            'Duração Total (horas)': em_horas(pareto).values
+        }),
+        'Série Mensal': pd.DataFrame({
+            'Número de Paradas': resultados['ocorrencias'],
+            'Duração Total (horas)': em_horas(resultados['duracao_mensal'])
+        }).rename_axis('Ano-Mês').reset_index(),
+        'Turnos': resultados['turnos']['por_turno'],
+        'Equipes': resultados['turnos']['por_equipe'],
+        'Recomendações': pd.DataFrame({'Recomendação': resultados['recomendacoes']})
+    }
+    
+    if resultados.get('oee'):
+        tabelas['OEE por Máquina'] = resultados['oee']['por_maquina']
+        tabelas['OEE por Turno'] = resultados['oee']['por_turno']
+        tabelas['OEE por Mês'] = resultados['oee']['por_mes']
+    if resultados.get('confiabilidade') and not resultados['confiabilidade']['por_maquina'].empty:
+        tabelas['Confiabilidade Máquina'] = resultados['confiabilidade']['por_maquina']
+        tabelas['Confiabilidade Causa'] = resultados['confiabilidade']['por_causa']
+    if resultados.get('comparativo'):
+        tabelas['Comparativo KPIs'] = resultados['comparativo']['indicadores']
+        tabelas['Comparativo Causas'] = resultados['comparativo']['causas']
+        tabelas['Comparativo Áreas'] = resultados['comparativo']['areas']
+    if resultados.get('alarmes_controle') is not None and not resultados['alarmes_controle'].empty:
+        tabelas['Alarmes de Controle'] = resultados['alarmes_controle']
+    if resultados.get('previsao'):
+        tabelas['Previsão por Máquina'] = resultados['previsao']['por_maquina']
+        tabelas['Previsão por Causa'] = resultados['previsao']['por_causa']
+    return tabelas
+
+@instrumentar("exportacao")
+def exportar_tabelas(tabelas, formato, progresso=None):
+    """Gera o arquivo de exportação (xlsx com várias abas, ou zip de CSV/Parquet)."""
+    output = io.BytesIO()
+
+    if formato == 'xlsx':
+        escrever_excel_memoria_constante(tabelas, output, progresso)
+        return output.getvalue()
+
+    # CSV e Parquet: um arquivo por tabela dentro de um zip
+    compressao = zipfile.ZIP_DEFLATED if formato == 'csv' else zipfile.ZIP_STORED
+    with zipfile.ZipFile(output, 'w', compressao) as arquivo_zip:
+        for i, (nome, df) in enumerate(tabelas.items()):
+            if progresso is not None:
+                progresso(i / len(tabelas), f"Gravando '{nome}'...")
+
+            nome_arquivo = remover_acentos(nome).lower().replace(' ', '_')
+            conteudo = io.BytesIO()
+            if formato == 'csv':
+                df.to_csv(conteudo, index=False, encoding='utf-8-sig')
+            else:
+                # Colunas de texto livre podem misturar tipos, o que o Parquet não aceita
+                colunas_texto = df.select_dtypes(include='object').columns
+                df.astype({col: 'string' for col in colunas_texto}).to_parquet(conteudo, index=False)
+            arquivo_zip.writestr(f"{nome_arquivo}.{formato}", conteudo.getvalue())
+
+    return output.getvalue()
+
+def iniciar_exportacao(tabelas, formato, assinatura=None):
+    """Inicia a geração da exportação em uma thread e retorna o estado da tarefa."""
+    tarefa = {
+        'formato': formato,
+        'assinatura': assinatura,
+        'progresso': 0.0,
+        'etapa': "Iniciando exportação...",
+        'resultado': None,
+        'erro': None
+    }
+
+    def atualizar(progresso, etapa):
+        tarefa['progresso'] = min(1.0, progresso)
+        tarefa['etapa'] = etapa
+
+    def executar():
+        try:
+            tarefa['resultado'] = exportar_tabelas(tabelas, formato, atualizar)
+            atualizar(1.0, "Exportação concluída.")
+        except Exception as e:
+            tarefa['erro'] = str(e)
+
+    tarefa['thread'] = threading.Thread(target=executar, daemon=True)
+    tarefa['thread'].start()
+    return tarefa
+
+# ----- INGESTÃO CONTÍNUA (PASTA MONITORADA) -----
+# Os exports do PLC/MES gravados em uma pasta são verificados por data de modificação e tamanho.
+# Só as linhas novas são lidas e processadas; dataset, índice da grade e agregados são estendidos.
+# Um hash do trecho já consumido detecta arquivos regerados (e não apenas acrescidos).
+# Só são aceitas pastas dentro da raiz definida pelo administrador em ATD_PASTA_MONITORADA.
+EXTENSOES_MONITORADAS = ('.csv', '.xlsx', '.xls')
+RAIZ_PASTA_MONITORADA = os.environ.get("ATD_PASTA_MONITORADA", "")
+INTERVALO_ATUALIZACAO_PADRAO = 60
+BLOCO_ASSINATURA = 1 << 20
+
+@st.cache_resource
+def monitor_pasta(caminho):
+    """Retorna o estado, compartilhado pelo processo, da ingestão contínua de uma pasta."""
+    return {
+        'trava': threading.Lock(),
+        'caminho': caminho,
+        'arquivos': {},
+        'partes': {},
+        'df': None,
+        'agregados': None,
+        'controle': None,
+        'versao': 0,
+        'erros': {},
+        'ultima_verificacao': None,
+        'ultima_alteracao': None
+    }
+
+def resolver_pasta_monitorada(caminho):
+    """Resolve a pasta informada (absoluta ou relativa à raiz permitida); None se ficar fora da raiz."""
+    if not RAIZ_PASTA_MONITORADA:
+        return None
+    raiz = os.path.realpath(RAIZ_PASTA_MONITORADA)
+    pasta = os.path.realpath(os.path.join(raiz, caminho))
+    return pasta if os.path.commonpath([raiz, pasta]) == raiz else None
+
+def _ler_csv(conteudo):
+    """Lê um trecho de CSV, detectando o separador (',' ou ';') e a codificação."""
+    cabecalho = conteudo.split(b'\n', 1)[0]
+    separador = ';' if cabecalho.count(b';') > cabecalho.count(b',') else ','
+    try:
+        return pd.read_csv(io.BytesIO(conteudo), sep=separador, encoding='utf-8-sig')
+    except UnicodeDecodeError:
+        return pd.read_csv(io.BytesIO(conteudo), sep=separador, encoding='latin-1')
+
+def _hash_prefixo(arquivo, tamanho):
+    """Retorna o hash (ainda extensível) dos primeiros `tamanho` bytes de um arquivo aberto."""
+    assinatura = hashlib.blake2b(digest_size=16)
+    arquivo.seek(0)
+    restante = tamanho
+    while restante > 0:
+        bloco = arquivo.read(min(BLOCO_ASSINATURA, restante))
+        if not bloco:
+            break
+        assinatura.update(bloco)
+        restante -= len(bloco)
+    return assinatura
+
+def _hash_linhas(df):
+    """Retorna o hash das colunas e valores de um DataFrame lido de planilha."""
+    assinatura = hashlib.blake2b(digest_size=16)
+    assinatura.update(json.dumps([str(c) for c in df.columns]).encode())
+    assinatura.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return assinatura.hexdigest()
+
+def ler_novas_linhas(caminho_arquivo, info_anterior, tamanho):
+    """Lê apenas as linhas novas de um arquivo monitorado.
+
+    Retorna (novas_linhas, nova_info, reiniciar); `reiniciar` indica que o arquivo foi substituído
+    e todas as suas linhas anteriores devem ser descartadas. O arquivo só é tratado como
+    acrescido se o trecho já consumido continua idêntico (mesmo hash).
+    """
+    if caminho_arquivo.lower().endswith('.csv'):
+        with open(caminho_arquivo, 'rb') as arquivo:
+            cabecalho = arquivo.readline()
+            # Arquivo que só cresceu: o hash do trecho consumido confere e a leitura segue do último byte
+            reiniciar = info_anterior is None or tamanho < info_anterior['offset']
+            if not reiniciar:
+                assinatura = _hash_prefixo(arquivo, info_anterior['offset'])
+                reiniciar = assinatura.hexdigest() != info_anterior.get('assinatura')
+            if reiniciar:
+                assinatura = _hash_prefixo(arquivo, len(cabecalho))
+            inicio = len(cabecalho) if reiniciar else info_anterior['offset']
+            arquivo.seek(inicio)
+            conteudo = arquivo.read()
+
+        # Consome apenas linhas completas; uma linha em gravação fica para a próxima verificação
+        fim = conteudo.rfind(b'\n') + 1
+        novas = _ler_csv(cabecalho + conteudo[:fim]) if fim > 0 else pd.DataFrame()
+        assinatura.update(conteudo[:fim])
+        return novas, {
+            'offset': inicio + fim,
+            'linhas': (0 if reiniciar else info_anterior['linhas']) + len(novas),
+            'assinatura': assinatura.hexdigest()
+        }, reiniciar
+
+    # Planilhas não permitem leitura parcial: lê o arquivo e descarta as linhas já processadas,
+    # desde que elas não tenham mudado
+    df = pd.read_excel(caminho_arquivo)
+    reiniciar = (
+        info_anterior is None or len(df) < info_anterior['linhas']
+        or _hash_linhas(df.iloc[:info_anterior['linhas']]) != info_anterior.get('assinatura')
+    )
+    novas = df if reiniciar else df.iloc[info_anterior['linhas']:]
+    return novas, {'offset': tamanho, 'linhas': len(df), 'assinatura': _hash_linhas(df)}, reiniciar
+
+def agregar_paradas(df):
+    """Agrega número de paradas e duração total (segundos) por máquina e mês."""
+    return df.groupby(['Máquina', 'Ano-Mês']).agg(
+        paradas=('Duração', 'size'),
+        duracao_s=('Duração', lambda d: d.dt.total_seconds().sum())
+    )
+
+@instrumentar("ingestao")
+def atualizar_pasta(estado):
+    """Verifica a pasta e incorpora as linhas novas; retorna True se o dataset mudou."""
+    with estado['trava']:
+        estado['ultima_verificacao'] = datetime.now()
+        novas_partes = []
+        reprocessar = False
+        vistos = set()
+
+        for entrada in sorted(os.scandir(estado['caminho']), key=lambda e: e.name):
+            if not entrada.is_file() or not entrada.name.lower().endswith(EXTENSOES_MONITORADAS):
+                continue
+
+            vistos.add(entrada.name)
+            stat = entrada.stat()
+            info = estado['arquivos'].get(entrada.name)
+            if info is not None and (info['mtime'], info['tamanho']) == (stat.st_mtime_ns, stat.st_size):
+                continue
+
+            try:
+                novas, nova_info, reiniciar = ler_novas_linhas(entrada.path, info, stat.st_size)
+                processadas = processar_dados.sem_cache(novas).reset_index(drop=True) if len(novas) > 0 else None
+            except Exception as e:
+                # Arquivo incompleto ou inválido: tenta novamente na próxima verificação
+                estado['erros'][entrada.name] = str(e)
+                continue
+
+            estado['erros'].pop(entrada.name, None)
+            estado['arquivos'][entrada.name] = {**nova_info, 'mtime': stat.st_mtime_ns, 'tamanho': stat.st_size}
+
+            if reiniciar and entrada.name in estado['partes']:
+                del estado['partes'][entrada.name]
+                reprocessar = True
+            if processadas is not None and len(processadas) > 0:
+                estado['partes'].setdefault(entrada.name, []).append(processadas)
+                novas_partes.append(processadas)
+
+        # Arquivos removidos da pasta saem do dataset
+        for nome in set(estado['arquivos']) - vistos:
+            del estado['arquivos'][nome]
+            reprocessar = reprocessar or estado['partes'].pop(nome, None) is not None
+
+        if not novas_partes and not reprocessar:
+            return False
+
+        linhas_anteriores = None
+        if reprocessar or estado['df'] is None:
+            partes = [parte for lista in estado['partes'].values() for parte in lista]
+            estado['df'] = pd.concat(partes, ignore_index=True) if partes else None
+            estado['agregados'] = agregar_paradas(estado['df']) if partes else None
+            estado['controle'] = atualizar_controle(novo_estado_controle(), estado['df']) if partes else None
+        else:
+            # Caso comum: apenas acrescenta as linhas novas e soma os agregados
+            linhas_anteriores = len(estado['df'])
+            novas = pd.concat(novas_partes, ignore_index=True)
+            estado['df'] = pd.concat([estado['df'], novas], ignore_index=True)
+            estado['agregados'] = estado['agregados'].add(agregar_paradas(novas), fill_value=0)
+            if paradas_atrasadas(estado['controle'], novas):
+                # Arquivos de máquinas diferentes chegam fora de ordem: refaz as cartas com tudo
+                estado['controle'] = atualizar_controle(novo_estado_controle(), estado['df'])
+            else:
+                estado['controle'] = atualizar_controle(estado['controle'], novas)
+
+        estado['versao'] += 1
+        estado['ultima_alteracao'] = datetime.now()
+
+    if estado['df'] is not None:
+        publicar_dataset(
+            f"pasta:{estado['caminho']}", f"📁 {os.path.basename(estado['caminho'])}",
+            estado['df'], linhas_anteriores, estado['controle']
+        )
+    return True
+
+def indicadores_ao_vivo(agregados, maquinas, periodo):
+    """Calcula paradas, horas paradas e disponibilidade a partir dos agregados incrementais.
+
+    Os agregados são mensais: sem um mês selecionado, mostra o mês mais recente.
+    """
+    if agregados is None or agregados.empty:
+        return None
+
+    selecao = agregados
+    if maquinas != "Todas":
+        selecao = selecao[selecao.index.get_level_values('Máquina').isin(list(maquinas))]
+
+    if isinstance(periodo, str) and periodo != "Todos":
+        mes = periodo
+    else:
+        mes = agregados.index.get_level_values('Ano-Mês').max()
+    selecao = selecao[selecao.index.get_level_values('Ano-Mês') == mes]
+
+    # Tempo programado do mês; no mês corrente, apenas até o momento atual
+    inicio_mes = pd.Timestamp(f"{mes}-01")
+    fim_mes = inicio_mes + pd.offsets.MonthBegin(1)
+    horas_programadas = (min(pd.Timestamp.now(), fim_mes) - inicio_mes).total_seconds() / 3600
+    horas_paradas = selecao['duracao_s'].sum() / 3600
+
+    return {
+        'mes': mes,
+        'paradas': int(selecao['paradas'].sum()),
+        'horas_paradas': horas_paradas,
+        'disponibilidade': max(0, min(100, (horas_programadas - horas_paradas) / horas_programadas * 100))
+        if horas_programadas > 0 else 0
+    }
+
+def sincronizar_pasta(estado):
+    """Atualiza a sessão com a versão mais recente do dataset da pasta; retorna True se houve mudança."""
+    if estado['df'] is None or st.session_state.get('versao_pasta') == (estado['caminho'], estado['versao']):
+        return False
+
+    chave = f"pasta:{estado['caminho']}"
+    st.session_state.df = dataset_publicado(chave)
+    st.session_state.dataset_id = chave
+    st.session_state.versao_pasta = (estado['caminho'], estado['versao'])
+    vincular_sessao(chave)
+
+    # Análise já exibida é refeita com a mesma seleção sobre as linhas novas
+    resultados = st.session_state.get('resultados')
+    if resultados:
+        analisar_dados(
+            st.session_state.df, resultados['maquinas_selecionadas'], resultados['periodo_selecionado'],
+            resultados['calendario_turnos'], st.session_state.get('producao')
+        )
+    return True
+
+def exibir_indicadores_ao_vivo(estado, intervalo):
+    """Exibe os indicadores ao vivo, reexecutados periodicamente sem recarregar a página inteira."""
+    def painel():
+        if atualizar_pasta(estado) and sincronizar_pasta(estado):
+            st.rerun()
+
+        indicadores = indicadores_ao_vivo(
+            estado['agregados'], *st.session_state.get('selecao_filtros', ("Todas", "Todos"))
+        )
+        st.markdown("#### 📡 Indicadores ao vivo")
+        if indicadores is None:
+            st.info("Aguardando arquivos na pasta monitorada.")
+            return
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric(f"Paradas ({indicadores['mes']})", f"{indicadores['paradas']}")
+        col2.metric("Horas paradas", f"{indicadores['horas_paradas']:.1f}h")
+        col3.metric("Disponibilidade até agora", f"{indicadores['disponibilidade']:.1f}%")
+
+        verificacao = estado['ultima_verificacao'].strftime('%H:%M:%S')
+        st.caption(f"{len(estado['arquivos'])} arquivo(s) • {len(estado['df']) if estado['df'] is not None else 0} registros • última verificação às {verificacao}")
+        for nome, erro in estado['erros'].items():
+            st.warning(f"⚠️ {nome}: {erro}")
+
+    # st.fragment (ou st.experimental_fragment) só existe em versões recentes do Streamlit
+    fragmento = getattr(st, 'fragment', None) or getattr(st, 'experimental_fragment', None)
+    if fragmento is not None:
+        fragmento(run_every=intervalo)(painel)()
+    else:
+        painel()
+        st.button("🔄 Verificar agora", key="btn_verificar_pasta")
+
+# ----- FUNÇÃO PRINCIPAL DE ANÁLISE -----
+def calcular_indice_temporal(df):
+    """Ordena as posições das linhas por máquina e Inicio; cada máquina vira uma fatia contígua."""
+    codigos, maquinas = pd.factorize(df['Máquina'], sort=True)
+    inicio = df['Inicio'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+    ordem = np.lexsort((inicio, codigos))
+    limites = np.searchsorted(codigos[ordem], np.arange(len(maquinas) + 1), side='left')
+
+    return {
+        'ordem': ordem,
+        'inicio': inicio[ordem],
+        'fatias': {maquina: (limites[i], limites[i + 1]) for i, maquina in enumerate(maquinas)}
+    }
+
+MAX_INDICES_TEMPORAIS_AVULSOS = 4
+
+@st.cache_resource
+def registro_indices_temporais():
+    """Índices temporais de DataFrames fora do armazém, localizados por identidade (sem hash do conteúdo)."""
+    return {'trava': threading.Lock(), 'entradas': OrderedDict()}
 
-# ----- FUNÇÕES DE ANÁLISE E RELATÓRIO -----
-@st.cache_data
-def gerar_recomendacoes(df, disponibilidade, eficiencia):
-    """Gera recomendações automáticas com base nos dados analisados."""
-    recomendacoes = []
-    
-    # Verifica a disponibilidade
-    if disponibilidade < 70:
-        recomendacoes.append("⚠️ A disponibilidade está abaixo do nível recomendado (70%). Priorize a redução do tempo de paradas não programadas.")
-    elif disponibilidade < 85:
-        recomendacoes.append("⚠️ A disponibilidade está em nível moderado. Considere implementar melhorias no processo de manutenção preventiva.")
+def indice_temporal(df):
+    """Retorna o índice temporal do dataset, guardado no armazém junto ao DataFrame quando possível."""
+    armazem = armazem_datasets()
+    with armazem['trava']:
+        entrada = next((e for e in armazem['entradas'].values() if e['df'] is df), None)
+
+    if entrada is not None:
+        if entrada.get('indice_temporal') is None:
+            indice = calcular_indice_temporal(df)
+            with armazem['trava']:
+                if entrada.get('indice_temporal') is None:
+                    entrada['indice_temporal'] = indice
+                    entrada['bytes'] += indice['ordem'].nbytes + indice['inicio'].nbytes
+        return entrada['indice_temporal']
+
+    # DataFrame fora do armazém (benchmark, serviço de KPIs): referência fraca evita reter o DataFrame
+    registro = registro_indices_temporais()
+    with registro['trava']:
+        item = registro['entradas'].get(id(df))
+        if item is not None and item[0]() is df:
+            registro['entradas'].move_to_end(id(df))
+            return item[1]
+
+    indice = calcular_indice_temporal(df)
+    with registro['trava']:
+        registro['entradas'][id(df)] = (weakref.ref(df), indice)
+        while len(registro['entradas']) > MAX_INDICES_TEMPORAIS_AVULSOS:
+            registro['entradas'].popitem(last=False)
+    return indice
+
+def limites_periodo(periodo):
+    """Converte o período ("Todos", mês 'AAAA-MM' ou tupla (início, fim)) em limites [início, fim)."""
+    if isinstance(periodo, str):
+        if periodo == "Todos":
+            return None, None
+        inicio = pd.Timestamp(f"{periodo}-01")
+        return inicio, inicio + pd.offsets.MonthBegin(1)
+    return pd.Timestamp(periodo[0]), pd.Timestamp(periodo[1])
+
+def descrever_filtros(maquinas_selecionadas, periodo_selecionado):
+    """Retorna os textos (máquinas, período) da seleção para títulos e relatórios."""
+    if isinstance(maquinas_selecionadas, str):
+        maquinas_texto = maquinas_selecionadas
     else:
-        recomendacoes.append("✅ A disponibilidade está em um bom nível. Continue monitorando para manter este desempenho.")
-    
-    # Verifica a eficiência
-    if eficiencia < 65:
-        recomendacoes.append("⚠️ A eficiência operacional está baixa. Analise as causas mais frequentes de paradas e implemente ações corretivas.")
-    elif eficiencia < 80:
-        recomendacoes.append("⚠️ A eficiência operacional está em nível moderado. Busque otimizar os processos para reduzir o tempo de paradas.")
+        maquinas_texto = ", ".join(maquinas_selecionadas)
+
+    if isinstance(periodo_selecionado, str):
+        periodo_texto = obter_nome_mes(periodo_selecionado)
     else:
-        recomendacoes.append("✅ A eficiência operacional está em um bom nível. Continue com as práticas atuais de manutenção.")
-    
-    # Análise das paradas críticas
-    paradas_criticas, percentual_criticas = indice_paradas_criticas(df)
-    if percentual_criticas > 20:
-        recomendacoes.append(f"⚠️ Alta incidência de paradas críticas ({percentual_criticas:.1f}%). Revise os procedimentos de manutenção corretiva.")
-    elif percentual_criticas > 10:
-        recomendacoes.append(f"⚠️ Incidência moderada de paradas críticas ({percentual_criticas:.1f}%). Implemente um plano de ação para reduzir este índice.")
+        inicio, fim = limites_periodo(periodo_selecionado)
+        periodo_texto = f"{inicio:%d/%m/%Y %H:%M} a {fim:%d/%m/%Y %H:%M}"
+
+    return maquinas_texto, periodo_texto
+
+@instrumentar("dados")
+def filtrar_dados(df, maquinas_selecionadas, periodo_selecionado):
+    """Filtra os dados pelas máquinas e pelo período selecionados, por busca binária no índice temporal."""
+    if isinstance(maquinas_selecionadas, str) and maquinas_selecionadas != "Todas":
+        maquinas_selecionadas = [maquinas_selecionadas]
+    
+    if maquinas_selecionadas == "Todas" and periodo_selecionado == "Todos":
+        return df.copy()
+    
+    indice = indice_temporal(df)
+    inicio, fim = limites_periodo(periodo_selecionado)
+    
+    if maquinas_selecionadas == "Todas":
+        fatias = indice['fatias'].values()
     else:
-        recomendacoes.append(f"✅ Baixa incidência de paradas críticas ({percentual_criticas:.1f}%). Continue monitorando para manter este desempenho.")
+        fatias = [indice['fatias'][m] for m in maquinas_selecionadas if m in indice['fatias']]
     
-    # Análise de áreas responsáveis
-    if 'Área Responsável' in df.columns:
-        areas = indice_paradas_por_area(df)
-        if not areas.empty:
-            area_mais_problematica = areas.idxmax()
-            percentual_area = areas.max()
-            if percentual_area > 40:
-                recomendacoes.append(f"⚠️ A área de {area_mais_problematica} é responsável por {percentual_area:.1f}% das paradas. Priorize ações nesta área.")
-    
-    # Análise de tendência
-    ocorrencias = taxa_ocorrencia_paradas(df)
-    if len(ocorrencias) >= 3:
-        tendencia = ocorrencias.iloc[-1] - ocorrencias.iloc[0]
-        if tendencia > 0:
-            recomendacoes.append("⚠️ Tendência de aumento no número de paradas. Revise os procedimentos de manutenção preventiva.")
-        elif tendencia < 0:
-            recomendacoes.append("✅ Tendência de redução no número de paradas. Continue com as melhorias implementadas.")
+    # Cada máquina está ordenada por Inicio: o período vira duas buscas binárias e uma fatia
+    partes = []
+    for esquerda, direita in fatias:
+        inicios = indice['inicio'][esquerda:direita]
+        a = esquerda + (np.searchsorted(inicios, inicio.value, side='left') if inicio is not None else 0)
+        b = esquerda + (np.searchsorted(inicios, fim.value, side='left') if fim is not None else len(inicios))
+        partes.append(indice['ordem'][a:b])
     
-    return recomendacoes
+    # Mantém a ordem original das linhas
+    posicoes = np.sort(np.concatenate(partes)) if partes else np.array([], dtype=np.int64)
+    return df.iloc[posicoes]
 
-@st.cache_data
-def get_download_link(df, filename, text):
-    """Gera um link para download de um DataFrame como arquivo Excel."""
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, sheet_name='Dados', index=True)
-    
-    b64 = base64.b64encode(output.getvalue()).decode()
-    href = f'<a href="data:application/vnd.openxmlformats-officedocument.spreadsheetml.sheet;base64,{b64}" download="{filename}">{text}</a>'
-    return href
+@instrumentar("analise")
+def analisar_dados(df, maquinas_selecionadas, periodo_selecionado, calendario_turnos=CALENDARIO_TURNOS_PADRAO, producao=None):
+    """Realiza a análise completa dos dados com base nos filtros selecionados.
 
-# ----- FUNÇÃO PRINCIPAL DE ANÁLISE -----
-def analisar_dados(df, maquina_selecionada, mes_selecionado):
-    """Realiza a análise completa dos dados com base nos filtros selecionados."""
+    Com o arquivo de produção (`producao`), a eficiência passa a ser o OEE real.
+    """
     # Filtra os dados conforme seleção
-    dados_filtrados = df.copy()
-    
-    if maquina_selecionada != "Todas":
-        dados_filtrados = dados_filtrados[dados_filtrados['Máquina'] == maquina_selecionada]
-    
-    if mes_selecionado != "Todos":
-        dados_filtrados = dados_filtrados[dados_filtrados['Ano-Mês'] == mes_selecionado]
+    dados_filtrados = filtrar_dados(df, maquinas_selecionadas, periodo_selecionado)
     
-    # Define o tempo programado (24 horas por dia * número de dias no período)
-    if mes_selecionado != "Todos":
-        # Obtém o número de dias no mês selecionado
-        ano, mes = map(int, mes_selecionado.split('-'))
-        dias_no_mes = pd.Period(f"{ano}-{mes}").days_in_month
-    else:
-        # Se todos os meses estiverem selecionados, usa o intervalo total dos dados
-        dias_no_mes = (dados_filtrados['Inicio'].max() - dados_filtrados['Inicio'].min()).days + 1
-        dias_no_mes = max(30, dias_no_mes)  # Usa pelo menos 30 dias para evitar divisão por zero
+    # Define o tempo programado pela duração real do período selecionado
+    inicio, fim = limites_periodo(periodo_selecionado)
+    if inicio is None:
+        # Sem período definido, usa os dias cobertos pelos dados filtrados
+        if dados_filtrados.empty:
+            inicio, fim = pd.Timestamp(0), pd.Timestamp(0) + pd.Timedelta(days=1)
+        else:
+            inicio = dados_filtrados['Inicio'].min().normalize()
+            fim = dados_filtrados['Inicio'].max().normalize() + pd.Timedelta(days=1)
     
-    # Tempo programado em horas (24 horas por dia)
-    tempo_programado_horas = dias_no_mes * 24
-    tempo_programado = pd.Timedelta(hours=tempo_programado_horas)
+    # Tempo programado pelo calendário de turnos; só conta como parado o tempo dentro dos turnos
+    calendarios = calendarios_turnos()
+    calendario = calendarios.get(calendario_turnos, calendarios[CALENDARIO_TURNOS_PADRAO])
+    turnos = analisar_turnos(dados_filtrados, inicio, fim, calendario)
+    tempo_programado = turnos['tempo_programado']
+    tempo_programado_horas = tempo_programado.total_seconds() / 3600
+    tempo_parado_turnos = turnos['tempo_parado']
     
     # Calcula os indicadores
-    disponibilidade = calcular_disponibilidade(dados_filtrados, tempo_programado)
-    eficiencia = eficiencia_operacional(dados_filtrados, tempo_programado)
+    disponibilidade = calcular_disponibilidade(dados_filtrados, tempo_programado, tempo_parado_turnos)
+    eficiencia = eficiencia_operacional(dados_filtrados, tempo_programado, tempo_parado_turnos)
+    
+    # OEE (disponibilidade × performance × qualidade) a partir dos apontamentos de produção
+    oee = None
+    if producao is not None:
+        producao_filtrada = filtrar_producao(producao, maquinas_selecionadas, inicio, fim)
+        if not producao_filtrada.empty:
+            oee = calcular_oee(dados_filtrados, producao_filtrada, inicio, fim, calendario)
+            eficiencia = oee['geral']['OEE (%)']
     tempo_medio = tempo_medio_paradas(dados_filtrados)
     
     # Calcula o tempo total de paradas em horas
@@ -769,7 +4370,7 @@ def analisar_dados(df, maquina_selecionada, mes_selecionado):
     
     # Calcula o MTBF (Mean Time Between Failures) em horas
     if total_paradas > 1:
-        mtbf = (tempo_programado - tempo_total_paradas).total_seconds() / 3600 / total_paradas
+        mtbf = (tempo_programado - tempo_parado_turnos).total_seconds() / 3600 / total_paradas
     else:
         mtbf = 0
     
@@ -779,8 +4380,20 @@ def analisar_dados(df, maquina_selecionada, mes_selecionado):
     else:
         mttr = 0
     
-    # Gera recomendações
-    recomendacoes = gerar_recomendacoes(dados_filtrados, disponibilidade, eficiencia)
+    # Previsão dos próximos meses (total, por máquina e por máquina × causa)
+    previsao = prever_paradas(dados_filtrados)
+    
+    # Confiabilidade: Weibull/exponencial por máquina e por máquina × causa
+    confiabilidade = analisar_confiabilidade(dados_filtrados)
+    
+    # Comparativo com o mês anterior e o mesmo mês do ano anterior, pela tabela mensal de KPIs
+    comparativo = None
+    if isinstance(periodo_selecionado, str) and periodo_selecionado != "Todos":
+        kpis = kpis_mensais_dataset(df, calendario_turnos, calendario)
+        comparativo = comparar_periodos(kpis, maquinas_selecionadas, periodo_selecionado)
+    
+    # Cartas de controle: calculadas sobre o histórico completo, alarmes restritos à seleção
+    alarmes = alarmes_controle(controle_dataset(df), maquinas_selecionadas, inicio, fim)
     
     # Análises adicionais
     indice_paradas = indice_paradas_por_area(dados_filtrados)
@@ -790,6 +4403,11 @@ def analisar_dados(df, maquina_selecionada, mes_selecionado):
     
     # Análise de paradas críticas
     paradas_criticas, percentual_criticas = indice_paradas_criticas(dados_filtrados)
+    
+    # Gera recomendações a partir dos indicadores já calculados
+    recomendacoes = gerar_recomendacoes(
+        dados_filtrados, disponibilidade, eficiencia, percentual_criticas, indice_paradas, ocorrencias, previsao, alarmes
+    )
     top_paradas_criticas = paradas_criticas.groupby('Parada')['Duração'].sum().sort_values(ascending=False).head(10)
     
     # Novas análises
@@ -814,8 +4432,15 @@ def analisar_dados(df, maquina_selecionada, mes_selecionado):
         'percentual_criticas': percentual_criticas,
         'top_paradas_criticas': top_paradas_criticas,
         'recomendacoes': recomendacoes,
-        'maquina_selecionada': maquina_selecionada,
-        'mes_selecionado': mes_selecionado,
+        'maquinas_selecionadas': maquinas_selecionadas,
+        'periodo_selecionado': periodo_selecionado,
+        'calendario_turnos': calendario_turnos,
+        'turnos': turnos,
+        'oee': oee,
+        'previsao': previsao,
+        'confiabilidade': confiabilidade,
+        'alarmes_controle': alarmes,
+        'comparativo': comparativo,
         'tempo_programado_horas': tempo_programado_horas,
         'paradas_frequentes': paradas_frequentes,
         'duracao_mensal': duracao_mensal
@@ -823,6 +4448,138 @@ def analisar_dados(df, maquina_selecionada, mes_selecionado):
     
     return st.session_state.resultados
 
+# ----- SNAPSHOTS DE SESSÃO -----
+DIRETORIO_SNAPSHOTS = os.environ.get(
+    "ATD_DIRETORIO_SNAPSHOTS", os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots")
+)
+VERSAO_SNAPSHOT = 1
+KPIS_SNAPSHOT = [
+    'disponibilidade', 'eficiencia', 'mtbf', 'mttr', 'total_paradas', 'tempo_total_paradas_horas', 'percentual_criticas'
+]
+
+def periodo_para_json(periodo):
+    """Período da seleção em formato JSON: o texto do mês/"Todos" ou [início, fim] em ISO."""
+    if isinstance(periodo, str):
+        return periodo
+    return [pd.Timestamp(periodo[0]).isoformat(), pd.Timestamp(periodo[1]).isoformat()]
+
+def periodo_de_json(valor):
+    """Inverso de periodo_para_json."""
+    if isinstance(valor, str):
+        return valor
+    return pd.Timestamp(valor[0]), pd.Timestamp(valor[1])
+
+def salvar_snapshot(nome, chave, df, resultados):
+    """Grava o dataset processado (Parquet) e a seleção e os KPIs da análise (JSON); retorna o identificador."""
+    armazem = armazem_datasets()
+    with armazem['trava']:
+        entrada = armazem['entradas'].get(chave)
+    arquivo = entrada['nome'] if entrada is not None else None
+
+    nome = nome.strip() or arquivo or "analise"
+    identificador = f"{datetime.now():%Y%m%d-%H%M%S}-" + re.sub(r'[^0-9A-Za-z_-]+', '_', remover_acentos(nome)).strip('_')[:40]
+    pasta = os.path.join(DIRETORIO_SNAPSHOTS, identificador)
+    temporaria = pasta + ".tmp"
+    os.makedirs(temporaria)
+
+    try:
+        # Colunas object podem misturar tipos, o que o Parquet não aceita; o tipo original vai no JSON
+        tipos = {coluna: str(tipo) for coluna, tipo in df.dtypes.items()}
+        colunas_object = [coluna for coluna, tipo in tipos.items() if tipo == 'object']
+        df.astype({coluna: 'string' for coluna in colunas_object}).to_parquet(os.path.join(temporaria, "dados.parquet"))
+
+        maquinas = resultados['maquinas_selecionadas']
+        estado = {
+            'versao': VERSAO_SNAPSHOT,
+            'nome': nome,
+            'arquivo': arquivo,
+            'dataset_id': chave,
+            'criado_em': datetime.now().isoformat(timespec='seconds'),
+            'linhas': len(df),
+            'tipos': tipos,
+            'filtros': {
+                'maquinas': maquinas if isinstance(maquinas, str) else list(maquinas),
+                'periodo': periodo_para_json(resultados['periodo_selecionado']),
+                'calendario': resultados['calendario_turnos']
+            },
+            'kpis': {kpi: float(resultados[kpi]) for kpi in KPIS_SNAPSHOT}
+        }
+        with open(os.path.join(temporaria, "estado.json"), 'w', encoding='utf-8') as arquivo_json:
+            json.dump(estado, arquivo_json, ensure_ascii=False, indent=2)
+        os.replace(temporaria, pasta)
+    except Exception:
+        shutil.rmtree(temporaria, ignore_errors=True)
+        raise
+
+    return identificador
+
+def listar_snapshots():
+    """Snapshots salvos (estado JSON de cada um, com o 'id'), do mais recente para o mais antigo."""
+    if not os.path.isdir(DIRETORIO_SNAPSHOTS):
+        return []
+
+    snapshots = []
+    for identificador in sorted(os.listdir(DIRETORIO_SNAPSHOTS), reverse=True):
+        caminho_estado = os.path.join(DIRETORIO_SNAPSHOTS, identificador, "estado.json")
+        if identificador.endswith(".tmp") or not os.path.isfile(caminho_estado):
+            continue
+        try:
+            with open(caminho_estado, encoding='utf-8') as arquivo_json:
+                estado = json.load(arquivo_json)
+        except (OSError, ValueError):
+            continue
+        if estado.get('versao') == VERSAO_SNAPSHOT:
+            snapshots.append({**estado, 'id': identificador})
+    return snapshots
+
+def restaurar_snapshot(identificador):
+    """Publica no armazém o dataset do snapshot (leitura do Parquet mapeada em memória) e retorna (chave, df, estado).
+
+    Datasets de arquivo voltam sob a mesma chave de conteúdo: se ainda estiverem no armazém, nada é lido
+    do disco, e um novo upload do mesmo arquivo reaproveita o dataset restaurado.
+    """
+    pasta = os.path.join(DIRETORIO_SNAPSHOTS, identificador)
+    with open(os.path.join(pasta, "estado.json"), encoding='utf-8') as arquivo_json:
+        estado = json.load(arquivo_json)
+
+    chave = estado['dataset_id']
+    if not chave or chave.startswith("pasta:"):
+        # A pasta monitorada pode ter mudado desde o snapshot: não substitui o dataset ao vivo
+        chave = f"snapshot:{identificador}"
+
+    df = dataset_publicado(chave)
+    if df is None:
+        with cronometrar("restaurar_snapshot", "ingestao") as registro:
+            df = pd.read_parquet(os.path.join(pasta, "dados.parquet"), memory_map=True)
+            colunas_object = [coluna for coluna, tipo in estado['tipos'].items() if tipo == 'object' and coluna in df]
+            if colunas_object:
+                df = df.astype({coluna: object for coluna in colunas_object})
+            if registro is not None:
+                registro['linhas_saida'] = len(df)
+        # Retorna o DataFrame lido, não uma nova consulta: o orçamento do armazém pode descartar a
+        # entrada recém-publicada antes de a sessão se vincular a ela (snapshot maior que a folga)
+        publicar_dataset(chave, estado['arquivo'] or estado['nome'], df)
+    return chave, df, estado
+
+def aplicar_filtros_snapshot(filtros):
+    """Preenche os widgets de filtro com a seleção do snapshot (antes de serem desenhados)."""
+    maquinas = filtros['maquinas']
+    st.session_state.filtro_maquinas = [] if maquinas == "Todas" else list(maquinas)
+    if filtros['calendario'] in calendarios_turnos():
+        st.session_state.filtro_calendario = filtros['calendario']
+
+    periodo = periodo_de_json(filtros['periodo'])
+    if isinstance(periodo, str):
+        st.session_state.filtro_mes = periodo
+        return
+    # Intervalo personalizado: a hora final do widget é inclusiva
+    fim = periodo[1] - pd.Timedelta(hours=1)
+    st.session_state.filtro_mes = "Intervalo personalizado"
+    st.session_state.filtro_data_inicio = periodo[0].date()
+    st.session_state.filtro_hora_inicio = periodo[0].hour
+    st.session_state.filtro_data_fim = fim.date()
+    st.session_state.filtro_hora_fim = fim.hour
+
 # ----- FUNÇÃO PRINCIPAL DA APLICAÇÃO -----
 def main():
     """Função principal que controla o fluxo da aplicação."""
@@ -836,6 +4593,27 @@ def main():
     if 'first_load' not in st.session_state:
         st.session_state.first_load = False
     
+    if 'dataset_id' not in st.session_state:
+        st.session_state.dataset_id = None
+    
+    if 'producao' not in st.session_state:
+        st.session_state.producao = None
+    
+    # Instrumentação opcional de desempenho
+    finalizar_instrumentacao()
+    modo_diagnostico = st.sidebar.checkbox(
+        "🛠️ Modo diagnóstico",
+        value=os.environ.get('ATD_INSTRUMENTACAO') == '1',
+        help="Mede o tempo de cada etapa, linhas processadas e uso de cache nesta sessão.",
+        key="modo_diagnostico"
+    )
+    if modo_diagnostico:
+        iniciar_instrumentacao(detectar_gatilho())
+    
+    # O pico de memória da ingestão (tracemalloc) só é medido sob demanda, pois desacelera a leitura
+    medir_memoria = modo_diagnostico or os.environ.get('ATD_MEMORIA') == '1'
+    ingestao = None
+    
     # Menu de navegação
     selected = option_menu(
         menu_title=None,
@@ -869,15 +4647,145 @@ def main():
             st.markdown('<div class="content-box">', unsafe_allow_html=True)
             st.markdown("### 📤 Upload de Dados")
             
-            uploaded_file = st.file_uploader("Selecione um arquivo Excel com os dados de paradas", type=["xlsx", "xls"])
+            fonte = st.radio(
+                "Fonte dos dados:", ["Upload de arquivo", "Pasta monitorada", "Snapshot salvo"],
+                horizontal=True, key="fonte_dados"
+            )
+            
+            if fonte == "Upload de arquivo":
+                uploaded_file = st.file_uploader("Selecione um arquivo Excel com os dados de paradas", type=["xlsx", "xls"])
+            
+                if uploaded_file is not None:
+                    try:
+                        conteudo = uploaded_file.getvalue()
+                        medicoes_ingestao = {}
+                    
+                        def carregar_arquivo():
+                            # Só é chamada quando o conteúdo ainda não está no armazém compartilhado
+                            with medir_pico_memoria(ativo=medir_memoria) as medicao:
+                                with cronometrar("pd.read_excel", "ingestao") as registro:
+                                    df = pd.read_excel(io.BytesIO(conteudo))
+                                    if registro is not None:
+                                        registro['linhas_saida'] = len(df)
+                                df_processado, qualidade = processar_dados_validados(df)
+                        
+                            if medicao is not None:
+                                medicoes_ingestao.update({
+                                    'arquivo': uploaded_file.name,
+                                    'tamanho_arquivo_bytes': uploaded_file.size,
+                                    'linhas': len(df),
+                                    'pico_bytes': medicao['pico_bytes'],
+                                    'tempo_s': medicao['tempo_s']
+                                })
+                            return df_processado, qualidade
+                    
+                        st.session_state.dataset_id, st.session_state.df = obter_dataset(
+                            conteudo, uploaded_file.name, carregar_arquivo
+                        )
+                        ingestao = medicoes_ingestao or None
+                        st.success(f"✅ Arquivo carregado com sucesso! {len(st.session_state.df)} registros processados.")
+                        
+                        qualidade = qualidade_dataset(st.session_state.dataset_id)
+                        if qualidade is not None:
+                            exibir_relatorio_qualidade(qualidade)
+                    except Exception as e:
+                        st.error(f"❌ Erro ao processar o arquivo: {str(e)}")
+            elif fonte == "Pasta monitorada" and not RAIZ_PASTA_MONITORADA:
+                st.info("A pasta monitorada não está configurada. Defina ATD_PASTA_MONITORADA no servidor.")
+            elif fonte == "Pasta monitorada":
+                col_pasta, col_intervalo = st.columns([3, 1])
+                with col_pasta:
+                    caminho_pasta = st.text_input(
+                        f"Pasta com os exports do PLC/MES (.csv, .xlsx), dentro de {RAIZ_PASTA_MONITORADA}:",
+                        value=RAIZ_PASTA_MONITORADA, key="pasta_monitorada"
+                    )
+                with col_intervalo:
+                    intervalo = st.number_input(
+                        "Atualizar a cada (s):", min_value=5, max_value=3600,
+                        value=INTERVALO_ATUALIZACAO_PADRAO, step=5, key="intervalo_pasta"
+                    )
+                
+                pasta_permitida = resolver_pasta_monitorada(caminho_pasta) if caminho_pasta else None
+                if caminho_pasta and pasta_permitida is None:
+                    st.error(f"❌ Só são permitidas pastas dentro de {RAIZ_PASTA_MONITORADA}.")
+                elif pasta_permitida is not None and os.path.isdir(pasta_permitida):
+                    estado_pasta = monitor_pasta(pasta_permitida)
+                    try:
+                        atualizar_pasta(estado_pasta)
+                        sincronizar_pasta(estado_pasta)
+                    except Exception as e:
+                        st.error(f"❌ Erro ao ler a pasta monitorada: {str(e)}")
+                    exibir_indicadores_ao_vivo(estado_pasta, int(intervalo))
+                elif caminho_pasta:
+                    st.error("❌ Pasta não encontrada.")
+            else:
+                snapshots = {snapshot['id']: snapshot for snapshot in listar_snapshots()}
+                if not snapshots:
+                    st.info(f"Nenhum snapshot salvo em {DIRETORIO_SNAPSHOTS}. Salve um na seção de exportação.")
+                else:
+                    escolhido = st.selectbox(
+                        "Snapshot:", list(snapshots), key="select_snapshot",
+                        format_func=lambda i: f"{snapshots[i]['nome']} ({datetime.fromisoformat(snapshots[i]['criado_em']):%d/%m/%Y %H:%M})"
+                    )
+                    snapshot = snapshots[escolhido]
+                    maquinas_texto, periodo_texto = descrever_filtros(
+                        snapshot['filtros']['maquinas'], periodo_de_json(snapshot['filtros']['periodo'])
+                    )
+                    st.caption(
+                        f"{snapshot['linhas']} registros • {maquinas_texto} • {periodo_texto} • "
+                        f"Disponibilidade {snapshot['kpis']['disponibilidade']:.1f}% • "
+                        f"MTBF {snapshot['kpis']['mtbf']:.1f}h • MTTR {snapshot['kpis']['mttr']:.1f}h"
+                    )
+                    
+                    col_restaurar, col_excluir = st.columns(2)
+                    with col_restaurar:
+                        if st.button("📂 Restaurar snapshot", key="btn_restaurar_snapshot"):
+                            try:
+                                chave, df_snapshot, estado = restaurar_snapshot(escolhido)
+                                st.session_state.df = df_snapshot
+                                st.session_state.dataset_id = chave
+                                st.session_state.versao_pasta = None
+                                st.session_state.first_load = True
+                                vincular_sessao(chave)
+                                filtros = estado['filtros']
+                                aplicar_filtros_snapshot(filtros)
+                                analisar_dados(
+                                    df_snapshot, "Todas" if filtros['maquinas'] == "Todas" else tuple(filtros['maquinas']),
+                                    periodo_de_json(filtros['periodo']), filtros['calendario'], st.session_state.get('producao')
+                                )
+                                st.success(f"✅ Snapshot restaurado: {len(df_snapshot)} registros.")
+                            except Exception as e:
+                                st.error(f"❌ Erro ao restaurar o snapshot: {str(e)}")
+                    with col_excluir:
+                        if st.button("🗑️ Excluir snapshot", key="btn_excluir_snapshot"):
+                            shutil.rmtree(os.path.join(DIRETORIO_SNAPSHOTS, escolhido), ignore_errors=True)
+                            st.rerun()
             
-            if uploaded_file is not None:
+            # Apontamentos de produção (opcional): habilitam o cálculo do OEE
+            arquivo_producao = st.file_uploader(
+                "Arquivo de produção (opcional, para OEE): Máquina, Data, Produção Total, Produção Boa, Taxa Nominal",
+                type=["csv", "xlsx", "xls"], key="upload_producao"
+            )
+            if arquivo_producao is not None:
                 try:
-                    df = pd.read_excel(uploaded_file)
-                    st.session_state.df = processar_dados(df)
-                    st.success(f"✅ Arquivo carregado com sucesso! {len(st.session_state.df)} registros processados.")
+                    conteudo_producao = arquivo_producao.getvalue()
+                    chave_producao = hash_conteudo(conteudo_producao)
+                    if st.session_state.get('producao_id') != chave_producao:
+                        with cronometrar("ler_producao", "ingestao"):
+                            if arquivo_producao.name.lower().endswith('.csv'):
+                                bruto_producao = _ler_csv(conteudo_producao)
+                            else:
+                                bruto_producao = pd.read_excel(io.BytesIO(conteudo_producao))
+                        st.session_state.producao = processar_producao.sem_cache(bruto_producao)
+                        st.session_state.producao_id = chave_producao
+                    st.success(f"✅ Produção carregada: {len(st.session_state.producao)} apontamentos.")
                 except Exception as e:
-                    st.error(f"❌ Erro ao processar o arquivo: {str(e)}")
+                    st.session_state.producao = None
+                    st.session_state.producao_id = None
+                    st.error(f"❌ Erro ao processar o arquivo de produção: {str(e)}")
+            else:
+                st.session_state.producao = None
+                st.session_state.producao_id = None
             st.markdown('</div>', unsafe_allow_html=True)
         
         # Se houver dados carregados, exibe os filtros e a análise
@@ -889,19 +4797,56 @@ def main():
                 col1, col2 = st.columns(2)
                 
                 with col1:
-                    # Filtro de máquina
-                    maquinas_disponiveis = ["Todas"] + sorted(st.session_state.df['Máquina'].unique().tolist())
-                    maquina_selecionada = st.selectbox("Selecione a Máquina:", maquinas_disponiveis)
+                    # Filtro de máquinas (nenhuma selecionada = todas)
+                    maquinas_disponiveis = sorted(st.session_state.df['Máquina'].unique().tolist())
+                    maquinas_escolhidas = st.multiselect(
+                        "Selecione as Máquinas (vazio = todas):", maquinas_disponiveis, key="filtro_maquinas"
+                    )
+                    maquinas_selecionadas = tuple(maquinas_escolhidas) if maquinas_escolhidas else "Todas"
                 
                 with col2:
-                    # Filtro de mês
-                    meses_disponiveis = ["Todos"] + sorted(st.session_state.df['Ano-Mês'].unique().tolist())
-                    mes_selecionado = st.selectbox("Selecione o Mês:", meses_disponiveis)
+                    # Filtro de período: mês inteiro ou intervalo livre com precisão de hora
+                    meses_disponiveis = ["Todos"] + sorted(st.session_state.df['Ano-Mês'].unique().tolist()) + ["Intervalo personalizado"]
+                    periodo_selecionado = st.selectbox("Selecione o Período:", meses_disponiveis, key="filtro_mes")
+                
+                if periodo_selecionado == "Intervalo personalizado":
+                    primeiro_dia = st.session_state.df['Inicio'].min().date()
+                    ultimo_dia = st.session_state.df['Inicio'].max().date()
+                    horas = list(range(24))
+                    
+                    col_di, col_hi, col_df, col_hf = st.columns([2, 1, 2, 1])
+                    with col_di:
+                        data_inicio = st.date_input("Data inicial:", value=primeiro_dia, key="filtro_data_inicio")
+                    with col_hi:
+                        hora_inicio = st.selectbox("Hora inicial:", horas, index=0, format_func=lambda h: f"{h:02d}:00", key="filtro_hora_inicio")
+                    with col_df:
+                        data_fim = st.date_input("Data final:", value=ultimo_dia, key="filtro_data_fim")
+                    with col_hf:
+                        hora_fim = st.selectbox("Hora final:", horas, index=23, format_func=lambda h: f"{h:02d}:59", key="filtro_hora_fim")
+                    
+                    # A hora final é inclusiva: o intervalo vai até o fim dessa hora
+                    periodo_selecionado = (
+                        pd.Timestamp(data_inicio) + pd.Timedelta(hours=hora_inicio),
+                        pd.Timestamp(data_fim) + pd.Timedelta(hours=hora_fim + 1)
+                    )
+                
+                # Calendário de turnos: define o tempo programado e a divisão das paradas por turno
+                calendario_selecionado = st.selectbox(
+                    "Calendário de turnos:", list(calendarios_turnos()), key="filtro_calendario"
+                )
+                
+                st.session_state.selecao_filtros = (maquinas_selecionadas, periodo_selecionado)
+                intervalo_valido = isinstance(periodo_selecionado, str) or periodo_selecionado[1] > periodo_selecionado[0]
+                if not intervalo_valido:
+                    st.error("❌ O fim do intervalo deve ser posterior ao início.")
                 
                 # Botão para analisar
-                if st.button("Analisar", key="btn_analisar"):
+                if st.button("Analisar", key="btn_analisar", disabled=not intervalo_valido):
                     with st.spinner("Analisando dados..."):
-                        analisar_dados(st.session_state.df, maquina_selecionada, mes_selecionado)
+                        analisar_dados(
+                            st.session_state.df, maquinas_selecionadas, periodo_selecionado,
+                            calendario_selecionado, st.session_state.get('producao')
+                        )
                 st.markdown('</div>', unsafe_allow_html=True)
             
             # Exibe os resultados se disponíveis
@@ -909,13 +4854,27 @@ def main():
                 # Extrai os resultados da sessão
                 resultados = st.session_state.resultados
                 
+                # Gráficos fixos da página: construídos em paralelo enquanto as seções anteriores são desenhadas
+                graficos = construir_graficos({
+                    'ocorrencias': (criar_grafico_ocorrencias, resultados['ocorrencias'], resultados.get('previsao')),
+                    'duracao_mensal': (criar_grafico_duracao_mensal, resultados['duracao_mensal'], resultados.get('previsao')),
+                    'pareto': (criar_grafico_pareto, resultados['pareto']),
+                    'area': (criar_grafico_pizza_areas, resultados['indice_paradas']),
+                    'tempo_area': (criar_grafico_tempo_area, resultados['tempo_area']),
+                    'distribuicao': (criar_grafico_distribuicao_duracao, resultados['paradas_criticas']),
+                    'paradas_criticas': (criar_grafico_paradas_criticas, resultados['top_paradas_criticas']),
+                    'areas_criticas': (criar_grafico_pizza_areas_criticas, resultados['paradas_criticas'])
+                })
+                
                 # Título da seção de resultados
-                maquina_texto = resultados['maquina_selecionada']
-                mes_texto = obter_nome_mes(resultados['mes_selecionado'])
+                maquina_texto, mes_texto = descrever_filtros(
+                    resultados['maquinas_selecionadas'], resultados['periodo_selecionado']
+                )
                 
                 st.markdown(f'<div class="section-title">Resultados da Análise: {maquina_texto} - {mes_texto}</div>', unsafe_allow_html=True)
                 
-                # Indicadores principais
+                # Indicadores principais (com a variação frente aos períodos de comparação, se houver)
+                comparativo = resultados.get('comparativo')
                 st.markdown('<div class="metrics-container">', unsafe_allow_html=True)
                 
                 # Disponibilidade
@@ -924,6 +4883,7 @@ def main():
                     <div class="metric-box">
                         <div class="metric-value">{resultados['disponibilidade']:.1f}%</div>
                         <div class="metric-label">Disponibilidade</div>
+                        {html_variacao_kpi(comparativo, 'Disponibilidade (%)', ' p.p.')}
                     </div>
                     """, 
                     unsafe_allow_html=True
@@ -934,7 +4894,8 @@ def main():
                     f"""
                     <div class="metric-box">
                         <div class="metric-value">{resultados['eficiencia']:.1f}%</div>
-                        <div class="metric-label">Eficiência Operacional</div>
+                        <div class="metric-label">{'OEE' if resultados.get('oee') else 'Eficiência Operacional'}</div>
+                        {'' if resultados.get('oee') else html_variacao_kpi(comparativo, 'Eficiência (%)', ' p.p.')}
                     </div>
                     """, 
                     unsafe_allow_html=True
@@ -946,6 +4907,7 @@ def main():
                     <div class="metric-box">
                         <div class="metric-value">{resultados['mtbf']:.1f}h</div>
                         <div class="metric-label">MTBF</div>
+                        {html_variacao_kpi(comparativo, 'MTBF (h)', 'h')}
                     </div>
                     """, 
                     unsafe_allow_html=True
@@ -957,6 +4919,7 @@ def main():
                     <div class="metric-box">
                         <div class="metric-value">{resultados['mttr']:.1f}h</div>
                         <div class="metric-label">MTTR</div>
+                        {html_variacao_kpi(comparativo, 'MTTR (h)', 'h')}
                     </div>
                     """, 
                     unsafe_allow_html=True
@@ -983,6 +4946,119 @@ def main():
                     
                     st.markdown('</div>', unsafe_allow_html=True)
                 
+                # Comparativo entre períodos (apenas com um mês selecionado)
+                if comparativo:
+                    st.markdown('<div class="section-title">Comparativo entre Períodos</div>', unsafe_allow_html=True)
+                    st.caption(" • ".join(f"{rotulo}: {obter_nome_mes(mes)}" for rotulo, mes in comparativo['meses'].items()))
+                    
+                    formato_comparativo = {
+                        coluna: st.column_config.NumberColumn(coluna, format="%.1f")
+                        for coluna in comparativo['indicadores'].columns[1:]
+                    }
+                    st.dataframe(comparativo['indicadores'], column_config=formato_comparativo, use_container_width=True, hide_index=True)
+                    
+                    col1, col2 = st.columns(2)
+                    colunas_ranking = ['Parada', 'Horas Paradas (Atual)', 'Horas Paradas (Mês Anterior)', 'Δ Horas Paradas vs Mês Anterior']
+                    for coluna, chave, titulo in [(col1, 'pioraram', "### 🔺 Causas que mais pioraram"),
+                                                  (col2, 'melhoraram', "### 🔻 Causas que mais melhoraram")]:
+                        with coluna:
+                            st.markdown(titulo)
+                            if comparativo[chave].empty:
+                                st.info("Nenhuma causa nesta situação frente ao mês anterior.")
+                            else:
+                                st.dataframe(
+                                    comparativo[chave][colunas_ranking].round(1), use_container_width=True, hide_index=True
+                                )
+                    
+                    aba_causas, aba_areas = st.tabs(["Pareto por Causa", "Totais por Área"])
+                    for aba, tabela in [(aba_causas, comparativo['causas']), (aba_areas, comparativo['areas'])]:
+                        with aba:
+                            if tabela.empty:
+                                st.info("Sem dados para comparação.")
+                            else:
+                                st.dataframe(tabela.round(1), use_container_width=True, hide_index=True)
+                
+                # Turnos e equipes
+                st.markdown('<div class="section-title">Turnos e Equipes</div>', unsafe_allow_html=True)
+                
+                turnos = resultados['turnos']
+                st.caption(
+                    f"Calendário: {resultados['calendario_turnos']} • "
+                    f"{turnos['paradas_fora_turno']} parada(s) iniciada(s) fora dos turnos programados"
+                )
+                
+                col1, col2 = st.columns(2)
+                
+                for coluna, tabela, rotulo in [(col1, turnos['por_turno'], 'Turno'), (col2, turnos['por_equipe'], 'Equipe')]:
+                    with coluna:
+                        st.markdown('<div class="chart-container">', unsafe_allow_html=True)
+                        fig_turnos = criar_grafico_disponibilidade_turnos(tabela, rotulo)
+                        if fig_turnos:
+                            st.plotly_chart(fig_turnos, use_container_width=True)
+                            st.dataframe(
+                                tabela,
+                                column_config={
+                                    "Horas Programadas": st.column_config.NumberColumn("Horas Programadas", format="%.1f"),
+                                    "Horas Paradas": st.column_config.NumberColumn("Horas Paradas", format="%.1f"),
+                                    "Disponibilidade (%)": st.column_config.NumberColumn("Disponibilidade (%)", format="%.1f")
+                                },
+                                use_container_width=True,
+                                hide_index=True
+                            )
+                        else:
+                            st.info(f"Sem dados por {rotulo.lower()} no calendário selecionado.")
+                        st.markdown('</div>', unsafe_allow_html=True)
+                
+                # OEE (apenas com o arquivo de produção)
+                if resultados.get('oee'):
+                    oee = resultados['oee']
+                    st.markdown('<div class="section-title">OEE - Eficiência Global do Equipamento</div>', unsafe_allow_html=True)
+                    
+                    col_oee, col_disp, col_perf, col_qual = st.columns(4)
+                    col_oee.metric("OEE", f"{oee['geral']['OEE (%)']:.1f}%")
+                    col_disp.metric("Disponibilidade", f"{oee['geral']['Disponibilidade (%)']:.1f}%")
+                    col_perf.metric("Performance", f"{oee['geral']['Performance (%)']:.1f}%")
+                    col_qual.metric("Qualidade", f"{oee['geral']['Qualidade (%)']:.1f}%")
+                    st.caption("Disponibilidade do OEE calculada por máquina: tempo programado × número de máquinas com apontamentos de produção.")
+                    if oee['apontamentos_fora_turno']:
+                        st.caption(f"{oee['apontamentos_fora_turno']} apontamento(s) de produção fora dos turnos programados foram desconsiderados.")
+                    
+                    formato_oee = {
+                        coluna: st.column_config.NumberColumn(coluna, format="%.1f")
+                        for coluna in ['Horas Programadas', 'Horas Paradas', 'Horas Ideais', 'Disponibilidade (%)',
+                                       'Performance (%)', 'Qualidade (%)', 'OEE (%)', 'Unidades Perdidas']
+                    }
+                    aba_maquina, aba_turno, aba_mes, aba_perdas = st.tabs(["Por Máquina", "Por Turno", "Por Mês", "Perdas por Causa"])
+                    for aba, tabela in [(aba_maquina, oee['por_maquina']), (aba_turno, oee['por_turno']),
+                                        (aba_mes, oee['por_mes']), (aba_perdas, oee['perdas_por_causa'])]:
+                        with aba:
+                            st.dataframe(tabela, column_config=formato_oee, use_container_width=True, hide_index=True)
+                
+                # Confiabilidade (Weibull)
+                confiabilidade = resultados.get('confiabilidade')
+                if confiabilidade and not confiabilidade['por_maquina'].empty:
+                    st.markdown('<div class="section-title">Confiabilidade - Tempo entre Falhas</div>', unsafe_allow_html=True)
+                    st.caption(
+                        f"Weibull e exponencial por máxima verossimilhança (mínimo de {MIN_FALHAS_CONFIABILIDADE} falhas por grupo). "
+                        "β < 1: falhas prematuras; β ≈ 1: aleatórias; β > 1: desgaste. "
+                        "B10: tempo até 10% de probabilidade de falha. Modelo sugerido pelo menor AIC."
+                    )
+                    
+                    formato_confiabilidade = {
+                        coluna: st.column_config.NumberColumn(coluna, format="%.2f")
+                        for coluna in ['Forma (β)', 'Escala (η, h)', 'MTBF Weibull (h)', 'MTBF Exponencial (h)',
+                                       'B10 (h)', 'Forma Reparo (β)', 'Escala Reparo (η, h)', 'MTTR (h)']
+                    }
+                    aba_maquina, aba_causa = st.tabs(["Por Máquina", f"Por Máquina × Causa (top {TOP_CAUSAS_CONFIABILIDADE})"])
+                    for aba, tabela in [(aba_maquina, confiabilidade['por_maquina']), (aba_causa, confiabilidade['por_causa'])]:
+                        with aba:
+                            fig_taxa_falha = criar_grafico_taxa_falha(tabela)
+                            if fig_taxa_falha:
+                                st.plotly_chart(fig_taxa_falha, use_container_width=True)
+                                st.dataframe(tabela, column_config=formato_confiabilidade, use_container_width=True, hide_index=True)
+                            else:
+                                st.info("Falhas insuficientes para o ajuste por grupo.")
+                
                 # Tabelas de Resumo
                 st.markdown('<div class="section-title">Tabelas de Resumo</div>', unsafe_allow_html=True)
                 
@@ -1049,7 +5125,7 @@ def main():
                 
                 with col1:
                     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                    fig_ocorrencias = criar_grafico_ocorrencias(resultados['ocorrencias'])
+                    fig_ocorrencias = graficos['ocorrencias'].result()
                     if fig_ocorrencias:
                         st.plotly_chart(fig_ocorrencias, use_container_width=True)
                     else:
@@ -1058,13 +5134,194 @@ def main():
                 
                 with col2:
                     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                    fig_duracao_mensal = criar_grafico_duracao_mensal(resultados['duracao_mensal'])
+                    fig_duracao_mensal = graficos['duracao_mensal'].result()
                     if fig_duracao_mensal:
                         st.plotly_chart(fig_duracao_mensal, use_container_width=True)
                     else:
                         st.info("Dados insuficientes para análise de duração mensal.")
                     st.markdown('</div>', unsafe_allow_html=True)
-                
+
+                if resultados.get('previsao'):
+                    with st.expander("📈 Previsão por Máquina e Causa"):
+                        st.caption(
+                            f"Tendência linear (com sazonalidade anual a partir de {MIN_MESES_SAZONALIDADE} meses) "
+                            f"e faixa de confiança de {NIVEL_CONFIANCA_PREVISAO:.0%}."
+                        )
+                        tab_maquina, tab_causa = st.tabs(["Por Máquina", "Por Máquina × Causa"])
+                        with tab_maquina:
+                            st.dataframe(resultados['previsao']['por_maquina'].round(1), use_container_width=True, hide_index=True)
+                        with tab_causa:
+                            st.dataframe(
+                                resultados['previsao']['por_causa'].sort_values('Horas Previstas', ascending=False).round(1),
+                                use_container_width=True, hide_index=True
+                            )
+
+                # Tendência detalhada (diária/horária) reduzida com LTTB
+                with st.expander("🔎 Tendência Detalhada (diária/horária)"):
+                    if st.checkbox("Exibir tendência detalhada", key="chk_tendencia_detalhada"):
+                        col1, col2 = st.columns(2)
+
+                        with col1:
+                            granularidade = st.radio(
+                                "Granularidade:", list(GRANULARIDADES_TENDENCIA.keys()),
+                                horizontal=True, key="radio_granularidade"
+                            )
+
+                        with col2:
+                            # Aproximadamente um ponto por pixel de largura do gráfico
+                            n_pontos = st.select_slider(
+                                "Resolução do gráfico (pontos):", options=[500, 1000, 1500, 2000],
+                                value=1000, key="slider_resolucao_tendencia"
+                            )
+
+                        dados_tendencia = filtrar_dados(
+                            st.session_state.df, resultados['maquinas_selecionadas'], resultados['periodo_selecionado']
+                        )
+                        serie = serie_tendencia_detalhada(dados_tendencia, GRANULARIDADES_TENDENCIA[granularidade])
+
+                        if len(serie) > 1:
+                            # Zoom: a janela escolhida é reamostrada em maior resolução
+                            inicio_serie = serie.index.min().to_pydatetime()
+                            fim_serie = serie.index.max().to_pydatetime()
+                            janela = st.slider(
+                                "Janela de visualização:",
+                                min_value=inicio_serie,
+                                max_value=fim_serie,
+                                value=(inicio_serie, fim_serie),
+                                format="DD/MM/YYYY HH:mm",
+                                key="slider_janela_tendencia"
+                            )
+
+                            reduzidas, total_pontos = reduzir_serie_tendencia(serie, janela, n_pontos)
+                            fig_tendencia = criar_grafico_tendencia_detalhada(
+                                reduzidas, granularidade, resultados.get('alarmes_controle')
+                            )
+                            if fig_tendencia:
+                                st.plotly_chart(fig_tendencia, use_container_width=True)
+                                st.caption(
+                                    f"Exibindo {len(reduzidas['Número de Paradas'])} de {total_pontos} pontos na janela selecionada."
+                                )
+                            else:
+                                st.info("Nenhum dado na janela selecionada.")
+                        else:
+                            st.info("Dados insuficientes para análise de tendência detalhada.")
+
+                # Cartas de controle diárias por máquina
+                alarmes = resultados.get('alarmes_controle')
+                rotulo_controle = "🚨 Cartas de Controle (EWMA/CUSUM)"
+                if alarmes is not None and not alarmes.empty:
+                    rotulo_controle += f" • {alarmes['Máquina'].nunique()} máquina(s) fora de controle"
+                with st.expander(rotulo_controle):
+                    if st.checkbox("Exibir cartas de controle", key="chk_cartas_controle"):
+                        inicio_controle, fim_controle = limites_periodo(resultados['periodo_selecionado'])
+                        historico = historico_controle(
+                            controle_dataset(st.session_state.df), resultados['maquinas_selecionadas'],
+                            inicio_controle, fim_controle
+                        )
+                        if historico.empty:
+                            st.info(f"São necessários mais de {DIAS_BASE_CONTROLE} dias de histórico por máquina para as cartas de controle.")
+                        else:
+                            col1, col2 = st.columns(2)
+                            with col1:
+                                maquina_controle = st.selectbox(
+                                    "Máquina:", sorted(historico['Máquina'].unique()), key="select_maquina_controle"
+                                )
+                            with col2:
+                                medida_controle = st.radio(
+                                    "Medida:", list(MEDIDAS_CONTROLE), horizontal=True, key="radio_medida_controle"
+                                )
+                            serie_controle = historico[
+                                (historico['Máquina'] == maquina_controle) & (historico['Medida'] == medida_controle)
+                            ]
+                            fig_controle = criar_grafico_controle(serie_controle, maquina_controle, medida_controle)
+                            if fig_controle:
+                                st.plotly_chart(fig_controle, use_container_width=True)
+                            st.caption(
+                                f"Referência: primeiros {DIAS_BASE_CONTROLE} dias de cada máquina • EWMA λ={LAMBDA_EWMA:g}, "
+                                f"limite de {LARGURA_LIMITE_EWMA:g}σ • CUSUM k={FOLGA_CUSUM:g}, h={LIMIAR_CUSUM:g}."
+                            )
+                            if alarmes is not None and not alarmes.empty:
+                                st.dataframe(alarmes.round(2), use_container_width=True, hide_index=True)
+
+                # Linha do tempo (Gantt) de paradas por máquina
+                with st.expander("🗓️ Linha do Tempo de Paradas por Máquina"):
+                    if st.checkbox("Exibir linha do tempo", key="chk_linha_tempo"):
+                        dados_linha_tempo = filtrar_dados(
+                            st.session_state.df, resultados['maquinas_selecionadas'], resultados['periodo_selecionado']
+                        )
+
+                        if not dados_linha_tempo.empty:
+                            indice = indice_linha_tempo(dados_linha_tempo)
+                            inicio_dados = dados_linha_tempo['Inicio'].min().to_pydatetime()
+                            # Garante uma janela mínima de uma hora para o controle deslizante
+                            fim_dados = max(
+                                dados_linha_tempo['Fim'].max(), dados_linha_tempo['Inicio'].max() + pd.Timedelta(hours=1)
+                            ).to_pydatetime()
+
+                            janela = st.slider(
+                                "Janela de visualização:",
+                                min_value=inicio_dados,
+                                max_value=fim_dados,
+                                value=(inicio_dados, fim_dados),
+                                format="DD/MM/YYYY HH:mm",
+                                key="slider_janela_linha_tempo"
+                            )
+
+                            fig_linha_tempo, agregado = criar_grafico_linha_tempo(indice, janela)
+                            if fig_linha_tempo:
+                                st.plotly_chart(fig_linha_tempo, use_container_width=True)
+                                if agregado:
+                                    st.caption(
+                                        f"Mais de {LIMITE_EVENTOS_LINHA_TEMPO} paradas na janela: exibindo agregação por período. "
+                                        "Reduza a janela para ver as paradas individuais."
+                                    )
+                        else:
+                            st.info("Dados insuficientes para a linha do tempo.")
+
+                # Sequências de paradas (uma causa seguida por outra dentro da janela)
+                with st.expander("🔗 Sequências e Recorrências de Paradas"):
+                    if st.checkbox("Exibir sequências de paradas", key="chk_sequencias"):
+                        col1, col2 = st.columns(2)
+
+                        with col1:
+                            janela_sequencias = st.number_input(
+                                "Janela após o fim da parada (minutos):", min_value=1, max_value=24 * 60,
+                                value=JANELA_SEQUENCIAS_PADRAO, step=5, key="janela_sequencias"
+                            )
+
+                        dados_sequencias = filtrar_dados(
+                            st.session_state.df, resultados['maquinas_selecionadas'], resultados['periodo_selecionado']
+                        )
+                        sequencias = minerar_sequencias(dados_sequencias, janela_sequencias)
+
+                        if sequencias['matrizes']:
+                            with col2:
+                                maquina_sequencias = st.selectbox(
+                                    "Matriz de transições:", list(sequencias['matrizes']), key="select_maquina_sequencias"
+                                )
+
+                            fig_transicoes = criar_grafico_matriz_transicoes(
+                                sequencias['matrizes'][maquina_sequencias], maquina_sequencias
+                            )
+                            if fig_transicoes:
+                                st.plotly_chart(fig_transicoes, use_container_width=True)
+
+                            st.caption(
+                                "Probabilidade: fração das paradas da causa anterior seguidas pela causa seguinte na janela. "
+                                "Lift > 1: a sequência ocorre mais do que o esperado para a máquina."
+                            )
+                            formato_sequencias = {
+                                coluna: st.column_config.NumberColumn(coluna, format="%.2f")
+                                for coluna in ['Probabilidade (%)', 'Lift', 'Intervalo Médio (min)']
+                            }
+                            aba_pares, aba_recorrencias = st.tabs(["Sequências", "Recorrências da Mesma Causa"])
+                            with aba_pares:
+                                st.dataframe(sequencias['pares'], column_config=formato_sequencias, use_container_width=True, hide_index=True)
+                            with aba_recorrencias:
+                                st.dataframe(sequencias['recorrencias'], column_config=formato_sequencias, use_container_width=True, hide_index=True)
+                        else:
+                            st.info("Nenhuma sequência de paradas dentro da janela selecionada.")
+
                 # Análise Gráfica
                 st.markdown('<div class="section-title">Análise Gráfica</div>', unsafe_allow_html=True)
                 
@@ -1073,7 +5330,7 @@ def main():
                 
                 with col1:
                     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                    fig_pareto = criar_grafico_pareto(resultados['pareto'])
+                    fig_pareto = graficos['pareto'].result()
                     if fig_pareto:
                         st.plotly_chart(fig_pareto, use_container_width=True)
                     else:
@@ -1082,19 +5339,55 @@ def main():
                 
                 with col2:
                     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                    fig_area = criar_grafico_pizza_areas(resultados['indice_paradas'])
+                    fig_area = graficos['area'].result()
                     if fig_area:
                         st.plotly_chart(fig_area, use_container_width=True)
                     else:
                         st.info("Nenhuma parada por área disponível.")
                     st.markdown('</div>', unsafe_allow_html=True)
                 
+                with st.expander("🧹 Normalização de Causas de Parada"):
+                    grupos = grupos_causas()
+                    if grupos.empty:
+                        st.info("Nenhuma variante de grafia agrupada até o momento.")
+                    else:
+                        st.caption(f"{int(grupos['Qtd. Variantes'].sum())} variantes unificadas em {len(grupos)} causas.")
+                        st.dataframe(grupos, use_container_width=True, hide_index=True)
+                    
+                    sugestoes = sugestoes_causas()
+                    if not sugestoes.empty:
+                        st.markdown("**Sugestões de unificação** (grafias parecidas, não unificadas automaticamente)")
+                        st.dataframe(
+                            sugestoes,
+                            column_config={'Similaridade': st.column_config.NumberColumn('Similaridade', format="%.2f")},
+                            use_container_width=True, hide_index=True
+                        )
+                        rotulos = {
+                            linha['Causa']: f"{linha['Causa']} → {linha['Parecida com']} ({linha['Similaridade']:.2f})"
+                            for _, linha in sugestoes.iterrows()
+                        }
+                        aceitas = st.multiselect(
+                            "Unificar as causas selecionadas:", list(rotulos), format_func=rotulos.get,
+                            key="multiselect_sugestoes_causas"
+                        )
+                        st.caption("As unificações são gravadas no dicionário; arquivos enviados são processados de novo com ele.")
+                        if st.button("Unificar selecionadas", key="btn_aceitar_sugestoes", disabled=not aceitas):
+                            aceitar_sugestoes_causas(aceitas)
+                            st.rerun()
+                    st.download_button(
+                        label="📥 Baixar dicionário de causas (JSON)",
+                        data=json.dumps(unificacoes_causas(dicionario_causas()['mapeamento']), ensure_ascii=False, indent=1, sort_keys=True),
+                        file_name="mapeamento_causas.json",
+                        mime="application/json",
+                        key="download_mapeamento_causas"
+                    )
+                
                 # Segunda linha de gráficos
                 col1, col2 = st.columns(2)
                 
                 with col1:
                     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                    fig_tempo_area = criar_grafico_tempo_area(resultados['tempo_area'])
+                    fig_tempo_area = graficos['tempo_area'].result()
                     if fig_tempo_area:
                         st.plotly_chart(fig_tempo_area, use_container_width=True)
                     else:
@@ -1103,7 +5396,7 @@ def main():
                 
                 with col2:
                     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                    fig_distribuicao = criar_grafico_distribuicao_duracao(resultados['paradas_criticas'])
+                    fig_distribuicao = graficos['distribuicao'].result()
                     if fig_distribuicao:
                         st.plotly_chart(fig_distribuicao, use_container_width=True)
                     else:
@@ -1118,7 +5411,7 @@ def main():
                 
                 with col1:
                     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                    fig_paradas_criticas = criar_grafico_paradas_criticas(resultados['top_paradas_criticas'])
+                    fig_paradas_criticas = graficos['paradas_criticas'].result()
                     if fig_paradas_criticas:
                         st.plotly_chart(fig_paradas_criticas, use_container_width=True)
                     else:
@@ -1127,7 +5420,7 @@ def main():
                 
                 with col2:
                     st.markdown('<div class="chart-container">', unsafe_allow_html=True)
-                    fig_areas_criticas = criar_grafico_pizza_areas_criticas(resultados['paradas_criticas'])
+                    fig_areas_criticas = graficos['areas_criticas'].result()
                     if fig_areas_criticas:
                         st.plotly_chart(fig_areas_criticas, use_container_width=True)
                     else:
@@ -1144,6 +5437,37 @@ def main():
                     for rec in resultados['recomendacoes']:
                         st.markdown(f"- {rec}")
                     
+                    # Regras avaliadas para cada máquina e mês do dataset, por severidade
+                    with st.expander("📋 Recomendações por Máquina e Mês"):
+                        if st.checkbox("Avaliar todas as máquinas e meses", key="chk_recomendacoes_maquinas"):
+                            nivel_minimo = st.select_slider(
+                                "Severidade mínima:", options=[1, 2, 3], value=2,
+                                format_func=NIVEIS_SEVERIDADE.get, key="slider_severidade_recomendacoes"
+                            )
+                            calendarios = calendarios_turnos()
+                            kpis = kpis_mensais_dataset(
+                                st.session_state.df, resultados['calendario_turnos'],
+                                calendarios.get(resultados['calendario_turnos'], calendarios[CALENDARIO_TURNOS_PADRAO])
+                            )
+                            por_maquina = recomendacoes_por_maquina(kpis, resultados['maquinas_selecionadas'], nivel_minimo)
+                            
+                            if por_maquina.empty:
+                                st.success("Nenhuma máquina com recomendações nesse nível de severidade.")
+                            else:
+                                resumo = por_maquina.pivot_table(
+                                    index='Máquina', columns='Nível', values='Severidade', aggfunc='size', fill_value=0
+                                )
+                                st.caption(
+                                    f"{len(por_maquina)} recomendação(ões) em {por_maquina['Máquina'].nunique()} máquina(s) "
+                                    f"e {por_maquina['Ano-Mês'].nunique()} mês(es)."
+                                )
+                                st.dataframe(resumo, use_container_width=True)
+                                st.dataframe(
+                                    por_maquina.drop(columns='Severidade'),
+                                    column_config={'Valor': st.column_config.NumberColumn('Valor', format="%.1f")},
+                                    use_container_width=True, hide_index=True
+                                )
+                    
                     st.markdown('</div>', unsafe_allow_html=True)
                 
                 # Exportação de dados
@@ -1155,25 +5479,74 @@ def main():
                     
                     with col1:
                         # Exportar dados filtrados
-                        dados_filtrados = st.session_state.df.copy()
-                        if resultados['maquina_selecionada'] != "Todas":
-                            dados_filtrados = dados_filtrados[dados_filtrados['Máquina'] == resultados['maquina_selecionada']]
-                        if resultados['mes_selecionado'] != "Todos":
-                            dados_filtrados = dados_filtrados[dados_filtrados['Ano-Mês'] == resultados['mes_selecionado']]
+                        dados_filtrados = filtrar_dados(
+                            st.session_state.df, resultados['maquinas_selecionadas'], resultados['periodo_selecionado']
+                        )
                         
-                        st.markdown(
-                            get_download_link(dados_filtrados, 'dados_analisados.xlsx', '📥 Baixar dados analisados'),
-                            unsafe_allow_html=True
+                        botao_download_excel(
+                            dados_filtrados, 'dados_analisados.xlsx', '📥 Baixar dados analisados',
+                            key="analisados", assinatura=assinatura_exportacao(resultados['maquinas_selecionadas'], resultados['periodo_selecionado'])
                         )
                     
                     with col2:
                         # Exportar paradas críticas
                         if not resultados['paradas_criticas'].empty:
-                            st.markdown(
-                                get_download_link(resultados['paradas_criticas'], 'paradas_criticas.xlsx', '📥 Baixar paradas críticas'),
-                                unsafe_allow_html=True
+                            botao_download_excel(
+                                resultados['paradas_criticas'], 'paradas_criticas.xlsx', '📥 Baixar paradas críticas',
+                                key="criticas", assinatura=assinatura_exportacao(resultados['maquinas_selecionadas'], resultados['periodo_selecionado'])
+                            )
+                    
+                    # Relatório completo gerado em segundo plano
+                    st.markdown("#### 📦 Relatório Completo")
+                    
+                    formatos = [f for f, ext in FORMATOS_EXPORTACAO.items() if ext != 'parquet' or PARQUET_DISPONIVEL]
+                    formato = st.selectbox("Formato do relatório:", formatos, key="select_formato_exportacao")
+                    # Turnos, Equipes e OEE dependem do calendário e dos dados de produção
+                    assinatura = assinatura_exportacao(
+                        resultados['maquinas_selecionadas'], resultados['periodo_selecionado'],
+                        resultados['calendario_turnos'], st.session_state.get('producao_id'), formato
+                    )
+                    
+                    if st.button("Gerar relatório completo", key="btn_relatorio_completo"):
+                        tabelas = montar_tabelas_exportacao(dados_filtrados, resultados)
+                        st.session_state.tarefa_exportacao = iniciar_exportacao(
+                            tabelas, FORMATOS_EXPORTACAO[formato], assinatura
+                        )
+                    
+                    tarefa = st.session_state.get('tarefa_exportacao')
+                    if tarefa is not None and tarefa['assinatura'] == assinatura:
+                        if tarefa['thread'].is_alive():
+                            st.progress(tarefa['progresso'], text=tarefa['etapa'])
+                            st.button("🔄 Atualizar progresso", key="btn_atualizar_exportacao")
+                        elif tarefa['erro']:
+                            st.error(f"❌ Erro ao gerar o relatório: {tarefa['erro']}")
+                        else:
+                            extensao = 'xlsx' if tarefa['formato'] == 'xlsx' else 'zip'
+                            st.download_button(
+                                f"💾 Salvar relatorio_paradas.{extensao}",
+                                data=tarefa['resultado'],
+                                file_name=f"relatorio_paradas.{extensao}",
+                                mime=MIME_XLSX if extensao == 'xlsx' else "application/zip",
+                                key="btn_download_relatorio"
                             )
                     
+                    # Snapshot: dataset processado e seleção atual gravados em disco para reabrir depois
+                    st.markdown("#### 💾 Snapshot da Sessão")
+                    if not PARQUET_DISPONIVEL:
+                        st.info("Instale o pyarrow para salvar snapshots da sessão.")
+                    else:
+                        nome_snapshot = st.text_input(
+                            "Nome do snapshot (vazio = nome do arquivo):", key="nome_snapshot"
+                        )
+                        if st.button("Salvar snapshot", key="btn_salvar_snapshot"):
+                            try:
+                                identificador = salvar_snapshot(
+                                    nome_snapshot, st.session_state.dataset_id, st.session_state.df, resultados
+                                )
+                                st.success(f"✅ Snapshot '{identificador}' salvo em {DIRETORIO_SNAPSHOTS}.")
+                            except Exception as e:
+                                st.error(f"❌ Erro ao salvar o snapshot: {str(e)}")
+                    
                     st.markdown('</div>', unsafe_allow_html=True)
             
             # Botão para limpar os dados
@@ -1181,12 +5554,23 @@ def main():
                 if st.button("Limpar Dados", key="btn_limpar"):
                     st.session_state.resultados = None
                     st.session_state.df = None
+                    st.session_state.dataset_id = None
+                    st.session_state.versao_pasta = None
+                    st.session_state.producao = None
+                    st.session_state.producao_id = None
+                    # Arquivos exportados do dataset descartado não podem mais ser oferecidos
+                    for chave in [c for c in st.session_state if str(c).startswith('arquivo_')]:
+                        del st.session_state[chave]
+                    st.session_state.tarefa_exportacao = None
+                    desvincular_sessao()
                     st.rerun()
             
             # Realiza a análise com os filtros padrão na primeira carga
             if not st.session_state.first_load and st.session_state.df is not None:
                 st.session_state.first_load = True
-                analisar_dados(st.session_state.df, "Todas", "Todos")
+                analisar_dados(
+                    st.session_state.df, "Todas", "Todos", producao=st.session_state.get('producao')
+                )
     
     elif selected == "Dados":
         if st.session_state.df is not None:
@@ -1216,19 +5600,68 @@ def main():
                 if mes_filtro != "Todos":
                     dados_filtrados = dados_filtrados[dados_filtrados['Ano-Mês'] == mes_filtro]
                 
-                # Exibe os dados filtrados
-                st.markdown(f"**Mostrando {len(dados_filtrados)} registros**")
+                # Grade paginada: filtros e ordenação são aplicados no servidor e só a página visível é enviada
+                indice_grade = indice_dataset(st.session_state.get('dataset_id'), st.session_state.df)
+                
+                mascara = np.ones(indice_grade['total'], dtype=bool)
+                if maquina_filtro != "Todas":
+                    mascara &= mascara_valor(indice_grade, 'Máquina', maquina_filtro)
+                if mes_filtro != "Todos":
+                    mascara &= mascara_valor(indice_grade, 'Ano-Mês', mes_filtro)
+                
+                col1, col2, col3, col4 = st.columns(4)
+                
+                with col1:
+                    coluna_filtro = st.selectbox(
+                        "Filtrar coluna:", ["(nenhuma)"] + list(indice_grade['categorias'].keys()), key="grade_coluna_filtro"
+                    )
+                
+                with col2:
+                    termo_filtro = st.text_input("Contém:", key="grade_termo_filtro")
+                
+                with col3:
+                    colunas_ordem = list(st.session_state.df.columns)
+                    coluna_ordem = st.selectbox(
+                        "Ordenar por:", colunas_ordem,
+                        index=colunas_ordem.index('Inicio') if 'Inicio' in colunas_ordem else 0,
+                        key="grade_coluna_ordem"
+                    )
+                
+                with col4:
+                    crescente = st.radio("Ordem:", ["Crescente", "Decrescente"], horizontal=True, key="grade_ordem") == "Crescente"
+                
+                if coluna_filtro != "(nenhuma)" and termo_filtro:
+                    mascara &= mascara_contem(indice_grade, coluna_filtro, termo_filtro)
+                
+                total_linhas = int(mascara.sum())
+                
+                col1, col2 = st.columns(2)
+                
+                with col1:
+                    tamanho_pagina = st.selectbox("Linhas por página:", TAMANHOS_PAGINA, index=1, key="grade_tamanho_pagina")
+                
+                with col2:
+                    total_paginas = max(1, -(-total_linhas // tamanho_pagina))
+                    # Sem chave fixa: o controle volta à primeira página quando o total de páginas muda
+                    pagina = st.number_input("Página:", min_value=1, max_value=total_paginas, value=1, step=1)
+                
+                dados_pagina, total_linhas = pagina_dados(
+                    st.session_state.df, indice_grade, mascara, coluna_ordem, crescente, int(pagina) - 1, tamanho_pagina
+                )
+                
+                # Exibe a página atual dos dados filtrados
+                st.markdown(f"**Mostrando {len(dados_pagina)} de {total_linhas} registros (página {int(pagina)} de {total_paginas})**")
                 st.dataframe(
-                    dados_filtrados,
+                    dados_pagina,
                     use_container_width=True,
                     hide_index=True,
                     height=400
                 )
                 
-                                # Botão para download dos dados
-                st.markdown(
-                    get_download_link(dados_filtrados, 'dados_filtrados.xlsx', '📥 Baixar dados filtrados'),
-                    unsafe_allow_html=True
+                # Botão para download dos dados
+                botao_download_excel(
+                    dados_filtrados, 'dados_filtrados.xlsx', '📥 Baixar dados filtrados',
+                    key="filtrados", assinatura=assinatura_exportacao(maquina_filtro, mes_filtro)
                 )
                 st.markdown('</div>', unsafe_allow_html=True)
             
@@ -1237,15 +5670,18 @@ def main():
             
             with st.container():
                 st.markdown('<div class="content-box">', unsafe_allow_html=True)
-                # Resumo por máquina
-                resumo_maquina = dados_filtrados.groupby('Máquina').agg({
-                    'Duração': ['count', 'sum', 'mean']
-                })
-                resumo_maquina.columns = ['Número de Paradas', 'Duração Total', 'Duração Média']
-                
-                # Converte para horas
-                resumo_maquina['Duração Total (horas)'] = resumo_maquina['Duração Total'].apply(lambda x: x.total_seconds() / 3600)
-                resumo_maquina['Duração Média (horas)'] = resumo_maquina['Duração Média'].apply(lambda x: x.total_seconds() / 3600)
+                # Resumo por máquina e distribuições; os três gráficos são construídos em paralelo
+                resumo_maquina = resumo_por_maquina(dados_filtrados)
+                paradas_por_dia = paradas_por_dia_semana(dados_filtrados)
+                paradas_por_hora = paradas_por_hora_dia(dados_filtrados)
+                tarefas_graficos = {}
+                if len(resumo_maquina) > 1:  # Só cria o gráfico se houver mais de uma máquina
+                    tarefas_graficos['resumo'] = (criar_grafico_resumo_maquinas, resumo_maquina)
+                if not paradas_por_dia.empty:
+                    tarefas_graficos['dias'] = (criar_grafico_dias_semana, paradas_por_dia)
+                if not paradas_por_hora.empty:
+                    tarefas_graficos['horas'] = (criar_grafico_horas_dia, paradas_por_hora)
+                graficos = construir_graficos(tarefas_graficos)
                 
                 st.dataframe(
                     resumo_maquina[['Número de Paradas', 'Duração Total (horas)', 'Duração Média (horas)']],
@@ -1259,35 +5695,13 @@ def main():
                 
                 # Gráfico de resumo por máquina
                 if len(resumo_maquina) > 1:  # Só cria o gráfico se houver mais de uma máquina
-                    fig_resumo = px.bar(
-                        resumo_maquina.reset_index(),
-                        x='Máquina',
-                        y='Duração Total (horas)',
-                        color='Máquina',
-                        title="Duração Total de Paradas por Máquina",
-                        labels={'Duração Total (horas)': 'Duração Total (horas)', 'Máquina': 'Máquina'},
-                        text='Duração Total (horas)'
-                    )
-                    
-                    fig_resumo.update_traces(
-                        texttemplate='%{text:.1f}h', 
-                        textposition='outside'
-                    )
-                    
-                    fig_resumo.update_layout(
-                        xaxis_tickangle=0,
-                        autosize=True,
-                        margin=dict(l=50, r=50, t=80, b=50),
-                        plot_bgcolor='rgba(0,0,0,0)',
-                        showlegend=False
-                    )
-                    
+                    fig_resumo = graficos['resumo'].result()
                     st.plotly_chart(fig_resumo, use_container_width=True)
                 
                 # Botão para download do resumo
-                st.markdown(
-                    get_download_link(resumo_maquina.reset_index(), 'resumo_maquinas.xlsx', '📥 Baixar resumo por máquina'),
-                    unsafe_allow_html=True
+                botao_download_excel(
+                    resumo_maquina.reset_index(), 'resumo_maquinas.xlsx', '📥 Baixar resumo por máquina',
+                    key="resumo", assinatura=assinatura_exportacao(maquina_filtro, mes_filtro)
                 )
                 st.markdown('</div>', unsafe_allow_html=True)
             
@@ -1300,55 +5714,8 @@ def main():
                 tab1, tab2 = st.tabs(["📅 Distribuição por Dia da Semana", "🕒 Distribuição por Hora do Dia"])
                 
                 with tab1:
-                    # Adiciona coluna de dia da semana
-                    dados_filtrados['Dia da Semana'] = dados_filtrados['Inicio'].dt.day_name()
-                    
-                    # Ordem dos dias da semana
-                    ordem_dias = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-                    nomes_dias_pt = ['Segunda', 'Terça', 'Quarta', 'Quinta', 'Sexta', 'Sábado', 'Domingo']
-                    
-                    # Mapeamento para nomes em português
-                    mapeamento_dias = dict(zip(ordem_dias, nomes_dias_pt))
-                    dados_filtrados['Dia da Semana PT'] = dados_filtrados['Dia da Semana'].map(mapeamento_dias)
-                    
-                    # Agrupa por dia da semana
-                    paradas_por_dia = dados_filtrados.groupby('Dia da Semana PT').agg({
-                        'Duração': ['count', 'sum']
-                    })
-                    paradas_por_dia.columns = ['Número de Paradas', 'Duração Total']
-                    
-                    # Converte para horas
-                    paradas_por_dia['Duração (horas)'] = paradas_por_dia['Duração Total'].apply(lambda x: x.total_seconds() / 3600)
-                    
-                    # Reordena o índice de acordo com os dias da semana
                     if not paradas_por_dia.empty:
-                        paradas_por_dia = paradas_por_dia.reindex(nomes_dias_pt)
-                        
-                        # Cria o gráfico
-                        fig_dias = px.bar(
-                            paradas_por_dia.reset_index(),
-                            x='Dia da Semana PT',
-                            y='Número de Paradas',
-                            title="Distribuição de Paradas por Dia da Semana",
-                            labels={'Número de Paradas': 'Número de Paradas', 'Dia da Semana PT': 'Dia da Semana'},
-                            text='Número de Paradas',
-                            color='Dia da Semana PT',
-                            color_discrete_sequence=px.colors.qualitative.Pastel
-                        )
-                        
-                        fig_dias.update_traces(
-                            texttemplate='%{text}', 
-                            textposition='outside'
-                        )
-                        
-                        fig_dias.update_layout(
-                            xaxis_tickangle=0,
-                            autosize=True,
-                            margin=dict(l=50, r=50, t=80, b=50),
-                            plot_bgcolor='rgba(0,0,0,0)',
-                            showlegend=False
-                        )
-                        
+                        fig_dias = graficos['dias'].result()
                         st.plotly_chart(fig_dias, use_container_width=True)
                         
                         # Exibe a tabela
@@ -1364,53 +5731,8 @@ def main():
                         st.info("Dados insuficientes para análise por dia da semana.")
                 
                 with tab2:
-                    # Adiciona coluna de hora do dia
-                    dados_filtrados['Hora do Dia'] = dados_filtrados['Inicio'].dt.hour
-                    
-                    # Agrupa por hora do dia
-                    paradas_por_hora = dados_filtrados.groupby('Hora do Dia').agg({
-                        'Duração': ['count', 'sum']
-                    })
-                    paradas_por_hora.columns = ['Número de Paradas', 'Duração Total']
-                    
-                    # Converte para horas
-                    paradas_por_hora['Duração (horas)'] = paradas_por_hora['Duração Total'].apply(lambda x: x.total_seconds() / 3600)
-                    
-                    # Cria o gráfico
                     if not paradas_por_hora.empty:
-                        fig_horas = px.line(
-                            paradas_por_hora.reset_index(),
-                            x='Hora do Dia',
-                            y='Número de Paradas',
-                            title="Distribuição de Paradas por Hora do Dia",
-                            labels={'Número de Paradas': 'Número de Paradas', 'Hora do Dia': 'Hora do Dia'},
-                            markers=True
-                        )
-                        
-                        # Adiciona área sob a linha
-                        fig_horas.add_trace(
-                            go.Scatter(
-                                x=paradas_por_hora.reset_index()['Hora do Dia'],
-                                y=paradas_por_hora['Número de Paradas'],
-                                fill='tozeroy',
-                                fillcolor='rgba(52, 152, 219, 0.2)',
-                                line=dict(color='rgba(52, 152, 219, 0)'),
-                                showlegend=False
-                            )
-                        )
-                        
-                        fig_horas.update_layout(
-                            xaxis=dict(
-                                tickmode='array',
-                                tickvals=list(range(0, 24)),
-                                ticktext=[f"{h}:00" for h in range(0, 24)]
-                            ),
-                            autosize=True,
-                            margin=dict(l=50, r=50, t=80, b=50),
-                            plot_bgcolor='rgba(0,0,0,0)',
-                            showlegend=False
-                        )
-                        
+                        fig_horas = graficos['horas'].result()
                         st.plotly_chart(fig_horas, use_container_width=True)
                         
                         # Exibe a tabela
@@ -1572,6 +5894,13 @@ def main():
         <p><small>Versão 2.1.0 | Última atualização: Maio 2025</small></p>
     </div>
     """, unsafe_allow_html=True)
+    
+    # Contabiliza a memória desta sessão no registro do processo
+    atualizar_memoria_sessao(ingestao)
+    
+    if modo_diagnostico:
+        exibir_painel_diagnostico(finalizar_instrumentacao())
+        exibir_painel_memoria()
 
 # Executa a aplicação
 if __name__ == "__main__":
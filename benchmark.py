@@ -0,0 +1,260 @@
+"""Gerador de dados sintéticos e benchmark de escala do pipeline do atd.py.
+
+Uso:
+    python benchmark.py --linhas 10000 100000 1000000 --saida resultados_benchmark.json
+    python benchmark.py --linhas 10000 --comparar resultados_anteriores.json
+"""
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+import warnings
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+warnings.filterwarnings('ignore')
+
+import atd  # noqa: E402  (importado após silenciar os avisos do modo bare do Streamlit)
+
+# ----- PARÂMETROS DOS DADOS SINTÉTICOS -----
+CODIGOS_MAQUINAS = [78, 79, 80, 89, 91]
+PESOS_MAQUINAS = [0.30, 0.25, 0.15, 0.20, 0.10]
+
+# Causas de parada e área responsável; inclui variações de digitação comuns nos apontamentos
+CAUSAS_PARADA = [
+    ("Troca de Produto", "Produção"),
+    ("Falha Elétrica", "Manutenção"),
+    ("Falta de Insumos", "Logística"),
+    ("Erro de Configuração", "Operação"),
+    ("Manutenção Preventiva", "Manutenção"),
+    ("Limpeza CIP", "Produção"),
+    ("Falha Mecânica", "Manutenção"),
+    ("Ajuste de Rotuladora", "Operação"),
+    ("Falta de Operador", "Operação"),
+    ("Aguardando Qualidade", "Qualidade"),
+    ("Falha de Sensor", "Manutenção"),
+    ("Troca de Bobina", "Produção"),
+    ("Falta de Garrafas", "Logística"),
+    ("Queda de Energia", "Utilidades"),
+    ("Falha no Compressor", "Utilidades"),
+    ("falha eletrica ", "Manutenção"),
+    ("FALHA ELETRICA", "Manutenção"),
+    ("Troca de produto", "Produção"),
+]
+
+# Máximo de linhas de uma planilha xlsx (incluindo o cabeçalho)
+LIMITE_LINHAS_EXCEL = 1048575
+
+TAMANHOS_PADRAO = [10000, 100000, 1000000, 10000000]
+
+# ----- GERAÇÃO DE DADOS SINTÉTICOS -----
+def formatar_duracoes_mistas(segundos, rng):
+    """Formata durações em segundos misturando os formatos encontrados nas exportações."""
+    horas = segundos // 3600
+    minutos = (segundos % 3600) // 60
+    segs = segundos % 60
+    dias = horas // 24
+
+    hh = pd.Series(horas).astype(str).str.zfill(2)
+    mm = pd.Series(minutos).astype(str).str.zfill(2)
+    ss = pd.Series(segs).astype(str).str.zfill(2)
+
+    padrao = hh + ':' + mm + ':' + ss                                 # HH:MM:SS
+    sem_zero = pd.Series(horas).astype(str) + ':' + mm + ':' + ss     # H:MM:SS
+    com_dias = (pd.Series(dias).astype(str) + ' days '
+                + pd.Series(horas % 24).astype(str).str.zfill(2) + ':' + mm + ':' + ss)
+
+    formato = rng.choice(3, size=len(segundos), p=[0.85, 0.10, 0.05])
+    return np.where(formato == 0, padrao, np.where(formato == 1, sem_zero, com_dias))
+
+def gerar_dados_sinteticos(n_linhas, seed=42, inicio='2023-01-01', fracao_sobreposicao=0.03):
+    """Gera um registro de paradas realista no formato esperado pelo atd.py."""
+    rng = np.random.default_rng(seed)
+
+    maquinas = rng.choice(CODIGOS_MAQUINAS, size=n_linhas, p=PESOS_MAQUINAS)
+
+    # Distribuição de causas enviesada (Zipf): poucas causas concentram a maioria das paradas
+    pesos_causas = 1 / np.arange(1, len(CAUSAS_PARADA) + 1) ** 1.2
+    pesos_causas /= pesos_causas.sum()
+    causas = rng.choice(len(CAUSAS_PARADA), size=n_linhas, p=pesos_causas)
+    nomes_causas = np.array([c for c, _ in CAUSAS_PARADA], dtype=object)
+    areas_causas = np.array([a for _, a in CAUSAS_PARADA], dtype=object)
+
+    # Durações log-normais (mediana ~12 min, cauda longa de paradas críticas)
+    duracao_s = np.clip(rng.lognormal(mean=6.6, sigma=1.1, size=n_linhas), 30, 3 * 86400).astype(np.int64)
+
+    # Inícios: intervalo médio de ~6 paradas por dia por máquina, ordenados dentro de cada máquina
+    intervalo_medio_s = 86400 / 6
+    inicios_s = np.empty(n_linhas, dtype=np.int64)
+    for codigo in CODIGOS_MAQUINAS:
+        posicoes = np.flatnonzero(maquinas == codigo)
+        lacunas = rng.exponential(intervalo_medio_s, size=len(posicoes)).astype(np.int64)
+        inicios_s[posicoes] = np.cumsum(lacunas + duracao_s[posicoes])
+
+        # Uma fração das paradas começa antes do fim da anterior (paradas sobrepostas)
+        sobrepostas = posicoes[1:][rng.random(len(posicoes) - 1) < fracao_sobreposicao]
+        inicios_s[sobrepostas] -= (duracao_s[sobrepostas] // 2) + 60
+
+    inicio_ts = pd.Timestamp(inicio)
+    inicios = inicio_ts + pd.to_timedelta(inicios_s, unit='s')
+    fins = inicios + pd.to_timedelta(duracao_s, unit='s')
+
+    # Ordena como um export cronológico do MES
+    df = pd.DataFrame({
+        'Máquina': maquinas,
+        'Inicio': inicios,
+        'Fim': fins,
+        'Duração': formatar_duracoes_mistas(duracao_s, rng),
+        'Parada': nomes_causas[causas],
+        'Área Responsável': areas_causas[causas]
+    })
+    return df.sort_values('Inicio', kind='stable').reset_index(drop=True)
+
+# ----- MEDIÇÃO -----
+def limpar_caches():
+    """Limpa os caches do Streamlit para medir o caminho frio."""
+    st.cache_data.clear()
+    st.cache_resource.clear()
+    gc.collect()
+
+def medir_etapa(nome, funcao, medir_memoria=True):
+    """Mede o tempo frio, o tempo com cache e o pico de memória de uma etapa."""
+    resultado = {'etapa': nome}
+
+    limpar_caches()
+    t0 = time.perf_counter()
+    retorno = funcao()
+    resultado['tempo_s'] = time.perf_counter() - t0
+
+    # Segunda chamada: custo com cache (hash dos argumentos + cópia do resultado)
+    t0 = time.perf_counter()
+    funcao()
+    resultado['tempo_cache_s'] = time.perf_counter() - t0
+
+    if medir_memoria:
+        limpar_caches()
+        tracemalloc.start()
+        funcao()
+        _, pico = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        resultado['pico_memoria_mb'] = pico / 1024 ** 2
+
+    return retorno, resultado
+
+def executar_benchmark(n_linhas, max_linhas_excel, medir_memoria=True, seed=42):
+    """Executa todas as etapas do pipeline para um tamanho de dados."""
+    etapas = []
+    print(f"\n== {n_linhas:,} linhas ==")
+
+    def registrar(nome, funcao):
+        retorno, resultado = medir_etapa(nome, funcao, medir_memoria)
+        etapas.append(resultado)
+        print(f"  {nome:<40} {resultado['tempo_s']:>9.3f}s  (cache {resultado['tempo_cache_s']:.3f}s)"
+              + (f"  pico {resultado['pico_memoria_mb']:.1f} MB" if medir_memoria else ""))
+        return retorno
+
+    t0 = time.perf_counter()
+    bruto = gerar_dados_sinteticos(n_linhas, seed=seed)
+    print(f"  (dados gerados em {time.perf_counter() - t0:.1f}s)")
+
+    # Leitura do Excel só é viável até o limite de linhas da planilha e do orçamento configurado
+    if n_linhas <= min(LIMITE_LINHAS_EXCEL, max_linhas_excel):
+        arquivo = atd.gerar_excel(bruto)
+        registrar('pd.read_excel', lambda: pd.read_excel(io.BytesIO(arquivo)))
+    else:
+        etapas.append({'etapa': 'pd.read_excel', 'ignorada': f"acima de {min(LIMITE_LINHAS_EXCEL, max_linhas_excel)} linhas"})
+        print("  pd.read_excel                            ignorada")
+
+    df = registrar('processar_dados', lambda: atd.processar_dados(bruto))
+    resultados = registrar('analisar_dados', lambda: atd.analisar_dados(df, "Todas", "Todos"))
+
+    graficos = {
+        'criar_grafico_pareto': lambda: atd.criar_grafico_pareto(resultados['pareto']),
+        'criar_grafico_pizza_areas': lambda: atd.criar_grafico_pizza_areas(resultados['indice_paradas']),
+        'criar_grafico_ocorrencias': lambda: atd.criar_grafico_ocorrencias(resultados['ocorrencias']),
+        'criar_grafico_duracao_mensal': lambda: atd.criar_grafico_duracao_mensal(resultados['duracao_mensal']),
+        'criar_grafico_tempo_area': lambda: atd.criar_grafico_tempo_area(resultados['tempo_area']),
+        'criar_grafico_paradas_criticas': lambda: atd.criar_grafico_paradas_criticas(resultados['top_paradas_criticas']),
+        'criar_grafico_pizza_areas_criticas': lambda: atd.criar_grafico_pizza_areas_criticas(resultados['paradas_criticas']),
+        'criar_grafico_distribuicao_duracao': lambda: atd.criar_grafico_distribuicao_duracao(resultados['paradas_criticas']),
+    }
+    for nome, funcao in graficos.items():
+        registrar(nome, funcao)
+
+    # Exportação (substitui o antigo get_download_link)
+    if n_linhas <= LIMITE_LINHAS_EXCEL:
+        registrar('gerar_excel', lambda: atd.gerar_excel(df))
+    else:
+        etapas.append({'etapa': 'gerar_excel', 'ignorada': f"acima de {LIMITE_LINHAS_EXCEL} linhas"})
+
+    return etapas
+
+def versao_git():
+    """Retorna o commit atual do repositório, se disponível."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except Exception:
+        return None
+
+def comparar_resultados(atuais, anteriores):
+    """Imprime a razão entre os tempos atuais e os de uma execução anterior."""
+    print("\n== Comparação (atual / anterior) ==")
+    for n_linhas, etapas in atuais['resultados'].items():
+        base = {e['etapa']: e for e in anteriores['resultados'].get(n_linhas, [])}
+        for etapa in etapas:
+            anterior = base.get(etapa['etapa'])
+            if anterior and 'tempo_s' in etapa and anterior.get('tempo_s'):
+                razao = etapa['tempo_s'] / anterior['tempo_s']
+                print(f"  {int(n_linhas):>10,} {etapa['etapa']:<40} {razao:>6.2f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de escala do pipeline de análise de paradas.")
+    parser.add_argument('--linhas', type=int, nargs='+', default=TAMANHOS_PADRAO,
+                        help="Tamanhos dos conjuntos de dados sintéticos.")
+    parser.add_argument('--saida', default='resultados_benchmark.json', help="Arquivo JSON de resultados.")
+    parser.add_argument('--max-linhas-excel', type=int, default=100000,
+                        help="Maior tamanho para o qual o pd.read_excel é medido (é muito lento acima disso).")
+    parser.add_argument('--sem-memoria', action='store_true', help="Não mede o pico de memória (execução mais rápida).")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior para comparação.")
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    saida = {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'commit': versao_git(),
+        'ambiente': {
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'numpy': np.__version__,
+            'streamlit': st.__version__,
+            'plataforma': platform.platform()
+        },
+        'resultados': {}
+    }
+
+    for n_linhas in args.linhas:
+        saida['resultados'][str(n_linhas)] = executar_benchmark(
+            n_linhas, args.max_linhas_excel, medir_memoria=not args.sem_memoria, seed=args.seed
+        )
+
+    with open(args.saida, 'w', encoding='utf-8') as f:
+        json.dump(saida, f, ensure_ascii=False, indent=2)
+    print(f"\nResultados gravados em {args.saida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar_resultados(saida, json.load(f))
+
+if __name__ == "__main__":
+    main()
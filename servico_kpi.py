@@ -0,0 +1,389 @@
+"""Serviço HTTP/JSON local com os indicadores de paradas calculados pelo atd.py.
+
+Permite que outros sistemas da planta (relatórios de turno, telas andon) consultem disponibilidade,
+MTBF, MTTR e Pareto sem acessar a página do Streamlit.
+
+Os indicadores seguem o calendário de turnos escolhido (o mesmo seletor da página): tempo
+programado pelas ocorrências de turno e só o tempo parado dentro dos turnos.
+
+Uso:
+    python servico_kpi.py --arquivo paradas.xlsx --porta 8765
+    python servico_kpi.py --pasta /dados/exports_mes --calendario "2 turnos (seg-sáb)"
+
+Rotas:
+    GET /saude                   estado do serviço e do dataset
+    GET /filtros                 máquinas e meses disponíveis
+    GET /kpis?maquina=PET&mes=2024-05
+    GET /kpis?maquina=PET&inicio=2024-05-01&fim=2024-05-15&top=5
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+import warnings
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+warnings.filterwarnings('ignore')
+
+import atd  # noqa: E402  (importado após silenciar os avisos do modo bare do Streamlit)
+
+# ----- PARÂMETROS -----
+PORTA_PADRAO = 8765
+MAX_RESPOSTAS_CACHE = 512
+INTERVALO_VERIFICACAO_S = 5
+TOP_PARETO_PADRAO = 10
+DIA_NS = 86400 * 10**9
+
+# ----- AGREGADOS -----
+def cortar_turnos_por_dia(instancias):
+    """Corta as ocorrências de turno na meia-noite, para que cada trecho pertença a um único dia."""
+    inicio, fim = instancias['inicio'], instancias['fim']
+    meia_noite = (inicio // DIA_NS + 1) * DIA_NS
+    cruza = fim > meia_noite  # Uma ocorrência dura no máximo 24h: atravessa no máximo uma meia-noite
+
+    inicios = np.concatenate([inicio, meia_noite[cruza]])
+    fins = np.concatenate([np.where(cruza, meia_noite, fim), fim[cruza]])
+    ordem = np.argsort(inicios, kind='stable')
+    return {'inicio': inicios[ordem], 'fim': fins[ordem], 'paradas_programadas': instancias['paradas_programadas']}
+
+def agregar_turnos(df, calendario):
+    """Tempo parado dentro dos turnos por máquina, dia de início da parada e dia do trecho."""
+    a = df['Inicio'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    b = np.maximum(df['Fim'].to_numpy(dtype='datetime64[ns]').view(np.int64), a)
+    inicio = pd.Timestamp(a.min()).normalize()
+    fim = pd.Timestamp(b.max()).normalize() + pd.Timedelta(days=1)
+
+    instancias = cortar_turnos_por_dia(atd.instancias_turnos(calendario, inicio, fim))
+    parada, k, tempo = atd.dividir_paradas_turnos(instancias, a, b)
+
+    turnos = pd.DataFrame({
+        'Máquina': df['Máquina'].to_numpy()[parada],
+        'Dia': ((a // DIA_NS) * DIA_NS)[parada].astype('datetime64[ns]'),
+        'Dia Trecho': ((instancias['inicio'][k] // DIA_NS) * DIA_NS).astype('datetime64[ns]'),
+        'parado_s': tempo / 1e9
+    }).groupby(['Máquina', 'Dia', 'Dia Trecho'])['parado_s'].sum().reset_index()
+    turnos['Ano-Mês'] = turnos['Dia'].dt.strftime('%Y-%m')
+    return turnos
+
+def agregar_por_dia(df, nome_calendario=atd.CALENDARIO_TURNOS_PADRAO):
+    """Pré-agrega o dataset por máquina e dia; as consultas somam apenas os dias selecionados."""
+    calendario = atd.calendarios_turnos()[nome_calendario]
+    dados = pd.DataFrame({
+        'Máquina': df['Máquina'].values,
+        'Dia': df['Inicio'].dt.normalize().values,
+        'Parada': df['Parada'].values if 'Parada' in df.columns else 'Não informada',
+        'duracao_s': df['Duração'].dt.total_seconds().values
+    })
+
+    diario = dados.groupby(['Máquina', 'Dia']).agg(
+        paradas=('duracao_s', 'size'),
+        duracao_s=('duracao_s', 'sum')
+    ).reset_index()
+    causas = dados.groupby(['Máquina', 'Dia', 'Parada'])['duracao_s'].sum().reset_index()
+    diario['Ano-Mês'] = diario['Dia'].dt.strftime('%Y-%m')
+    causas['Ano-Mês'] = causas['Dia'].dt.strftime('%Y-%m')
+    return {
+        'diario': diario,
+        'causas': causas,
+        'turnos': agregar_turnos(df, calendario),
+        'calendario': calendario,
+        'nome_calendario': nome_calendario
+    }
+
+def selecionar(tabela, maquina, mes, inicio, fim):
+    """Filtra uma tabela de agregados pela máquina, pelo mês e pelo intervalo de datas."""
+    mascara = pd.Series(True, index=tabela.index)
+    if maquina != "Todas":
+        mascara &= tabela['Máquina'] == maquina
+    if mes != "Todos":
+        mascara &= tabela['Ano-Mês'] == mes
+    if inicio is not None:
+        mascara &= tabela['Dia'] >= inicio
+    if fim is not None:
+        mascara &= tabela['Dia'] <= fim
+    return tabela[mascara]
+
+def calcular_kpis(agregados, maquina="Todas", mes="Todos", inicio=None, fim=None, top=TOP_PARETO_PADRAO):
+    """Calcula os indicadores com as mesmas regras de `atd.analisar_dados`, a partir dos agregados diários.
+
+    Tempo programado e tempo parado seguem o calendário de turnos dos agregados: só conta o tempo
+    das paradas iniciadas nos dias selecionados que cai dentro dos turnos, até o fim do último dia.
+    """
+    diario = selecionar(agregados['diario'], maquina, mes, inicio, fim)
+
+    # Dias da consulta: do intervalo pedido, do mês ou os cobertos pelos dados
+    if inicio is not None or fim is not None:
+        primeiro = inicio if inicio is not None else diario['Dia'].min()
+        ultimo = fim if fim is not None else diario['Dia'].max()
+    elif mes != "Todos":
+        primeiro = pd.Period(mes).start_time
+        ultimo = pd.Period(mes).end_time.normalize()
+    else:
+        primeiro, ultimo = diario['Dia'].min(), diario['Dia'].max()
+
+    tempo_programado_h = 0.0
+    horas_paradas_turnos = 0.0
+    if pd.notna(primeiro) and pd.notna(ultimo) and ultimo >= primeiro:
+        instancias = atd.instancias_turnos(agregados['calendario'], primeiro, ultimo + pd.Timedelta(days=1))
+        tempo_programado_h = float(instancias['programado'].sum()) / 3.6e12
+        turnos = selecionar(agregados['turnos'], maquina, mes, inicio, fim)
+        horas_paradas_turnos = float(turnos.loc[turnos['Dia Trecho'] <= ultimo, 'parado_s'].sum()) / 3600
+
+    total_paradas = int(diario['paradas'].sum())
+    horas_paradas = float(diario['duracao_s'].sum()) / 3600
+
+    if tempo_programado_h > 0:
+        disponibilidade = max(0, min(100, (tempo_programado_h - horas_paradas_turnos) / tempo_programado_h * 100))
+    else:
+        disponibilidade = 0
+
+    pareto = (
+        selecionar(agregados['causas'], maquina, mes, inicio, fim)
+        .groupby('Parada')['duracao_s'].sum()
+        .sort_values(ascending=False)
+        .head(top)
+    )
+
+    return {
+        'filtros': {
+            'maquina': maquina,
+            'mes': mes,
+            'inicio': inicio.strftime('%Y-%m-%d') if inicio is not None else None,
+            'fim': fim.strftime('%Y-%m-%d') if fim is not None else None
+        },
+        'calendario': agregados['nome_calendario'],
+        'tempo_programado_horas': tempo_programado_h,
+        'total_paradas': total_paradas,
+        'tempo_total_paradas_horas': horas_paradas,
+        'tempo_parado_turnos_horas': horas_paradas_turnos,
+        'tempo_medio_paradas_min': horas_paradas * 60 / total_paradas if total_paradas > 0 else 0,
+        'disponibilidade': disponibilidade,
+        'eficiencia': disponibilidade,
+        'mtbf_horas': (tempo_programado_h - horas_paradas_turnos) / total_paradas if total_paradas > 1 else 0,
+        'mttr_horas': horas_paradas / total_paradas if total_paradas > 0 else 0,
+        'pareto': [
+            {'parada': parada, 'horas': segundos / 3600}
+            for parada, segundos in pareto.items()
+        ]
+    }
+
+# ----- FONTE DOS DADOS -----
+def carregar_arquivo(caminho):
+    """Lê e processa um export (.xlsx/.xls/.csv) com o pipeline do atd.py."""
+    if caminho.lower().endswith('.csv'):
+        with open(caminho, 'rb') as arquivo:
+            bruto = atd._ler_csv(arquivo.read())
+    else:
+        bruto = pd.read_excel(caminho)
+    return atd.processar_dados.sem_cache(bruto).reset_index(drop=True)
+
+def criar_servico(arquivo=None, pasta=None, calendario=atd.CALENDARIO_TURNOS_PADRAO):
+    """Cria o estado do serviço; o dataset é carregado uma vez e recarregado só quando a fonte muda."""
+    servico = {
+        'arquivo': arquivo,
+        'pasta': os.path.abspath(pasta) if pasta else None,
+        'calendario': calendario,
+        'trava': threading.Lock(),
+        'dataset': None,
+        'assinatura_fonte': None,
+        'ultima_verificacao': 0,
+        'respostas': OrderedDict(),
+        'iniciado_em': datetime.now().isoformat(timespec='seconds')
+    }
+    atualizar_dataset(servico, forcar=True)
+    return servico
+
+def atualizar_dataset(servico, forcar=False):
+    """Recarrega o dataset se a fonte mudou desde a última verificação (no máximo a cada poucos segundos)."""
+    agora = time.monotonic()
+    if not forcar and agora - servico['ultima_verificacao'] < INTERVALO_VERIFICACAO_S:
+        return servico['dataset']
+
+    with servico['trava']:
+        if not forcar and agora - servico['ultima_verificacao'] < INTERVALO_VERIFICACAO_S:
+            return servico['dataset']
+        servico['ultima_verificacao'] = agora
+
+        if servico['pasta']:
+            estado = atd.monitor_pasta(servico['pasta'])
+            atd.atualizar_pasta(estado)
+            assinatura, df = estado['versao'], estado['df']
+        else:
+            stat = os.stat(servico['arquivo'])
+            assinatura, df = (stat.st_mtime_ns, stat.st_size), None
+
+        if assinatura == servico['assinatura_fonte']:
+            return servico['dataset']
+
+        if df is None and not servico['pasta']:
+            df = carregar_arquivo(servico['arquivo'])
+        if df is None or df.empty:
+            dataset = None
+        else:
+            dataset = {
+                'versao': hashlib.sha256(repr(assinatura).encode()).hexdigest()[:16],
+                'registros': len(df),
+                'maquinas': sorted(df['Máquina'].unique().tolist()),
+                'meses': sorted(df['Ano-Mês'].unique().tolist()),
+                'agregados': agregar_por_dia(df, servico['calendario']),
+                'carregado_em': datetime.now().isoformat(timespec='seconds')
+            }
+
+        # O dataset é substituído de uma vez; requisições em andamento continuam com o anterior
+        servico['dataset'] = dataset
+        servico['assinatura_fonte'] = assinatura
+        servico['respostas'].clear()
+        return dataset
+
+def resposta_em_cache(servico, chave, calcular):
+    """Retorna (corpo, etag) de uma consulta, calculando-a só na primeira vez."""
+    with servico['trava']:
+        resposta = servico['respostas'].get(chave)
+        if resposta is not None:
+            servico['respostas'].move_to_end(chave)
+            return resposta
+
+    corpo = json.dumps(calcular(), ensure_ascii=False, default=str).encode('utf-8')
+    resposta = (corpo, '"' + hashlib.sha256(corpo).hexdigest()[:32] + '"')
+
+    with servico['trava']:
+        servico['respostas'][chave] = resposta
+        while len(servico['respostas']) > MAX_RESPOSTAS_CACHE:
+            servico['respostas'].popitem(last=False)
+    return resposta
+
+# ----- SERVIDOR HTTP -----
+def ler_data(parametros, nome):
+    """Lê um parâmetro de data (AAAA-MM-DD) da consulta."""
+    valor = parametros.get(nome, [None])[0]
+    return pd.Timestamp(valor).normalize() if valor else None
+
+class ManipuladorKPI(BaseHTTPRequestHandler):
+    """Responde às rotas do serviço; cada requisição é atendida em uma thread própria."""
+
+    server_version = "ATD-KPI/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        parametros = parse_qs(url.query)
+        servico = self.server.servico
+
+        try:
+            dataset = atualizar_dataset(servico)
+        except Exception as e:
+            self.enviar_json(503, {'erro': f"Falha ao carregar os dados: {e}"})
+            return
+
+        if url.path == '/saude':
+            self.enviar_json(200, {
+                'status': 'ok' if dataset is not None else 'sem_dados',
+                'registros': dataset['registros'] if dataset else 0,
+                'versao': dataset['versao'] if dataset else None,
+                'carregado_em': dataset['carregado_em'] if dataset else None,
+                'calendario': servico['calendario'],
+                'iniciado_em': servico['iniciado_em']
+            })
+            return
+
+        if dataset is None:
+            self.enviar_json(503, {'erro': "Nenhum dado carregado."})
+            return
+
+        if url.path == '/filtros':
+            corpo, etag = resposta_em_cache(
+                servico, (dataset['versao'], 'filtros'),
+                lambda: {'maquinas': dataset['maquinas'], 'meses': dataset['meses']}
+            )
+        elif url.path == '/kpis':
+            try:
+                maquina = parametros.get('maquina', ["Todas"])[0]
+                mes = parametros.get('mes', ["Todos"])[0]
+                inicio, fim = ler_data(parametros, 'inicio'), ler_data(parametros, 'fim')
+                top = int(parametros.get('top', [TOP_PARETO_PADRAO])[0])
+                if mes != "Todos":
+                    pd.Period(mes)
+            except ValueError as e:
+                self.enviar_json(400, {'erro': f"Parâmetro inválido: {e}"})
+                return
+
+            if maquina != "Todas" and maquina not in dataset['maquinas']:
+                self.enviar_json(404, {'erro': f"Máquina desconhecida: {maquina}"})
+                return
+
+            corpo, etag = resposta_em_cache(
+                servico, (dataset['versao'], 'kpis', maquina, mes, inicio, fim, top),
+                lambda: calcular_kpis(dataset['agregados'], maquina, mes, inicio, fim, top)
+            )
+        else:
+            self.enviar_json(404, {'erro': f"Rota desconhecida: {url.path}"})
+            return
+
+        # Cliente já tem esta versão da resposta
+        if etag in [valor.strip() for valor in self.headers.get('If-None-Match', '').split(',')]:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.enviar_corpo(200, corpo, etag)
+
+    def enviar_json(self, status, dados):
+        """Envia uma resposta JSON sem cache (erros e estado do serviço)."""
+        self.enviar_corpo(status, json.dumps(dados, ensure_ascii=False).encode('utf-8'))
+
+    def enviar_corpo(self, status, corpo, etag=None):
+        """Envia o corpo JSON com os cabeçalhos de cache apropriados."""
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(corpo)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, formato, *args):
+        """Registra as requisições no logger de desempenho do atd.py em vez do stderr."""
+        atd.logger_desempenho.info("%s %s", self.address_string(), formato % args)
+
+def criar_servidor(servico, host='127.0.0.1', porta=PORTA_PADRAO):
+    """Cria o servidor HTTP com atendimento concorrente (uma thread por requisição)."""
+    servidor = ThreadingHTTPServer((host, porta), ManipuladorKPI)
+    servidor.daemon_threads = True
+    servidor.servico = servico
+    return servidor
+
+def main():
+    parser = argparse.ArgumentParser(description="Serviço HTTP/JSON com os indicadores de paradas.")
+    fonte = parser.add_mutually_exclusive_group(required=True)
+    fonte.add_argument('--arquivo', help="Export de paradas (.xlsx, .xls ou .csv).")
+    fonte.add_argument('--pasta', help="Pasta monitorada com os exports do PLC/MES.")
+    parser.add_argument('--host', default='127.0.0.1', help="Endereço de escuta (padrão: apenas localhost).")
+    parser.add_argument('--porta', type=int, default=PORTA_PADRAO)
+    parser.add_argument(
+        '--calendario', default=atd.CALENDARIO_TURNOS_PADRAO, choices=list(atd.calendarios_turnos()),
+        help="Calendário de turnos do tempo programado (padrão: o mesmo da página)."
+    )
+    args = parser.parse_args()
+
+    servico = criar_servico(arquivo=args.arquivo, pasta=args.pasta, calendario=args.calendario)
+    servidor = criar_servidor(servico, args.host, args.porta)
+    registros = servico['dataset']['registros'] if servico['dataset'] else 0
+    print(f"Servindo {registros} registros em http://{args.host}:{servidor.server_address[1]}")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+
+if __name__ == "__main__":
+    main()